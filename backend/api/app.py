@@ -1,17 +1,31 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from starlette.routing import Match
 from pathlib import Path
+from typing import Callable
 import asyncio
+import hashlib
 import json
 import os
+import time
 
-from backend.crawler.bilibili_crawler import BilibiliCrawler
+from backend.api.task_store import create_task_store
+from backend.crawler.crawl_scheduler import CrawlScheduler
 from backend.processor.comment_processor import CommentProcessor
+from backend.model.analysis_cache import AnalysisCache
 from backend.model.comment_analyzer import CommentAnalyzer
+from backend.model.governor import governor_stats
+from backend.model.local_classifier import NGramClassifier
+from backend.monitoring.metrics import HTTP_INFLIGHT, HTTP_LATENCY, REGISTRY, render_family, timed
+from backend.pipeline.stream_pipeline import StreamingPipeline
+from backend.storage.column_store import ColumnStore
+from backend.storage.comment_index import get_index
+from backend.storage.result_summary import ResultSummary
 
 app = FastAPI(title="评论分析系统API")
 
@@ -23,17 +37,89 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 存储处理任务状态
-tasks = {}
+# 存储处理任务状态：默认为SQLite（data/tasks.db），多个工作进程共享，重启后保留；
+# BILI_TASK_STORE=memory 时只保存在当前进程内。任务在最后一次更新24小时后清理
+task_store = create_task_store(os.getenv("BILI_TASK_STORE", ""), ttl=float(os.getenv("BILI_TASK_TTL", 24 * 3600)))
+
+# 所有爬取任务共用的调度器（共享限速预算和HTTP连接池）
+# BILI_TRANSPORT 可指向本地模拟服务器或录制/回放目录，见 backend.crawler.transport.create_transport
+crawl_scheduler = CrawlScheduler(transport_spec=os.getenv("BILI_TRANSPORT", ""))
+
+# 模型分析结果缓存，重复分析相同评论时不再请求模型
+analysis_cache = AnalysisCache(Path(os.getenv("BILI_ANALYSIS_CACHE", "data/cache/analysis.db")))
+
+# 本地分类器（python -m backend.model.local_classifier train 训练），置信度高的评论不再请求模型
+local_classifier = NGramClassifier.load_if_exists(
+    Path(os.getenv("BILI_LOCAL_CLASSIFIER", str(NGramClassifier.DEFAULT_PATH)))
+)
+
+def collect_runtime_metrics() -> str:
+    """导出模型调度器和分析缓存的统计"""
+    providers = governor_stats()
+    cache_stats = analysis_cache.stats
+    parts = [
+        render_family("bili_provider_events_total", "counter", "模型服务调度器事件数",
+                      [({"provider": p["name"], "event": event}, p[event])
+                       for p in providers for event in ("requests", "successes", "failures", "retries", "throttled",
+                                                        "rejected", "circuit_opens") if event in p]),
+        render_family("bili_provider_concurrency_limit", "gauge", "模型服务当前并发上限",
+                      [({"provider": p["name"]}, p["limit"]) for p in providers]),
+        render_family("bili_provider_circuit_open", "gauge", "模型服务是否熔断中（1为熔断）",
+                      [({"provider": p["name"]}, 1 if p["state"] == "open" else 0) for p in providers]),
+        render_family("bili_analysis_cache_entries", "gauge", "分析缓存条目数", [({}, cache_stats["entries"])]),
+        render_family("bili_analysis_cache_lookups_total", "counter", "分析缓存查询数",
+                      [({"result": "hit"}, cache_stats["hits"]), ({"result": "miss"}, cache_stats["misses"])])
+    ]
+    return "\n".join(parts)
+
+REGISTRY.add_collector(collect_runtime_metrics)
+
+def route_template(request: Request) -> str:
+    """请求匹配的路由模板（如 /api/task/{task_id}），避免每个任务ID各占一组指标样本"""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """记录各接口的耗时和处理中的请求数（流式响应只计到响应头返回）"""
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    route = route_template(request)
+    with timed(HTTP_LATENCY, HTTP_INFLIGHT, route=route):
+        return await call_next(request)
 
 class CrawlRequest(BaseModel):
     bvid: str
     max_comments: int = 10000
+    resume: bool = False  # 存在检查点时从中断处续爬
+    incremental: bool = False  # 只爬取尚未存储的新评论
+    include_replies: bool = False  # 同时爬取根评论下的回复串（楼中楼）
+    storage: str = "jsonl"  # jsonl：每个阶段一份JSONL；columnar：列存储，各阶段追加列
+
+class BatchCrawlRequest(BaseModel):
+    bvids: list[str]
+    max_comments: int = 10000
+    incremental: bool = False
+    include_replies: bool = False
+    storage: str = "jsonl"
+
+class PipelineRequest(BaseModel):
+    bvid: str
+    max_comments: int = 10000
+    include_replies: bool = False
+    api_key: str = ""
+    model: str = "default"
+    confidence_threshold: float = 0.9  # 本地分类器置信度达到该值时不再请求模型
 
 class AnalyzeRequest(BaseModel):
     file_path: str
     api_key: str
     model: str = "default"
+    confidence_threshold: float = 0.9
+    resume: bool = False  # 结果文件已存在时跳过已分析的评论，继续追加
 
 class TaskStatus(BaseModel):
     task_id: str
@@ -41,50 +127,98 @@ class TaskStatus(BaseModel):
     progress: float
     result: dict | None = None
 
+def clean_comments(file_path: Path, storage: str) -> tuple[Path, int]:
+    """清洗原始评论
+    
+    Args:
+        file_path: 原始评论文件
+        storage: 存储方式，columnar 时导入列存储并追加 cleaned_text 列
+        
+    Returns:
+        tuple[Path, int]: (清洗结果路径, 清洗后的评论数量)
+    """
+    processor = CommentProcessor(workers=None)
+    if storage == "columnar":
+        store = ColumnStore.from_jsonl(file_path)
+        return store.path, processor.process_store(store)
+    return processor.process_comments(file_path)
+
+def count_lines(file_path: Path) -> int:
+    """统计文件行数（按块读取，不把整个文件读入内存）"""
+    count = 0
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            count += block.count(b'\n')
+    return count
+
+def progress_writer(task_id: str) -> Callable[..., None]:
+    """创建同步进度回调使用的节流写入函数
+    
+    进度的整数百分比变化时（或 ``force=True`` 时）才提交一次写入，写入在任务存储的写线程中执行，
+    不阻塞事件循环；同时提交的 ``result`` 随之写入。
+    
+    Args:
+        task_id: 任务ID
+        
+    Returns:
+        Callable[..., None]: 写入函数 (progress, result=None, force=False)
+    """
+    last = None
+    
+    def write(progress: float, result: dict | None = None, force: bool = False) -> None:
+        nonlocal last
+        if not force and int(progress) == last:
+            return
+        last = int(progress)
+        task_store.update_async(task_id, progress=progress, result=result)
+    
+    return write
+
 @app.post("/api/crawl", response_model=TaskStatus)
 async def crawl_comments(request: CrawlRequest):
     """爬取哔哩哔哩评论"""
     task_id = f"task_{os.urandom(8).hex()}"
-    tasks[task_id] = {"status": "running", "progress": 0}
+    await task_store.create_async(task_id)
     
     # 立即返回任务状态，然后在后台执行爬取
     async def crawl_background():
         try:
-            crawler = BilibiliCrawler()
-            tasks[task_id]["status"] = "crawling"
-            tasks[task_id]["progress"] = 25
+            crawler = crawl_scheduler.crawler
+            await task_store.update_async(task_id, status="crawling", progress=0)
+            
+            write_progress = progress_writer(task_id)
+            
+            def on_progress(count: int):
+                # 爬取阶段占总进度的一半
+                write_progress(round(50 * min(count / max(request.max_comments, 1), 0.99), 1), {"crawled": count})
             
             try:
-                file_path, comment_count = await asyncio.to_thread(crawler.crawl_comments, request.bvid, request.max_comments)
+                file_path, comment_count = await crawler.crawl_comments_async(
+                    request.bvid, request.max_comments, request.resume, request.incremental, request.include_replies,
+                    on_progress=on_progress
+                )
             except Exception as crawl_error:
                 print(f"爬取评论失败: {str(crawl_error)}")
-                tasks[task_id]["status"] = "failed"
-                tasks[task_id]["progress"] = 0
+                await task_store.update_async(task_id, status="failed", progress=0)
                 return
             
-            tasks[task_id]["status"] = "processing"
-            tasks[task_id]["progress"] = 50
+            await task_store.update_async(task_id, status="processing", progress=50)
             
             try:
-                processor = CommentProcessor()
-                cleaned_file, cleaned_count = await asyncio.to_thread(processor.process_comments, file_path)
+                cleaned_file, cleaned_count = await asyncio.to_thread(clean_comments, file_path, request.storage)
             except Exception as process_error:
                 print(f"处理评论失败: {str(process_error)}")
-                tasks[task_id]["status"] = "failed"
-                tasks[task_id]["progress"] = 0
+                await task_store.update_async(task_id, status="failed", progress=0)
                 return
             
-            tasks[task_id]["status"] = "completed"
-            tasks[task_id]["progress"] = 100
-            tasks[task_id]["result"] = {
+            await task_store.update_async(task_id, status="completed", progress=100, result={
                 "file_path": str(cleaned_file),
                 "comment_count": comment_count,
                 "cleaned_count": cleaned_count
-            }
+            })
         except Exception as e:
             print(f"任务执行失败: {str(e)}")
-            tasks[task_id]["status"] = "failed"
-            tasks[task_id]["progress"] = 0
+            await task_store.update_async(task_id, status="failed", progress=0)
     
     # 启动后台任务
     asyncio.create_task(crawl_background())
@@ -96,49 +230,110 @@ async def crawl_comments(request: CrawlRequest):
         progress=0
     )
 
+@app.post("/api/crawl/batch", response_model=TaskStatus)
+async def crawl_batch(request: BatchCrawlRequest):
+    """批量爬取多个视频的评论"""
+    if not request.bvids:
+        raise HTTPException(status_code=400, detail="BV号列表不能为空")
+    
+    task_id = f"task_{os.urandom(8).hex()}"
+    videos = {}
+    await task_store.create_async(task_id, result={"videos": videos})
+    
+    write_progress = progress_writer(task_id)
+    
+    def on_progress(bvid: str, state: dict):
+        # 已完成的视频计为1，进行中的视频按已爬取评论数折算
+        status_changed = videos.get(bvid, {}).get("status") != state.get("status")
+        videos[bvid] = dict(state)
+        done = sum(
+            1 if v["status"] in ("completed", "failed")
+            else min(v.get("comment_count", 0) / max(request.max_comments, 1), 0.99)
+            for v in videos.values()
+        )
+        # 在写线程中序列化，传入副本；视频状态变化时总是写入
+        write_progress(round(done * 100 / len(set(request.bvids)), 1),
+                       {"videos": {key: dict(value) for key, value in videos.items()}}, force=status_changed)
+    
+    async def on_complete(bvid: str, file_path: Path) -> dict:
+        cleaned_file, cleaned_count = await asyncio.to_thread(clean_comments, file_path, request.storage)
+        return {"cleaned_file": str(cleaned_file), "cleaned_count": cleaned_count}
+    
+    async def crawl_batch_background():
+        try:
+            await task_store.update_async(task_id, status="crawling")
+            await crawl_scheduler.crawl_many(
+                request.bvids,
+                request.max_comments,
+                on_progress=on_progress,
+                on_complete=on_complete,
+                incremental=request.incremental,
+                include_replies=request.include_replies
+            )
+            failed = all(v["status"] == "failed" for v in videos.values())
+            await task_store.update_async(task_id, status="failed" if failed else "completed", progress=100)
+        except Exception as e:
+            print(f"批量爬取任务失败: {str(e)}")
+            await task_store.update_async(task_id, status="failed")
+    
+    asyncio.create_task(crawl_batch_background())
+    
+    return TaskStatus(
+        task_id=task_id,
+        status="running",
+        progress=0
+    )
+
 @app.post("/api/analyze", response_model=TaskStatus)
 async def analyze_comments(request: AnalyzeRequest):
     """分析评论"""
     task_id = f"task_{os.urandom(8).hex()}"
-    tasks[task_id] = {"status": "running", "progress": 0}
+    await task_store.create_async(task_id)
     
     # 立即返回任务状态，然后在后台执行分析
     async def analyze_background():
         try:
             input_file = Path(request.file_path)
             if not input_file.exists():
-                tasks[task_id]["status"] = "failed"
-                tasks[task_id]["progress"] = 0
+                await task_store.update_async(task_id, status="failed", progress=0)
                 return
             
             try:
-                analyzer = CommentAnalyzer(model_type=request.model, api_key=request.api_key)
+                analyzer = CommentAnalyzer(model_type=request.model, api_key=request.api_key, cache=analysis_cache,
+                                           local_classifier=local_classifier,
+                                           confidence_threshold=request.confidence_threshold)
             except Exception as analyzer_error:
                 print(f"创建分析器失败: {str(analyzer_error)}")
-                tasks[task_id]["status"] = "failed"
-                tasks[task_id]["progress"] = 0
+                await task_store.update_async(task_id, status="failed", progress=0)
                 return
             
-            tasks[task_id]["status"] = "analyzing"
-            tasks[task_id]["progress"] = 30
+            await task_store.update_async(task_id, status="analyzing", progress=30)
             
             try:
-                result_file = await analyzer.process_batch(input_file)
+                if ColumnStore.is_store(input_file):
+                    result_file = (await analyzer.process_store(ColumnStore(input_file))).path
+                else:
+                    total = await asyncio.to_thread(count_lines, input_file)
+                    
+                    write_progress = progress_writer(task_id)
+                    
+                    def on_progress(written: int):
+                        write_progress(round(30 + 70 * min(written / max(total, 1), 0.99), 1),
+                                       {"analyzed": written, "total": total})
+                    
+                    result_file = await analyzer.process_batch(input_file, resume=request.resume,
+                                                               on_progress=on_progress)
             except Exception as analyze_error:
                 print(f"分析评论失败: {str(analyze_error)}")
-                tasks[task_id]["status"] = "failed"
-                tasks[task_id]["progress"] = 0
+                await task_store.update_async(task_id, status="failed", progress=0)
                 return
             
-            tasks[task_id]["status"] = "completed"
-            tasks[task_id]["progress"] = 100
-            tasks[task_id]["result"] = {
+            await task_store.update_async(task_id, status="completed", progress=100, result={
                 "result_file": str(result_file)
-            }
+            })
         except Exception as e:
             print(f"任务执行失败: {str(e)}")
-            tasks[task_id]["status"] = "failed"
-            tasks[task_id]["progress"] = 0
+            await task_store.update_async(task_id, status="failed", progress=0)
     
     # 启动后台任务
     asyncio.create_task(analyze_background())
@@ -150,13 +345,64 @@ async def analyze_comments(request: AnalyzeRequest):
         progress=0
     )
 
+@app.post("/api/pipeline", response_model=TaskStatus)
+async def run_pipeline(request: PipelineRequest):
+    """流式爬取、清洗并分析评论（三个阶段同时进行）"""
+    try:
+        analyzer = CommentAnalyzer(model_type=request.model, api_key=request.api_key or None, cache=analysis_cache,
+                                   local_classifier=local_classifier,
+                                   confidence_threshold=request.confidence_threshold)
+    except Exception as analyzer_error:
+        raise HTTPException(status_code=400, detail=str(analyzer_error))
+    
+    task_id = f"task_{os.urandom(8).hex()}"
+    await task_store.create_async(task_id)
+    pipeline = StreamingPipeline(crawl_scheduler.crawler, CommentProcessor(), analyzer)
+    
+    write_progress = progress_writer(task_id)
+    
+    def on_progress(stats: dict):
+        write_progress(round(min(stats["analyzed"] / max(request.max_comments, 1), 0.99) * 100, 1), stats)
+    
+    async def pipeline_background():
+        try:
+            await task_store.update_async(task_id, status="streaming")
+            result = await pipeline.run(request.bvid, request.max_comments, request.include_replies, on_progress)
+            await task_store.update_async(task_id, status="completed", progress=100, result=result)
+        except Exception as e:
+            print(f"流式处理任务失败: {str(e)}")
+            await task_store.update_async(task_id, status="failed", progress=0)
+    
+    asyncio.create_task(pipeline_background())
+    
+    return TaskStatus(
+        task_id=task_id,
+        status="running",
+        progress=0
+    )
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """获取分析缓存的命中统计"""
+    return analysis_cache.stats
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus 文本格式的运行指标"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/providers/stats")
+async def get_provider_stats():
+    """获取各模型服务的请求调度统计（重试、限流、熔断、当前并发上限）"""
+    return governor_stats()
+
 @app.get("/api/task/{task_id}", response_model=TaskStatus)
 async def get_task_status(task_id: str):
     """获取任务状态"""
-    if task_id not in tasks:
+    task = await task_store.get_async(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="任务不存在")
     
-    task = tasks[task_id]
     return TaskStatus(
         task_id=task_id,
         status=task["status"],
@@ -164,31 +410,122 @@ async def get_task_status(task_id: str):
         result=task.get("result")
     )
 
+def format_event(event: str, data: dict) -> str:
+    """格式化一条SSE消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/api/task/{task_id}/events")
+async def stream_task_events(task_id: str):
+    """以SSE推送任务进度
+    
+    任务状态每次变化推送一条 ``progress`` 事件（status/progress/result/eta），任务完成或失败时
+    推送 ``done`` 事件后关闭连接。本进程内的更新立即推送，其他工作进程的更新每秒检查一次。
+    ``eta`` 为按本连接观察到的进度速度估算的剩余秒数，尚无法估算时为None。
+    """
+    if await task_store.get_async(task_id) is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+    
+    def on_change():
+        loop.call_soon_threadsafe(changed.set)
+    
+    async def events():
+        task_store.subscribe(task_id, on_change)
+        try:
+            last = None
+            started = time.monotonic()
+            start_progress = None
+            last_sent = started
+            while True:
+                # 先清除标记再读取，读取之后的更新会再次唤醒
+                changed.clear()
+                task = await task_store.get_async(task_id)
+                if task is None:
+                    yield format_event("done", {"task_id": task_id, "status": "expired"})
+                    return
+                if task != last:
+                    now = time.monotonic()
+                    if start_progress is None:
+                        start_progress = task["progress"]
+                    eta = None
+                    if start_progress < task["progress"] < 100:
+                        rate = (task["progress"] - start_progress) / max(now - started, 1e-6)
+                        eta = round((100 - task["progress"]) / rate, 1)
+                    final = task["status"] in ("completed", "failed")
+                    yield format_event("done" if final else "progress", dict(task, task_id=task_id, eta=eta))
+                    if final:
+                        return
+                    last = task
+                    last_sent = now
+                elif time.monotonic() - last_sent >= 15:
+                    # 心跳，避免代理因连接空闲而断开
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            task_store.unsubscribe(task_id, on_change)
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/api/results/{file_path}")
-async def get_results(file_path: str):
-    """获取分析结果"""
+async def get_results(file_path: str, request: Request):
+    """获取分析结果
+    
+    返回分析时生成的结果汇总（分类统计、示例总结、点赞加权占比、按日期统计），耗时与评论数无关；
+    旧的结果文件第一次查询时扫描生成汇总。响应带 ETag，请求头 If-None-Match 一致时返回304。
+    """
     try:
         result_file = Path(file_path)
         if not result_file.exists():
             raise HTTPException(status_code=404, detail="结果文件不存在")
         
-        # 统计分类结果
-        classifications = {"优": 0, "良": 0, "中": 0, "差": 0, "不明意义": 0}
-        summaries = []
-        
-        with open(result_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                data = json.loads(line.strip())
-                classification = data.get('classification', '不明意义')
-                if classification in classifications:
-                    classifications[classification] += 1
-                summaries.append(data.get('summary', ''))
+        summary_file = await asyncio.to_thread(ResultSummary.ensure, result_file)
+        body = summary_file.read_bytes()
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/comments")
+async def query_comments(file_path: str, classification: str | None = None, keyword: str | None = None,
+                         min_likes: int | None = None, max_likes: int | None = None,
+                         since: int | None = None, until: int | None = None,
+                         sort: str = "index", order: str = "asc", limit: int = 20, cursor: str | None = None):
+    """分页查询分析结果中的评论
+    
+    按分类、点赞数范围、时间窗口（Unix时间戳）和 ``cleaned_text`` 关键词过滤，按行号/点赞数/时间排序，
+    用上一页返回的 ``next_cursor`` 翻页。结果可以是JSONL文件或列存储目录。查询走分析完成时建立的索引（见 :class:`CommentIndex`），
+    不扫描结果文件；旧的结果文件第一次查询时建立索引。
+    """
+    try:
+        result_file = Path(file_path)
+        if not result_file.exists():
+            raise HTTPException(status_code=404, detail="结果文件不存在")
+        if result_file.is_dir() and not ColumnStore.is_store(result_file):
+            raise HTTPException(status_code=400, detail="评论查询只支持JSONL结果文件或列存储目录")
         
-        return {
-            "classifications": classifications,
-            "total": sum(classifications.values()),
-            "sample_summaries": summaries[:10]
-        }
+        index = await asyncio.to_thread(get_index, result_file)
+        return await asyncio.to_thread(
+            index.query, classification=classification, min_likes=min_likes, max_likes=max_likes,
+            since=since, until=until, keyword=keyword, sort=sort, order=order, limit=limit, cursor=cursor
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImportError as e:
+        raise HTTPException(status_code=501, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
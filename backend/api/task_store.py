@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+
+class TaskStore(ABC):
+    """任务状态存储基类
+    
+    每个任务保存 status/progress/result 三个字段。:meth:`update` 只修改传入的字段，
+    且整体原子生效，并发更新同一任务时不会互相覆盖未修改的字段。
+    超过 ``ttl`` 秒没有更新的任务会被清理，存储占用不会随任务数无限增长。
+    
+    :meth:`subscribe` 注册的回调在本进程内的任务更新后立即调用（在执行写入的线程中），
+    用于向客户端推送进度；其他进程的更新需要订阅方自行定期 :meth:`get`。
+    
+    存储操作可能因等待其他进程的锁而阻塞，在事件循环中应使用 ``*_async`` 方法：
+    读取在 :func:`asyncio.to_thread` 中执行；写入交给每个存储专用的单线程执行，按提交顺序生效。
+    """
+    
+    # 每写入这么多次检查一次是否有过期任务
+    CLEANUP_INTERVAL = 500
+    
+    def __init__(self, ttl: float = 24 * 3600):
+        """初始化任务存储
+        
+        Args:
+            ttl: 任务最后一次更新后保留的时间（秒），<= 0 表示不清理
+        """
+        self.ttl = ttl
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._watchers: dict[str, list[Callable[[], None]]] = {}
+        self._watchers_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-store")
+    
+    @abstractmethod
+    def create(self, task_id: str, status: str = "running", progress: float = 0, result: dict | None = None) -> None:
+        """创建任务（已存在时覆盖）"""
+    
+    @abstractmethod
+    def get(self, task_id: str) -> dict | None:
+        """读取任务状态
+        
+        Returns:
+            dict | None: 包含 status/progress/result 的字典，任务不存在或已过期时为None
+        """
+    
+    @abstractmethod
+    def update(self, task_id: str, status: str | None = None, progress: float | None = None,
+               result: dict | None = None) -> None:
+        """更新任务状态，值为None的字段保持不变
+        
+        Args:
+            task_id: 任务ID
+            status: 任务状态
+            progress: 任务进度（0-100）
+            result: 任务结果（整体替换）
+        """
+    
+    @abstractmethod
+    def cleanup(self) -> int:
+        """删除过期任务
+        
+        Returns:
+            int: 删除的任务数
+        """
+    
+    def close(self) -> None:
+        """关闭存储（等待已提交的写入完成）"""
+        self._writer.shutdown(wait=True)
+    
+    async def get_async(self, task_id: str) -> dict | None:
+        """在线程中读取任务状态，不阻塞事件循环"""
+        return await asyncio.to_thread(self.get, task_id)
+    
+    def create_async(self, task_id: str, status: str = "running", progress: float = 0,
+                     result: dict | None = None) -> asyncio.Future:
+        """提交创建任务的写入，参数同 :meth:`create`
+        
+        Returns:
+            asyncio.Future: 写入完成时完成，不需要等待时可以忽略
+        """
+        return asyncio.get_running_loop().run_in_executor(
+            self._writer, self.create, task_id, status, progress, result
+        )
+    
+    def update_async(self, task_id: str, status: str | None = None, progress: float | None = None,
+                     result: dict | None = None) -> asyncio.Future:
+        """提交更新任务的写入，参数同 :meth:`update`
+        
+        同一存储的写入按提交顺序执行，不等待的进度更新也不会覆盖之后提交的最终状态。
+        
+        Returns:
+            asyncio.Future: 写入完成时完成，不需要等待时可以忽略
+        """
+        return asyncio.get_running_loop().run_in_executor(
+            self._writer, self.update, task_id, status, progress, result
+        )
+    
+    def subscribe(self, task_id: str, callback: Callable[[], None]) -> None:
+        """订阅任务更新
+        
+        Args:
+            task_id: 任务ID
+            callback: 任务创建或更新后调用的无参回调
+        """
+        with self._watchers_lock:
+            self._watchers.setdefault(task_id, []).append(callback)
+    
+    def unsubscribe(self, task_id: str, callback: Callable[[], None]) -> None:
+        """取消订阅任务更新"""
+        with self._watchers_lock:
+            callbacks = self._watchers.get(task_id, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._watchers.pop(task_id, None)
+    
+    def _tick(self, task_id: str) -> None:
+        """记录一次写入：通知订阅者，并定期清理过期任务"""
+        with self._watchers_lock:
+            callbacks = list(self._watchers.get(task_id, ()))
+        for callback in callbacks:
+            callback()
+        self._writes += 1
+        if self._writes >= self.CLEANUP_INTERVAL:
+            self._writes = 0
+            self.cleanup()
+
+
+class MemoryTaskStore(TaskStore):
+    """进程内任务存储（只适用于单进程部署）"""
+    
+    def __init__(self, ttl: float = 24 * 3600):
+        super().__init__(ttl)
+        self._tasks: dict[str, dict] = {}
+    
+    def create(self, task_id: str, status: str = "running", progress: float = 0, result: dict | None = None) -> None:
+        with self._lock:
+            self._tasks[task_id] = {"status": status, "progress": progress, "result": result, "updated": time.time()}
+        self._tick(task_id)
+    
+    def get(self, task_id: str) -> dict | None:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None or (self.ttl > 0 and task["updated"] < time.time() - self.ttl):
+                return None
+            return {"status": task["status"], "progress": task["progress"], "result": task["result"]}
+    
+    def update(self, task_id: str, status: str | None = None, progress: float | None = None,
+               result: dict | None = None) -> None:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return
+            if status is not None:
+                task["status"] = status
+            if progress is not None:
+                task["progress"] = progress
+            if result is not None:
+                task["result"] = result
+            task["updated"] = time.time()
+        self._tick(task_id)
+    
+    def cleanup(self) -> int:
+        if self.ttl <= 0:
+            return 0
+        deadline = time.time() - self.ttl
+        with self._lock:
+            expired = [task_id for task_id, task in self._tasks.items() if task["updated"] < deadline]
+            for task_id in expired:
+                del self._tasks[task_id]
+        return len(expired)
+
+
+class SQLiteTaskStore(TaskStore):
+    """SQLite任务存储
+    
+    多个 uvicorn 工作进程打开同一个数据库文件即可共享任务状态，服务重启后状态仍然保留。
+    每次更新是一条 UPDATE 语句，由 SQLite 保证原子性。
+    """
+    
+    def __init__(self, path: Path = Path("data/tasks.db"), ttl: float = 24 * 3600):
+        """打开任务存储
+        
+        Args:
+            path: SQLite 数据库文件
+            ttl: 任务最后一次更新后保留的时间（秒），<= 0 表示不清理
+        """
+        super().__init__(ttl)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 其他进程写入时最多等待30秒
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "task_id TEXT PRIMARY KEY, status TEXT NOT NULL, progress REAL NOT NULL, result TEXT, "
+            "updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_updated ON tasks (updated)")
+        self._conn.commit()
+        self.cleanup()
+    
+    def create(self, task_id: str, status: str = "running", progress: float = 0, result: dict | None = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tasks (task_id, status, progress, result, updated) VALUES (?, ?, ?, ?, ?)",
+                (task_id, status, progress, self._dumps(result), time.time())
+            )
+            self._conn.commit()
+        self._tick(task_id)
+    
+    def get(self, task_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, progress, result, updated FROM tasks WHERE task_id = ?", (task_id,)
+            ).fetchone()
+        if row is None or (self.ttl > 0 and row[3] < time.time() - self.ttl):
+            return None
+        return {"status": row[0], "progress": row[1], "result": json.loads(row[2]) if row[2] else None}
+    
+    def update(self, task_id: str, status: str | None = None, progress: float | None = None,
+               result: dict | None = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET status = COALESCE(?, status), progress = COALESCE(?, progress), "
+                "result = COALESCE(?, result), updated = ? WHERE task_id = ?",
+                (status, progress, self._dumps(result), time.time(), task_id)
+            )
+            self._conn.commit()
+        self._tick(task_id)
+    
+    def cleanup(self) -> int:
+        if self.ttl <= 0:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM tasks WHERE updated < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+        return cursor.rowcount
+    
+    def close(self) -> None:
+        super().close()
+        with self._lock:
+            self._conn.close()
+    
+    @staticmethod
+    def _dumps(result: dict | None) -> str | None:
+        return json.dumps(result, ensure_ascii=False) if result is not None else None
+
+
+def create_task_store(spec: str = "", ttl: float = 24 * 3600) -> TaskStore:
+    """根据配置字符串创建任务存储
+    
+    支持的格式：
+        - ``""``: SQLite，数据库文件为 ``data/tasks.db``
+        - ``memory``: 进程内存储
+        - 其他: SQLite 数据库文件路径
+    
+    Args:
+        spec: 配置字符串（通常来自环境变量 BILI_TASK_STORE）
+        ttl: 任务最后一次更新后保留的时间（秒）
+    
+    Returns:
+        TaskStore: 任务存储
+    """
+    if spec == "memory":
+        return MemoryTaskStore(ttl)
+    return SQLiteTaskStore(Path(spec or "data/tasks.db"), ttl)
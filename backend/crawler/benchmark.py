@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""离线爬取基准测试
+
+在本地模拟服务器（或录制的回放数据）上运行爬取器，输出耗时、吞吐量和限流情况：
+
+    python -m backend.crawler.benchmark --comments 2000 --latency 0.1 --rate 20 --concurrency 8
+    python -m backend.crawler.benchmark --replay data/recordings --bvid BV1xx411c7mW
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from backend.crawler.bilibili_crawler import BilibiliCrawler
+from backend.crawler.mock_server import MockBilibiliServer
+from backend.crawler.transport import HTTPTransport, ReplayTransport
+
+
+def run_benchmark(transport, args) -> dict:
+    """用指定传输层爬取一次，返回统计结果"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        crawler = BilibiliCrawler(
+            Path(output_dir),
+            rate_limit=args.rate,
+            concurrency=args.concurrency,
+            reply_concurrency=args.reply_concurrency,
+            transport=transport,
+            retry_backoff=args.retry_backoff,
+            fallback_to_mock=False
+        )
+        start = time.perf_counter()
+        _, count = asyncio.run(crawler.crawl_comments_async(
+            args.bvid, args.max_comments, include_replies=args.replies > 0
+        ))
+        elapsed = time.perf_counter() - start
+    return {"comments": count, "seconds": elapsed, "comments_per_second": count / elapsed if elapsed else 0.0}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="离线爬取基准测试")
+    parser.add_argument("--bvid", default="BV1xx411c7mW")
+    parser.add_argument("--max-comments", type=int, default=100000)
+    parser.add_argument("--rate", type=float, default=20.0, help="令牌桶速率（请求/秒）")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时在途的分页请求数")
+    parser.add_argument("--reply-concurrency", type=int, default=4, help="同时爬取的回复串数")
+    parser.add_argument("--retry-backoff", type=float, default=0.2, help="首次重试等待秒数")
+    parser.add_argument("--comments", type=int, default=2000, help="模拟服务器每个视频的根评论数")
+    parser.add_argument("--replies", type=int, default=0, help="模拟服务器每条根评论的回复数")
+    parser.add_argument("--latency", type=float, default=0.1, help="模拟服务器每次请求的延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟服务器 HTTP 500 概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="模拟服务器 HTTP 429 概率")
+    parser.add_argument("--replay", type=Path, default=None, help="回放录制目录（不启动模拟服务器）")
+    args = parser.parse_args()
+    
+    if args.replay is not None:
+        result = run_benchmark(ReplayTransport(args.replay, latency=args.latency), args)
+        print(f"回放: {result}")
+        return
+    
+    with MockBilibiliServer(total_comments=args.comments, replies_per_root=args.replies,
+                            latency=args.latency, error_rate=args.error_rate,
+                            rate_limit_rate=args.rate_limit_rate) as mock:
+        result = run_benchmark(HTTPTransport(mock.base_url), args)
+        print(f"模拟服务器: {result}")
+        print(f"服务器统计: {mock.stats}")
+
+
+if __name__ == "__main__":
+    main()
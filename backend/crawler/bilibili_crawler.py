@@ -3,297 +3,356 @@ from __future__ import annotations
 
 import asyncio
 from pathlib import Path
-import json
 import time
+from typing import Awaitable, Callable
 
-from bilibili_api import video, sync
+from backend.crawler.comment_sink import CommentSink
+from backend.crawler.rate_limiter import TokenBucket
+from backend.crawler.transport import BilibiliAPITransport, CommentTransport, HTTPTransport, RetryableError
+from backend.monitoring.metrics import (CRAWL_COMMENTS, CRAWL_DURATION, CRAWL_FALLBACKS, CRAWL_INFLIGHT,
+                                        CRAWL_PAGE_LATENCY, CRAWL_PAGES, timed)
 
 
 class BilibiliCrawler:
     """哔哩哔哩评论爬取器"""
     
-    def __init__(self, output_dir: Path = Path("data/comments")):
+    def __init__(self, output_dir: Path = Path("data/comments"), rate_limit: float = 2.0, concurrency: int = 4,
+                 reply_concurrency: int = 4, max_thread_pages: int = 5, max_thread_replies: int = 100,
+                 rate_limiter: TokenBucket | None = None, session=None, transport: CommentTransport | None = None,
+                 max_retries: int = 3, retry_backoff: float = 1.0, fallback_to_mock: bool = True):
         """初始化爬取器
         
         Args:
             output_dir: 评论输出目录
+            rate_limit: 每秒最多发出的请求数（令牌桶速率，楼中楼请求共用）
+            concurrency: 同时在途的分页请求数上限
+            reply_concurrency: 同时爬取的楼中楼（回复串）数量上限
+            max_thread_pages: 每个回复串最多爬取的页数
+            max_thread_replies: 每个回复串最多保留的回复数
+            rate_limiter: 共享的令牌桶（多个爬取器共用同一限速预算时传入，忽略 rate_limit）
+            session: 共享的 requests.Session（HTTP传输层复用连接池）
+            transport: 指定的传输层（录制/回放/本地模拟服务器），默认依次尝试B站API和HTTP接口
+            max_retries: 遇到限流或服务端错误时的最大重试次数
+            retry_backoff: 首次重试前等待的秒数，之后每次翻倍
+            fallback_to_mock: 所有方式都失败时是否生成模拟评论（压测时应关闭）
         """
         self.output_dir = output_dir
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.concurrency = max(1, concurrency)
+        self.rate_limiter = rate_limiter or TokenBucket(rate_limit, capacity=self.concurrency)
+        self.reply_concurrency = max(1, reply_concurrency)
+        self.max_thread_pages = max_thread_pages
+        self.max_thread_replies = max_thread_replies
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.fallback_to_mock = fallback_to_mock
+        if transport is not None:
+            self.transports = [transport]
+        else:
+            self.transports = [BilibiliAPITransport(), HTTPTransport(session=session)]
     
-    def crawl_comments(self, bvid: str, max_comments: int = 10000) -> tuple[Path, int]:
-        """爬取视频评论
+    @staticmethod
+    def _parse_reply(item: dict) -> dict:
+        """将B站接口返回的单条评论转换为内部格式"""
+        return {
+            'id': str(item.get('rpid', '')),
+            'text': item.get('content', {}).get('message', ''),
+            'user': item.get('member', {}).get('uname', '未知用户'),
+            'likes': item.get('like', 0),
+            'time': item.get('ctime', int(time.time())),
+            'parent_id': str(item.get('parent') or '')  # 根评论为空字符串
+        }
+    
+    @staticmethod
+    def _test_comments(count: int) -> list[dict]:
+        """生成测试评论（所有爬取方式都失败时的备用数据）"""
+        import random
+        comments = []
+        for i in range(count):
+            # 生成一些不同类型的评论内容
+            comment_templates = [
+                f'这是测试评论{i}，内容很棒，支持up主！',
+                f'视频{i}拍得真不错，学到了很多东西。',
+                f'这个视频{i}很有创意，期待更多作品。',
+                f'内容一般{i}，希望能改进一下。',
+                f'不太喜欢这个视频{i}的风格。'
+            ]
+            comments.append({
+                'id': f'comment_{i}',
+                'text': random.choice(comment_templates),
+                'user': f'用户{i}',
+                'likes': i * 10,
+                'time': int(time.time()) - i * 3600
+            })
+        return comments
+    
+    @staticmethod
+    def _mock_comments(count: int) -> list[dict]:
+        """生成模拟真实评论（评论接口都失败时的备用数据）"""
+        import random
+        # 生成一些不同类型的评论内容，模拟真实评论
+        comment_templates = [
+            '这个视频做得真不错，学到了很多东西！',
+            '内容很详细，讲解也很清晰，支持up主！',
+            '视频质量很高，期待更多作品',
+            '感谢分享，对我很有帮助',
+            '内容一般般，希望能改进一下',
+            '视频太短了，不过瘾',
+            '讲解很专业，受益匪浅',
+            '画质清晰，声音清楚，体验很好',
+            '选题不错，内容充实',
+            '很喜欢这种风格的视频',
+            '内容有点无聊，建议增加互动',
+            '希望能出更多类似的视频',
+            '讲解速度适中，很适合学习',
+            '视频制作精良，值得推荐',
+            '内容有深度，值得思考',
+            '视频很有创意，耳目一新',
+            '讲解通俗易懂，适合新手',
+            '内容全面，覆盖了所有要点',
+            '视频节奏很好，不拖沓',
+            '感谢up主的用心制作'
+        ]
+        return [{
+            'id': f'real_comment_{i}',
+            'text': random.choice(comment_templates),
+            'user': f'真实用户{i}',
+            'likes': random.randint(0, 100),
+            'time': int(time.time()) - random.randint(0, 86400 * 30)  # 随机时间，30天内
+        } for i in range(count)]
+    
+    async def _request(self, fetch: Callable[[], Awaitable[dict]], kind: str = "page") -> list[dict]:
+        """在令牌桶限速下发出一次请求，限流或服务端错误时指数退避重试
         
         Args:
-            bvid: 视频BV号
-            max_comments: 最大评论数
+            fetch: 发出请求的协程函数
+            kind: 请求类型（page: 根评论分页，thread: 回复串分页），用于指标统计
             
         Returns:
-            tuple[Path, int]: (评论文件路径, 评论数量)
+            list[dict]: 响应中的评论列表，空列表表示没有更多评论
         """
-        comments = []
+        with timed(CRAWL_PAGE_LATENCY, kind=kind):
+            for attempt in range(self.max_retries + 1):
+                await self.rate_limiter.acquire()
+                try:
+                    result = await fetch()
+                    CRAWL_PAGES.inc(kind=kind, outcome="ok")
+                    return result.get('replies') or []
+                except RetryableError as e:
+                    if attempt == self.max_retries:
+                        CRAWL_PAGES.inc(kind=kind, outcome="error")
+                        raise
+                    CRAWL_PAGES.inc(kind=kind, outcome="retry")
+                    delay = self.retry_backoff * 2 ** attempt
+                    print(f"{str(e)}，{delay:.1f} 秒后重试")
+                    await asyncio.sleep(delay)
+                except Exception:
+                    CRAWL_PAGES.inc(kind=kind, outcome="error")
+                    raise
+        return []
+    
+    async def _crawl_thread(self, root: dict, sink: CommentSink, fetch_thread, semaphore: asyncio.Semaphore) -> None:
+        """获取一条根评论下的回复串
         
+        Args:
+            root: 根评论的原始数据
+            sink: 评论写入器
+            fetch_thread: 获取回复串分页的协程函数 (root_id, page) -> dict
+            semaphore: 限制同时爬取的回复串数量
+        """
+        root_id = str(root.get('rpid', ''))
+        preview = root.get('replies') or []
+        
+        # 评论页自带的预览回复已覆盖整个回复串时，不再额外请求
+        if root.get('rcount', 0) <= len(preview):
+            sink.write_rows([self._parse_reply(item) for item in preview[:self.max_thread_replies]])
+            await sink.publish()
+            return
+        
+        fetched = 0
+        limit = min(self.max_thread_replies, root.get('rcount', 0))
         try:
-            print(f"开始爬取视频 {bvid} 的评论，最大爬取 {max_comments} 条")
-            
-            # 1. 首先尝试使用B站API爬取真实评论
-            try:
-                print("尝试使用B站API爬取真实评论...")
-                
-                # 创建视频对象
-                v = video.Video(bvid=bvid)
-                
-                # 使用正确的方法获取评论
-                # 注意：bilibili-api-python 的评论获取方法可能会变化
-                # 这里使用通用的方法来获取评论
-                
-                # 获取视频信息
-                print("获取视频信息...")
-                video_info = sync(v.get_info())
-                print(f"视频标题: {video_info.get('title', '未知标题')}")
+            async with semaphore:
+                for page in range(1, self.max_thread_pages + 1):
+                    if sink.done or fetched >= limit:
+                        break
+                    replies = await self._request(lambda: fetch_thread(root_id, page), kind="thread")
+                    if not replies:
+                        break
+                    replies = replies[:limit - fetched]
+                    sink.write_rows([self._parse_reply(item) for item in replies])
+                    await sink.publish()
+                    fetched += len(replies)
+        except Exception as e:
+            # 单个回复串失败不影响整体爬取
+            print(f"获取评论 {root_id} 的回复失败: {str(e)}")
+    
+    async def _crawl_pages(self, fetch_page, sink: CommentSink, fetch_thread=None) -> None:
+        """并发分页获取评论并流式写入
+        
+        从 ``sink.next_page`` 开始，同时保持最多 ``self.concurrency`` 个分页请求在途，
+        请求节奏由令牌桶控制。分页可能乱序返回，已到达的页按页码顺序写入文件并更新检查点；
+        遇到第一个空页、达到评论上限或（增量模式下）遇到已存储的评论后停止。
+        
+        传入 ``fetch_thread`` 时，每写入一页就为其中新出现且有回复的根评论启动回复串爬取，
+        最多 ``self.reply_concurrency`` 个回复串同时进行，与根评论翻页共用令牌桶。
+        
+        Args:
+            fetch_page: 获取根评论分页的协程函数 (page) -> dict
+            sink: 评论写入器
+            fetch_thread: 获取回复串分页的协程函数 (root_id, page) -> dict，None 表示不爬取回复
+        """
+        ready: dict[int, list[dict]] = {}
+        pending: dict[asyncio.Future, int] = {}
+        threads: list[asyncio.Future] = []
+        semaphore = asyncio.Semaphore(self.reply_concurrency)
+        next_page = flush_page = sink.next_page
+        end_page: int | None = None  # 第一个空页的页码
+        
+        try:
+            while True:
+                while (len(pending) < self.concurrency and not sink.done
+                       and (end_page is None or next_page < end_page)):
+                    print(f"正在获取第 {next_page} 页评论...")
+                    task = asyncio.ensure_future(self._request(lambda page=next_page: fetch_page(page)))
+                    pending[task] = next_page
+                    next_page += 1
+                if not pending:
+                    break
                 
-                # 尝试使用不同的评论获取方法
-                try:
-                    # 方法1：使用评论模块
-                    from bilibili_api import comment
-                    cm = comment.Comment(bvid=bvid, type_=comment.CommentType.VIDEO)
-                    
-                    # 分页获取评论
-                    page = 1
-                    while len(comments) < max_comments:
-                        print(f"正在获取第 {page} 页评论...")
-                        
-                        # 获取评论列表
-                        comment_list = sync(cm.get_comments(page=page))
-                        
-                        if not comment_list.get('replies', []):
-                            print("没有更多评论了")
-                            break
-                        
-                        # 处理评论
-                        for item in comment_list['replies']:
-                            if len(comments) >= max_comments:
-                                break
-                            
-                            comment_data = {
-                                'id': str(item.get('rpid', '')),
-                                'text': item.get('content', {}).get('message', ''),
-                                'user': item.get('member', {}).get('uname', '未知用户'),
-                                'likes': item.get('like', 0),
-                                'time': item.get('ctime', int(time.time()))
-                            }
-                            
-                            # 过滤空评论
-                            if comment_data['text']:
-                                comments.append(comment_data)
-                                
-                                # 每获取10条评论打印一次进度
-                                if len(comments) % 10 == 0:
-                                    print(f"已获取 {len(comments)} 条评论")
-                        
-                        page += 1
-                        # 避免请求过快被封禁
-                        time.sleep(1)
-                        
-                except Exception as e:
-                    print(f"评论模块调用失败: {str(e)}")
-                    print("尝试使用视频对象的评论方法...")
-                    
-                    # 方法2：尝试使用视频对象的评论方法
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                error = None
+                for task in done:
+                    page = pending.pop(task)
                     try:
-                        # 这里需要根据bilibili-api-python的实际API进行调整
-                        # 由于API可能会变化，这里使用一个通用的尝试
-                        comments = []
-                        print("使用备用评论获取方法...")
-                        
-                        # 模拟评论获取过程，实际项目中需要根据最新API调整
-                        # 这里我们使用一个更可靠的方法：直接请求B站API
-                        import requests
-                        import re
-                        
-                        # 获取cid
-                        cid = video_info.get('cid', 0)
-                        if not cid:
-                            raise Exception("无法获取视频cid")
-                        
-                        # B站评论API
-                        api_url = f"https://api.bilibili.com/x/v2/reply/main?oid={cid}&type=1"
-                        
-                        page = 1
-                        while len(comments) < max_comments:
-                            print(f"正在获取第 {page} 页评论...")
-                            
-                            # 构造请求参数
-                            params = {
-                                'next': page,
-                                'ps': 20,  # 每页20条评论
-                                'sort': 2  # 按热度排序
-                            }
-                            
-                            # 发送请求
-                            response = requests.get(api_url, params=params)
-                            data = response.json()
-                            
-                            if data.get('code') != 0:
-                                raise Exception(f"API请求失败: {data.get('message', '未知错误')}")
-                            
-                            reply_data = data.get('data', {})
-                            replies = reply_data.get('replies', [])
-                            
-                            if not replies:
-                                print("没有更多评论了")
-                                break
-                            
-                            # 处理评论
-                            for item in replies:
-                                if len(comments) >= max_comments:
-                                    break
-                                
-                                comment_data = {
-                                    'id': str(item.get('rpid', '')),
-                                    'text': item.get('content', {}).get('message', ''),
-                                    'user': item.get('member', {}).get('uname', '未知用户'),
-                                    'likes': item.get('like', 0),
-                                    'time': item.get('ctime', int(time.time()))
-                                }
-                                
-                                # 过滤空评论
-                                if comment_data['text']:
-                                    comments.append(comment_data)
-                                    
-                                    # 每获取10条评论打印一次进度
-                                    if len(comments) % 10 == 0:
-                                        print(f"已获取 {len(comments)} 条评论")
-                            
-                            page += 1
-                            # 避免请求过快被封禁
-                            time.sleep(1)
-                            
-                    except Exception as inner_e:
-                        print(f"备用方法失败: {str(inner_e)}")
-                        print("使用最终备用方案...")
-                        
-                        # 最终备用方案：使用模拟数据（仅当所有API方法都失败时）
-                        print("所有API方法都失败，使用模拟数据")
-                        # 生成测试数据，尊重用户设置的最大评论数
-                        for i in range(max_comments):
-                            # 生成一些不同类型的评论内容，模拟真实评论
-                            comment_templates = [
-                                '这个视频做得真不错，学到了很多东西！',
-                                '内容很详细，讲解也很清晰，支持up主！',
-                                '视频质量很高，期待更多作品',
-                                '感谢分享，对我很有帮助',
-                                '内容一般般，希望能改进一下',
-                                '视频太短了，不过瘾',
-                                '讲解很专业，受益匪浅',
-                                '画质清晰，声音清楚，体验很好',
-                                '选题不错，内容充实',
-                                '很喜欢这种风格的视频',
-                                '内容有点无聊，建议增加互动',
-                                '希望能出更多类似的视频',
-                                '讲解速度适中，很适合学习',
-                                '视频制作精良，值得推荐',
-                                '内容有深度，值得思考',
-                                '视频很有创意，耳目一新',
-                                '讲解通俗易懂，适合新手',
-                                '内容全面，覆盖了所有要点',
-                                '视频节奏很好，不拖沓',
-                                '感谢up主的用心制作'
-                            ]
-                            import random
-                            comment_data = {
-                                'id': f'real_comment_{i}',
-                                'text': random.choice(comment_templates),
-                                'user': f'真实用户{i}',
-                                'likes': random.randint(0, 100),
-                                'time': int(time.time()) - random.randint(0, 86400 * 30)  # 随机时间，30天内
-                            }
-                            comments.append(comment_data)
-                        
-                        # 打印当前进度
-                        print(f"已生成 {len(comments)} 条模拟评论")
-                
-                # 打印当前进度
-                print(f"已获取 {len(comments)} 条真实评论")
+                        replies = task.result()
+                    except Exception as e:
+                        error = error or e
+                        continue
+                    if not replies:
+                        if end_page is None or page < end_page:
+                            print("没有更多评论了")
+                            end_page = page
+                        continue
+                    ready[page] = replies
                 
-            except Exception as e:
-                print(f"B站API调用失败: {str(e)}")
-                print("使用备用方案...")
+                # 按页码顺序写入已连续到达的页
+                while flush_page in ready and not sink.done:
+                    replies = ready.pop(flush_page)
+                    if fetch_thread is not None:
+                        threads.extend(
+                            asyncio.ensure_future(self._crawl_thread(item, sink, fetch_thread, semaphore))
+                            for item in replies
+                            if item.get('rcount') and str(item.get('rpid', '')) not in sink.known_ids
+                        )
+                    sink.write_page(flush_page, [self._parse_reply(item) for item in replies])
+                    flush_page += 1
+                    print(f"已获取 {sink.count} 条评论")
+                    # 下游（流式流水线）处理不过来时在此等待，不再继续翻页
+                    await sink.publish()
                 
-                # 备用方案：生成测试数据
-                print("生成测试数据...")
-                # 生成测试数据，尊重用户设置的最大评论数
-                for i in range(max_comments):
-                    # 生成一些不同类型的评论内容
-                    comment_templates = [
-                        f'这是测试评论{i}，内容很棒，支持up主！',
-                        f'视频{i}拍得真不错，学到了很多东西。',
-                        f'这个视频{i}很有创意，期待更多作品。',
-                        f'内容一般{i}，希望能改进一下。',
-                        f'不太喜欢这个视频{i}的风格。'
-                    ]
-                    import random
-                    comment_data = {
-                        'id': f'comment_{i}',
-                        'text': random.choice(comment_templates),
-                        'user': f'用户{i}',
-                        'likes': i * 10,
-                        'time': int(time.time()) - i * 3600
-                    }
-                    comments.append(comment_data)
+                # 先把已到达的页落盘再抛出异常，续爬时从检查点继续
+                if error is not None:
+                    raise error
             
-            # 2. 如果没有爬取到评论，使用备用方案
-            if len(comments) == 0:
-                print("没有爬取到评论，使用备用方案生成测试数据")
-                # 生成测试数据，尊重用户设置的最大评论数
-                for i in range(max_comments):
-                    # 生成一些不同类型的评论内容
-                    comment_templates = [
-                        f'这是测试评论{i}，内容很棒，支持up主！',
-                        f'视频{i}拍得真不错，学到了很多东西。',
-                        f'这个视频{i}很有创意，期待更多作品。',
-                        f'内容一般{i}，希望能改进一下。',
-                        f'不太喜欢这个视频{i}的风格。'
-                    ]
-                    import random
-                    comment_data = {
-                        'id': f'comment_{i}',
-                        'text': random.choice(comment_templates),
-                        'user': f'用户{i}',
-                        'likes': i * 10,
-                        'time': int(time.time()) - i * 3600
-                    }
-                    comments.append(comment_data)
+            if threads:
+                print(f"等待 {len(threads)} 个回复串爬取完成...")
+                await asyncio.gather(*threads)
+        finally:
+            for task in [*pending, *threads]:
+                task.cancel()
+    
+    async def _crawl_with(self, transport: CommentTransport, bvid: str, sink: CommentSink,
+                          include_replies: bool) -> None:
+        """使用指定传输层爬取评论（从 ``sink.next_page`` 开始）"""
+        print(f"使用{transport.name}获取视频信息...")
+        video_info = await transport.get_video_info(bvid)
+        print(f"视频标题: {video_info.get('title', '未知标题')}")
+        
+        fetch_thread = None
+        if include_replies:
+            fetch_thread = lambda root_id, page: transport.get_thread_page(bvid, root_id, page)
+        await self._crawl_pages(
+            lambda page: transport.get_page(bvid, page, sink.incremental), sink, fetch_thread
+        )
+    
+    async def crawl_comments_async(self, bvid: str, max_comments: int = 10000, resume: bool = False,
+                                   incremental: bool = False, include_replies: bool = False,
+                                   on_progress: Callable[[int], None] | None = None,
+                                   on_rows: Callable[[list[dict]], Awaitable[None]] | None = None) -> tuple[Path, int]:
+        """异步爬取视频评论
+        
+        依次尝试各个传输层（默认先B站API、再直接请求HTTP接口），每页评论到达后立即写入文件，
+        并记录分页检查点；前一个传输层中途失败时，后一个从检查点页码继续。
+        所有方式都失败且没有任何评论时，按 ``fallback_to_mock`` 生成模拟评论。
+        
+        Args:
+            bvid: 视频BV号
+            max_comments: 最大评论数
+            resume: 存在检查点时是否从检查点续爬
+            incremental: 是否只爬取尚未存储的新评论
+            include_replies: 是否同时爬取根评论下的回复串（楼中楼）
+            on_progress: 进度回调，参数为文件中已有的评论数
+            on_rows: 新评论写入文件后的异步回调，参数为本次新写入的评论（不含文件中原有的评论）
             
-            # 3. 保存原始评论
-            output_file = self.output_dir / f"{bvid}_raw.jsonl"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                for comment in comments:
-                    json.dump(comment, f, ensure_ascii=False)
-                    f.write('\n')
+        Returns:
+            tuple[Path, int]: (评论文件路径, 文件中的评论数量)
+        """
+        sink = CommentSink(self.output_dir / f"{bvid}_raw.jsonl", max_comments, resume, incremental, on_progress,
+                           on_rows)
+        completed = False
+        transport_name = "none"
+        started = time.perf_counter()
+        CRAWL_INFLIGHT.inc()
+        try:
+            print(f"开始爬取视频 {bvid} 的评论，最大爬取 {max_comments} 条")
             
-            print(f"爬取完成，共获取 {len(comments)} 条评论")
-            return output_file, len(comments)
-        except Exception as e:
-            print(f"爬取评论失败: {str(e)}")
+            for transport in self.transports:
+                try:
+                    await self._crawl_with(transport, bvid, sink, include_replies)
+                    completed = True
+                    transport_name = transport.name
+                    break
+                except Exception as e:
+                    print(f"{transport.name}爬取失败: {str(e)}")
+                    CRAWL_FALLBACKS.inc(reason="transport_error")
             
-            # 4. 如果出现任何错误，使用备用方案 - 生成少量测试数据
-            comments = []
-            for i in range(min(5, max_comments)):
-                comment_data = {
-                    'id': f'comment_{i}',
-                    'text': f'这是测试评论{i}，内容很棒，支持up主！',
-                    'user': f'用户{i}',
-                    'likes': i * 10,
-                    'time': int(time.time()) - i * 3600
-                }
-                comments.append(comment_data)
+            # 所有方式都失败（或视频没有评论）且没有任何已存储评论时，使用备用方案
+            if sink.total == 0 and self.fallback_to_mock:
+                if completed:
+                    print("没有爬取到评论，使用备用方案生成测试数据")
+                    CRAWL_FALLBACKS.inc(reason="test_data")
+                    sink.write_rows(self._test_comments(max_comments))
+                else:
+                    print("所有API方法都失败，使用模拟数据")
+                    CRAWL_FALLBACKS.inc(reason="mock_data")
+                    sink.write_rows(self._mock_comments(max_comments))
+                await sink.publish()
             
-            output_file = self.output_dir / f"{bvid}_raw.jsonl"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                for comment in comments:
-                    json.dump(comment, f, ensure_ascii=False)
-                    f.write('\n')
+            print(f"爬取完成，本次新增 {sink.count} 条评论，共 {sink.total} 条")
+            return sink.output_file, sink.total
+        finally:
+            sink.close(completed)
+            CRAWL_INFLIGHT.dec()
+            CRAWL_COMMENTS.inc(sink.count)
+            CRAWL_DURATION.observe(time.perf_counter() - started, transport=transport_name)
+    
+    def crawl_comments(self, bvid: str, max_comments: int = 10000, resume: bool = False,
+                       incremental: bool = False, include_replies: bool = False,
+                       on_progress: Callable[[int], None] | None = None) -> tuple[Path, int]:
+        """爬取视频评论（同步接口，在新的事件循环中运行 :meth:`crawl_comments_async`）
+        
+        Args:
+            bvid: 视频BV号
+            max_comments: 最大评论数
+            resume: 存在检查点时是否从检查点续爬
+            incremental: 是否只爬取尚未存储的新评论
+            include_replies: 是否同时爬取根评论下的回复串（楼中楼）
+            on_progress: 进度回调，参数为文件中已有的评论数
             
-            print(f"使用备用方案，生成了 {len(comments)} 条测试评论")
-            return output_file, len(comments)
+        Returns:
+            tuple[Path, int]: (评论文件路径, 文件中的评论数量)
+        """
+        return asyncio.run(self.crawl_comments_async(
+            bvid, max_comments, resume, incremental, include_replies, on_progress
+        ))
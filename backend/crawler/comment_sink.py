@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Awaitable, Callable
+
+
+class CommentSink:
+    """评论流式写入器
+    
+    每页评论到达后立即追加写入 ``{bvid}_raw.jsonl``，并在
+    ``{bvid}_raw.checkpoint.json`` 中记录下一页页码，进程中断后可以从检查点续爬。
+    评论按 rpid 去重，所以重复写入同一页是安全的。
+    
+    三种模式：
+        - 全新爬取：清空已有文件；
+        - 续爬（resume）：存在检查点时，从检查点页码继续追加；
+        - 增量（incremental）：保留已有文件，遇到已存储的 rpid 后停止，
+          只追加新评论。增量模式依赖评论按时间倒序返回。
+    """
+    
+    def __init__(self, output_file: Path, max_comments: int, resume: bool = False, incremental: bool = False,
+                 on_progress: Callable[[int], None] | None = None,
+                 on_rows: Callable[[list[dict]], Awaitable[None]] | None = None):
+        """初始化写入器
+        
+        Args:
+            output_file: 原始评论文件路径
+            max_comments: 最大评论数（增量模式下指本次新增的评论数）
+            resume: 存在检查点时是否续爬
+            incremental: 是否只追加新评论
+            on_progress: 每次写入后的回调，参数为文件中的评论总数
+            on_rows: 新写入评论的异步回调，由 :meth:`publish` 调用，可在下游处理不过来时阻塞爬取
+        """
+        self.output_file = output_file
+        self.checkpoint_file = output_file.with_name(f"{output_file.stem}.checkpoint.json")
+        self.max_comments = max_comments
+        self.next_page = 1
+        self.known_ids: set[str] = set()
+        self.stop_ids: set[str] = set()
+        self.existing = 0  # 本次爬取开始前文件中已有的评论数
+        self.count = 0  # 本次爬取写入的评论数
+        self.reached_known = False
+        self.incremental = incremental
+        self.baseline_rows = 0
+        self.on_progress = on_progress
+        self.on_rows = on_rows
+        self.unpublished: list[dict] = []
+        
+        checkpoint = self._load_checkpoint() if resume else None
+        if checkpoint is not None:
+            self.next_page = checkpoint.get('next_page', 1)
+            self.incremental = checkpoint.get('incremental', False)
+            self.baseline_rows = checkpoint.get('baseline_rows', 0)
+            self._load_existing(stop_rows=self.baseline_rows)
+            # 续爬时，max_comments 仍然针对整个文件（增量模式下针对本轮新增）
+            if not self.incremental:
+                self.max_comments = max(0, max_comments - self.existing)
+            else:
+                self.max_comments = max(0, max_comments - (self.existing - self.baseline_rows))
+            print(f"从检查点续爬：第 {self.next_page} 页，已有 {self.existing} 条评论")
+        elif incremental and output_file.exists():
+            self._load_existing(stop_rows=None)
+            self.baseline_rows = self.existing
+            print(f"增量爬取：已存储 {self.existing} 条评论")
+        else:
+            self.incremental = False
+            output_file.write_text('', encoding='utf-8')
+            self.checkpoint_file.unlink(missing_ok=True)
+        
+        self._file = open(output_file, 'a', encoding='utf-8')
+    
+    def _load_checkpoint(self) -> dict | None:
+        """读取检查点，不存在或已损坏时返回None"""
+        if not self.checkpoint_file.exists() or not self.output_file.exists():
+            return None
+        try:
+            return json.loads(self.checkpoint_file.read_text(encoding='utf-8'))
+        except Exception as e:
+            print(f"读取检查点失败: {str(e)}")
+            return None
+    
+    def _load_existing(self, stop_rows: int | None) -> None:
+        """读取已存储评论的 rpid，并保证文件以换行结尾
+        
+        Args:
+            stop_rows: 文件前多少行属于增量爬取开始前的存量评论，None 表示全部
+        """
+        with open(self.output_file, 'rb') as f:
+            for index, line in enumerate(f):
+                try:
+                    comment_id = json.loads(line)['id']
+                except Exception:
+                    continue
+                self.known_ids.add(comment_id)
+                if stop_rows is None or index < stop_rows:
+                    self.stop_ids.add(comment_id)
+                self.existing += 1
+            # 中断时可能留下半行，补一个换行避免与后续记录粘连
+            if f.tell() > 0:
+                f.seek(-1, 2)
+                if f.read(1) != b'\n':
+                    with open(self.output_file, 'ab') as out:
+                        out.write(b'\n')
+    
+    @property
+    def total(self) -> int:
+        """文件中的评论总数"""
+        return self.existing + self.count
+    
+    @property
+    def done(self) -> bool:
+        """是否应停止继续翻页"""
+        return self.count >= self.max_comments or self.reached_known
+    
+    def write_rows(self, rows: list[dict]) -> int:
+        """追加写入评论（跳过空评论和已存储的评论）
+        
+        Args:
+            rows: 评论列表
+        
+        Returns:
+            int: 实际写入的评论数
+        """
+        written = 0
+        for row in rows:
+            if self.count >= self.max_comments:
+                break
+            if not row['text']:
+                continue
+            if row['id'] in self.known_ids:
+                if self.incremental and row['id'] in self.stop_ids:
+                    self.reached_known = True
+                continue
+            self.known_ids.add(row['id'])
+            json.dump(row, self._file, ensure_ascii=False)
+            self._file.write('\n')
+            self.count += 1
+            written += 1
+            if self.on_rows is not None:
+                self.unpublished.append(row)
+        self._file.flush()
+        if written and self.on_progress is not None:
+            self.on_progress(self.total)
+        return written
+    
+    async def publish(self) -> None:
+        """把尚未交给 ``on_rows`` 的新评论交给下游"""
+        if self.on_rows is None or not self.unpublished:
+            return
+        rows, self.unpublished = self.unpublished, []
+        await self.on_rows(rows)
+    
+    def write_page(self, page: int, rows: list[dict]) -> int:
+        """写入一页评论并更新检查点
+        
+        Args:
+            page: 页码
+            rows: 该页的评论列表
+        
+        Returns:
+            int: 实际写入的评论数
+        """
+        written = self.write_rows(rows)
+        self.next_page = page + 1
+        self.checkpoint_file.write_text(json.dumps({
+            'next_page': self.next_page,
+            'count': self.total,
+            'incremental': self.incremental,
+            'baseline_rows': self.baseline_rows
+        }), encoding='utf-8')
+        return written
+    
+    def close(self, completed: bool) -> None:
+        """关闭文件；爬取正常结束时删除检查点
+        
+        Args:
+            completed: 翻页是否正常结束
+        """
+        self._file.close()
+        if completed:
+            self.checkpoint_file.unlink(missing_ok=True)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from backend.crawler.bilibili_crawler import BilibiliCrawler
+from backend.crawler.rate_limiter import TokenBucket
+from backend.crawler.transport import create_transport
+
+
+class CrawlScheduler:
+    """多视频爬取调度器
+    
+    所有视频共用一个令牌桶（全局请求预算）、一个带连接池的 HTTP 会话和一个爬取器实例。
+    每个视频最多只有 ``per_video_concurrency`` 个请求在途，令牌按到达顺序发放，
+    因此同时进行的视频会轮流获得请求配额，不会出现某个大视频独占预算的情况。
+    """
+    
+    def __init__(self, output_dir: Path = Path("data/comments"), rate_limit: float = 4.0,
+                 per_video_concurrency: int = 2, max_parallel_videos: int = 8, pool_size: int = 16,
+                 transport_spec: str = ""):
+        """初始化调度器
+        
+        Args:
+            output_dir: 评论输出目录
+            rate_limit: 所有视频合计每秒最多发出的请求数
+            per_video_concurrency: 每个视频同时在途的分页请求数上限
+            max_parallel_videos: 同时爬取的视频数上限
+            pool_size: HTTP 连接池大小
+            transport_spec: 传输层配置（见 :func:`create_transport`），为空时使用默认传输层
+        """
+        self.rate_limiter = TokenBucket(rate_limit, capacity=max(1.0, rate_limit))
+        self.max_parallel_videos = max(1, max_parallel_videos)
+        self.session = self._create_session(pool_size)
+        self.crawler = BilibiliCrawler(
+            output_dir,
+            concurrency=per_video_concurrency,
+            rate_limiter=self.rate_limiter,
+            session=self.session,
+            transport=create_transport(transport_spec, session=self.session)
+        )
+    
+    @staticmethod
+    def _create_session(pool_size: int):
+        """创建复用 TCP/TLS 连接的 requests 会话"""
+        try:
+            import requests
+            from requests.adapters import HTTPAdapter
+        except ImportError:
+            return None
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+    
+    async def crawl_many(self, bvids: list[str], max_comments: int = 10000,
+                         on_progress: Callable[[str, dict], None] | None = None,
+                         on_complete: Callable[[str, Path], Awaitable[dict]] | None = None,
+                         **options) -> dict[str, dict]:
+        """批量爬取多个视频的评论
+        
+        Args:
+            bvids: 视频BV号列表（重复的BV号只爬取一次）
+            max_comments: 每个视频的最大评论数
+            on_progress: 进度回调，参数为 (BV号, 该视频的状态)
+            on_complete: 单个视频爬取完成后的异步回调，返回值合并到该视频的状态中
+            **options: 传给 :meth:`BilibiliCrawler.crawl_comments_async` 的其他参数
+        
+        Returns:
+            dict[str, dict]: 每个视频的状态（status/comment_count/file_path/error）
+        """
+        videos = {bvid: {"status": "pending", "comment_count": 0} for bvid in dict.fromkeys(bvids)}
+        slots = asyncio.Semaphore(self.max_parallel_videos)
+        
+        def notify(bvid: str) -> None:
+            if on_progress is not None:
+                on_progress(bvid, videos[bvid])
+        
+        async def run(bvid: str) -> None:
+            state = videos[bvid]
+            async with slots:
+                state["status"] = "crawling"
+                notify(bvid)
+                
+                def report(count: int) -> None:
+                    state["comment_count"] = count
+                    notify(bvid)
+                
+                try:
+                    file_path, comment_count = await self.crawler.crawl_comments_async(
+                        bvid, max_comments, on_progress=report, **options
+                    )
+                    state.update(status="crawled", file_path=str(file_path), comment_count=comment_count)
+                    if on_complete is not None:
+                        notify(bvid)
+                        state.update(await on_complete(bvid, file_path))
+                    state["status"] = "completed"
+                except Exception as e:
+                    print(f"爬取视频 {bvid} 失败: {str(e)}")
+                    state.update(status="failed", error=str(e))
+                notify(bvid)
+        
+        await asyncio.gather(*(run(bvid) for bvid in videos))
+        return videos
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class MockBilibiliServer:
+    """本地模拟的B站评论接口服务器
+    
+    实现爬取器用到的三个接口，返回确定性的评论数据（同一参数多次请求结果相同）：
+        - ``/x/web-interface/view?bvid=``: 视频信息
+        - ``/x/v2/reply/main?oid=&next=&ps=``: 根评论分页（按时间倒序）
+        - ``/x/v2/reply/reply?oid=&root=&pn=&ps=``: 楼中楼分页
+    
+    可配置每次请求的延迟、500错误率和429限流率，用于离线测量爬取吞吐量和限流表现。
+    """
+    
+    TEMPLATES = [
+        '这个视频做得真不错，学到了很多东西！',
+        '内容很详细，讲解也很清晰，支持up主！',
+        '内容一般般，希望能改进一下',
+        '视频太短了，不过瘾',
+        '画质清晰，声音清楚，体验很好',
+        '内容有点无聊，建议增加互动'
+    ]
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, total_comments: int = 1000,
+                 replies_per_root: int = 0, latency: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, seed: int = 0):
+        """初始化模拟服务器
+        
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示随机分配
+            total_comments: 每个视频的根评论总数
+            replies_per_root: 每条根评论下的回复数
+            latency: 每次请求的延迟（秒）
+            error_rate: 返回 HTTP 500 的概率
+            rate_limit_rate: 返回 HTTP 429 的概率
+            seed: 随机种子（只影响错误注入）
+        """
+        self.total_comments = total_comments
+        self.replies_per_root = replies_per_root
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.stats = {"requests": 0, "rate_limited": 0, "errors": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self) -> "MockBilibiliServer":
+        """在后台线程中启动服务器"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self) -> None:
+        """停止服务器"""
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def __enter__(self) -> "MockBilibiliServer":
+        return self.start()
+    
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+    
+    def _reply(self, oid: int, rpid: int, index: int, root: int = 0) -> dict:
+        return {
+            'rpid': rpid,
+            'oid': oid,
+            'root': root,
+            'parent': root,
+            'rcount': 0 if root else self.replies_per_root,
+            'like': rpid % 100,
+            'ctime': 1700000000 - index * 60,
+            'member': {'uname': f'用户{rpid}'},
+            'content': {'message': f'{self.TEMPLATES[rpid % len(self.TEMPLATES)]}（{rpid}）'}
+        }
+    
+    def _video_info(self, params: dict) -> dict:
+        bvid = params.get('bvid', 'BV0')
+        aid = zlib.crc32(bvid.encode('utf-8')) % 10 ** 8 + 1
+        return {'bvid': bvid, 'aid': aid, 'cid': aid, 'title': f'模拟视频 {bvid}'}
+    
+    def _root_page(self, params: dict) -> dict:
+        oid = int(params.get('oid', 1))
+        page = int(params.get('next', 1))
+        page_size = int(params.get('ps', 20))
+        start = (page - 1) * page_size
+        end = min(self.total_comments, start + page_size)
+        replies = []
+        for index in range(start, end):
+            # rpid 随时间递增，最新的评论排在最前
+            rpid = oid * 10 ** 10 + (self.total_comments - index) * 1000
+            reply = self._reply(oid, rpid, index)
+            reply['replies'] = [self._reply(oid, rpid + k + 1, index, root=rpid)
+                                for k in range(min(3, self.replies_per_root))]
+            replies.append(reply)
+        return {'cursor': {'is_end': end >= self.total_comments}, 'replies': replies}
+    
+    def _thread_page(self, params: dict) -> dict:
+        oid = int(params.get('oid', 1))
+        root = int(params.get('root', 0))
+        page = int(params.get('pn', 1))
+        page_size = int(params.get('ps', 20))
+        start = (page - 1) * page_size
+        end = min(self.replies_per_root, start + page_size)
+        return {'replies': [self._reply(oid, root + k + 1, k, root=root) for k in range(start, end)]}
+    
+    def _make_handler(self):
+        server = self
+        routes = {
+            '/x/web-interface/view': self._video_info,
+            '/x/v2/reply/main': self._root_page,
+            '/x/v2/reply/reply': self._thread_page
+        }
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                with server._lock:
+                    server.stats["requests"] += 1
+                    roll = server._random.random()
+                if server.latency > 0:
+                    time.sleep(server.latency)
+                
+                if url.path not in routes:
+                    self._send(404, {'code': -404, 'message': '啥都木有'})
+                elif roll < server.rate_limit_rate:
+                    with server._lock:
+                        server.stats["rate_limited"] += 1
+                    self._send(429, {'code': -412, 'message': '请求过于频繁'})
+                elif roll < server.rate_limit_rate + server.error_rate:
+                    with server._lock:
+                        server.stats["errors"] += 1
+                    self._send(500, {'code': -500, 'message': '服务器错误'})
+                else:
+                    self._send(200, {'code': 0, 'message': '0', 'data': routes[url.path](params)})
+            
+            def _send(self, status: int, body: dict) -> None:
+                payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="本地模拟B站评论接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--comments", type=int, default=1000, help="每个视频的根评论数")
+    parser.add_argument("--replies", type=int, default=0, help="每条根评论的回复数")
+    parser.add_argument("--latency", type=float, default=0.05, help="每次请求的延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="HTTP 500 概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="HTTP 429 概率")
+    args = parser.parse_args()
+    
+    mock = MockBilibiliServer(args.host, args.port, args.comments, args.replies,
+                              args.latency, args.error_rate, args.rate_limit_rate)
+    print(f"模拟B站接口运行在 {mock.base_url}，设置 BILI_TRANSPORT={mock.base_url} 让爬取器使用它")
+    mock.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock.stop()
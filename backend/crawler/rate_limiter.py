@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """令牌桶限速器
+    
+    以 ``rate`` 个/秒的速度补充令牌，最多积累 ``capacity`` 个。
+    取令牌时先在锁内"预订"，再在锁外等待，因此同一个实例既可以在
+    多个协程之间共享，也可以跨线程、跨事件循环共享。
+    """
+    
+    def __init__(self, rate: float, capacity: float | None = None):
+        """初始化令牌桶
+        
+        Args:
+            rate: 每秒补充的令牌数，<= 0 表示不限速
+            capacity: 令牌桶容量（允许的突发请求数），默认等于 max(1, rate)
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _reserve(self, tokens: float) -> float:
+        """预订令牌，返回需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # 令牌可以透支，透支部分即为后来者需要排队等待的时间
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+    
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """异步获取令牌
+        
+        Args:
+            tokens: 需要的令牌数
+        """
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def acquire_sync(self, tokens: float = 1.0) -> None:
+        """同步获取令牌（阻塞当前线程）
+        
+        Args:
+            tokens: 需要的令牌数
+        """
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
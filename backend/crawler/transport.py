@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+import asyncio
+import json
+from pathlib import Path
+
+
+class RetryableError(Exception):
+    """可重试的请求错误（服务端错误等）"""
+
+
+class RateLimitedError(RetryableError):
+    """接口限流（HTTP 429 或 B站风控返回码）"""
+
+
+class CommentTransport(ABC):
+    """评论数据传输层基类
+    
+    爬取器只通过这三个方法获取数据，返回值均为B站接口 ``data`` 字段的内容：
+        - get_video_info: 视频信息（至少包含 aid/title）
+        - get_page: 一页根评论（``replies`` 为评论列表）
+        - get_thread_page: 一页楼中楼回复（``replies`` 为回复列表）
+    """
+    
+    name = "transport"
+    
+    @abstractmethod
+    async def get_video_info(self, bvid: str) -> dict:
+        """视频信息"""
+    
+    @abstractmethod
+    async def get_page(self, bvid: str, page: int, by_time: bool = False) -> dict:
+        """一页根评论，``by_time`` 为真时按时间倒序（增量模式依赖此顺序）"""
+    
+    @abstractmethod
+    async def get_thread_page(self, bvid: str, root_id: str, page: int) -> dict:
+        """一页楼中楼回复"""
+
+
+class BilibiliAPITransport(CommentTransport):
+    """基于 bilibili_api 协程的传输层"""
+    
+    name = "B站API"
+    
+    def __init__(self):
+        self._aids: dict[str, int] = {}
+    
+    async def get_video_info(self, bvid: str) -> dict:
+        from bilibili_api import video
+        info = await video.Video(bvid=bvid).get_info()
+        self._aids[bvid] = info.get('aid', 0)
+        return info
+    
+    async def get_page(self, bvid: str, page: int, by_time: bool = False) -> dict:
+        # bilibili-api-python 17.x：评论列表为模块级函数，按视频的 aid 获取
+        # 增量模式依赖按时间倒序返回（遇到已存储的评论即停止），否则按点赞数排序
+        from bilibili_api import comment
+        if bvid not in self._aids:
+            await self.get_video_info(bvid)
+        order = comment.OrderType.TIME if by_time else comment.OrderType.LIKE
+        return await comment.get_comments(
+            self._aids[bvid], comment.CommentResourceType.VIDEO, page_index=page, order=order
+        )
+    
+    async def get_thread_page(self, bvid: str, root_id: str, page: int) -> dict:
+        from bilibili_api import comment
+        if bvid not in self._aids:
+            await self.get_video_info(bvid)
+        sub = comment.Comment(oid=self._aids[bvid], type_=comment.CommentResourceType.VIDEO, rpid=int(root_id))
+        return await sub.get_sub_comments(page_index=page)
+
+
+class HTTPTransport(CommentTransport):
+    """直接请求B站（或本地模拟服务器）HTTP接口的传输层"""
+    
+    name = "HTTP接口"
+    
+    def __init__(self, base_url: str = "https://api.bilibili.com", session=None, page_size: int = 20,
+                 timeout: float = 10.0):
+        """初始化HTTP传输层
+        
+        Args:
+            base_url: 接口地址，可指向本地模拟服务器
+            session: 复用的 requests.Session，默认新建
+            page_size: 每页评论数
+            timeout: 单次请求超时（秒）
+        """
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = session or requests.Session()
+        self.page_size = page_size
+        self.timeout = timeout
+        self._aids: dict[str, int] = {}
+    
+    def _get(self, path: str, params: dict) -> dict:
+        response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        if response.status_code == 429:
+            raise RateLimitedError(f"请求被限流: {path}")
+        if response.status_code >= 500:
+            raise RetryableError(f"服务端错误 {response.status_code}: {path}")
+        response.raise_for_status()
+        data = response.json()
+        if data.get('code') in (-412, -509):
+            raise RateLimitedError(f"请求被限流: {data.get('message', '')}")
+        if data.get('code') != 0:
+            raise Exception(f"API请求失败: {data.get('message', '未知错误')}")
+        return data.get('data') or {}
+    
+    async def get_video_info(self, bvid: str) -> dict:
+        info = await asyncio.to_thread(self._get, "/x/web-interface/view", {'bvid': bvid})
+        if not info.get('aid'):
+            raise Exception("无法获取视频aid")
+        self._aids[bvid] = info['aid']
+        return info
+    
+    async def get_page(self, bvid: str, page: int, by_time: bool = False) -> dict:
+        params = {
+            'oid': self._aids[bvid],
+            'type': 1,
+            'next': page,
+            'ps': self.page_size,
+            'sort': 0 if by_time else 2  # 0按时间排序，2按热度排序
+        }
+        return await asyncio.to_thread(self._get, "/x/v2/reply/main", params)
+    
+    async def get_thread_page(self, bvid: str, root_id: str, page: int) -> dict:
+        params = {'oid': self._aids[bvid], 'type': 1, 'root': root_id, 'pn': page, 'ps': self.page_size}
+        return await asyncio.to_thread(self._get, "/x/v2/reply/reply", params)
+
+
+class RecordingTransport(CommentTransport):
+    """录制模式：透传请求，并把每个响应保存到磁盘
+    
+    目录结构为 ``{record_dir}/{bvid}/info.json``、``page_{n}.json``、``thread_{root}_{n}.json``，
+    可以直接交给 :class:`ReplayTransport` 回放。
+    """
+    
+    def __init__(self, inner: CommentTransport, record_dir: Path):
+        self.inner = inner
+        self.record_dir = Path(record_dir)
+        self.name = f"{inner.name}(录制)"
+    
+    def _save(self, bvid: str, name: str, data: dict) -> dict:
+        video_dir = self.record_dir / bvid
+        video_dir.mkdir(parents=True, exist_ok=True)
+        (video_dir / f"{name}.json").write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+        return data
+    
+    async def get_video_info(self, bvid: str) -> dict:
+        return self._save(bvid, "info", await self.inner.get_video_info(bvid))
+    
+    async def get_page(self, bvid: str, page: int, by_time: bool = False) -> dict:
+        return self._save(bvid, f"page_{page}", await self.inner.get_page(bvid, page, by_time))
+    
+    async def get_thread_page(self, bvid: str, root_id: str, page: int) -> dict:
+        return self._save(bvid, f"thread_{root_id}_{page}", await self.inner.get_thread_page(bvid, root_id, page))
+
+
+class ReplayTransport(CommentTransport):
+    """回放模式：从 :class:`RecordingTransport` 录制的目录读取响应，不访问网络
+    
+    未录制的分页视为空页（即评论已取完）。
+    """
+    
+    name = "回放"
+    
+    def __init__(self, record_dir: Path, latency: float = 0.0):
+        """初始化回放传输层
+        
+        Args:
+            record_dir: 录制目录
+            latency: 每次请求模拟的延迟（秒）
+        """
+        self.record_dir = Path(record_dir)
+        self.latency = latency
+    
+    async def _load(self, bvid: str, name: str) -> dict | None:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        path = self.record_dir / bvid / f"{name}.json"
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding='utf-8'))
+    
+    async def get_video_info(self, bvid: str) -> dict:
+        info = await self._load(bvid, "info")
+        if info is None:
+            raise Exception(f"没有视频 {bvid} 的录制数据")
+        return info
+    
+    async def get_page(self, bvid: str, page: int, by_time: bool = False) -> dict:
+        return await self._load(bvid, f"page_{page}") or {'replies': []}
+    
+    async def get_thread_page(self, bvid: str, root_id: str, page: int) -> dict:
+        return await self._load(bvid, f"thread_{root_id}_{page}") or {'replies': []}
+
+
+def create_transport(spec: str, session=None) -> CommentTransport | None:
+    """根据配置字符串创建传输层
+    
+    支持的格式：
+        - ``""``: 返回None，使用爬取器默认的传输层
+        - ``http://host:port``: 请求指定地址（如本地模拟服务器）
+        - ``record:目录``: 请求B站API并录制响应
+        - ``replay:目录``: 回放录制的响应
+    
+    Args:
+        spec: 配置字符串（通常来自环境变量 BILI_TRANSPORT）
+        session: 复用的 requests.Session
+    
+    Returns:
+        CommentTransport | None: 传输层实例
+    """
+    if not spec:
+        return None
+    if spec.startswith(('http://', 'https://')):
+        return HTTPTransport(spec, session=session)
+    if spec.startswith('record:'):
+        return RecordingTransport(BilibiliAPITransport(), Path(spec[len('record:'):]))
+    if spec.startswith('replay:'):
+        return ReplayTransport(Path(spec[len('replay:'):]))
+    raise ValueError(f"不支持的传输层配置: {spec}")
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+import sqlite3
+import threading
+import time
+
+
+class AnalysisCache:
+    """模型分析结果缓存（SQLite）
+    
+    以 ``sha256(命名空间 + 清洗后文本)`` 为键保存 (总结, 分类)，命名空间由模型类型、模型名称和
+    提示版本组成，更换模型或修改提示后不会命中旧结果。重复分析同一文件、增量爬取后重新分析，
+    或不同视频中出现相同评论时，只有缓存中没有的评论才会请求模型。
+    
+    淘汰策略：超过 ``max_age`` 秒未被使用的条目会被删除；条目数超过 ``max_entries`` 时
+    删除最久未使用的条目。
+    """
+    
+    # 每写入这么多条目检查一次是否需要淘汰
+    EVICT_INTERVAL = 1000
+    
+    def __init__(self, path: Path = Path("data/cache/analysis.db"), max_entries: int = 200000,
+                 max_age: float = 30 * 24 * 3600):
+        """打开缓存
+        
+        Args:
+            path: SQLite 数据库文件
+            max_entries: 最多保留的条目数，<= 0 表示不限
+            max_age: 条目最长未使用时间（秒），<= 0 表示不限
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis ("
+            "key TEXT PRIMARY KEY, summary TEXT NOT NULL, classification TEXT NOT NULL, "
+            "created REAL NOT NULL, used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS analysis_used ON analysis (used)")
+        self._conn.commit()
+        self.evict()
+    
+    @staticmethod
+    def make_key(text: str, namespace: str) -> str:
+        """计算缓存键
+        
+        Args:
+            text: 清洗后的评论文本
+            namespace: 命名空间（模型类型/模型名称/提示版本）
+        
+        Returns:
+            str: 缓存键
+        """
+        return hashlib.sha256(f"{namespace}\x00{text}".encode('utf-8')).hexdigest()
+    
+    def get_many(self, keys: list[str]) -> dict[str, tuple[str, str]]:
+        """批量读取缓存，并刷新命中条目的使用时间
+        
+        Args:
+            keys: 缓存键列表
+        
+        Returns:
+            dict[str, tuple[str, str]]: 命中的 键 -> (总结, 分类)
+        """
+        unique = list(dict.fromkeys(keys))
+        found: dict[str, tuple[str, str]] = {}
+        with self._lock:
+            # SQLite 单条语句的参数个数有限，分块查询
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                marks = ','.join('?' * len(chunk))
+                for key, summary, classification in self._conn.execute(
+                    f"SELECT key, summary, classification FROM analysis WHERE key IN ({marks})", chunk
+                ):
+                    found[key] = (summary, classification)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE analysis SET used = ? WHERE key = ?", [(now, key) for key in found])
+                self._conn.commit()
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+    
+    def put_many(self, items: dict[str, tuple[str, str]]) -> None:
+        """批量写入缓存
+        
+        Args:
+            items: 键 -> (总结, 分类)
+        """
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO analysis (key, summary, classification, created, used) VALUES (?, ?, ?, ?, ?)",
+                [(key, summary, classification, now, now) for key, (summary, classification) in items.items()]
+            )
+            self._conn.commit()
+            self._writes += len(items)
+            if self._writes < self.EVICT_INTERVAL:
+                return
+            self._writes = 0
+        self.evict()
+    
+    def evict(self) -> int:
+        """按使用时间和条目数淘汰缓存
+        
+        Returns:
+            int: 删除的条目数
+        """
+        removed = 0
+        with self._lock:
+            if self.max_age > 0:
+                removed += self._conn.execute(
+                    "DELETE FROM analysis WHERE used < ?", (time.time() - self.max_age,)
+                ).rowcount
+            if self.max_entries > 0:
+                removed += self._conn.execute(
+                    "DELETE FROM analysis WHERE key IN "
+                    "(SELECT key FROM analysis ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                ).rowcount
+            self._conn.commit()
+        return removed
+    
+    def clear(self) -> None:
+        """清空缓存和统计"""
+        with self._lock:
+            self._conn.execute("DELETE FROM analysis")
+            self._conn.commit()
+            self.hits = self.misses = 0
+    
+    @property
+    def stats(self) -> dict:
+        """命中统计"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+    
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
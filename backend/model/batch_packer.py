@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import math
+from typing import List, Optional, Tuple
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数
+    
+    非ASCII字符（汉字、全角标点、表情）按每字1.5个token计，ASCII字符按每4个1个token计，
+    对中文评论偏保守，宁可少装几条也不让输出被截断。
+    
+    Args:
+        text: 文本
+    
+    Returns:
+        int: 估算的token数
+    """
+    # UTF-8 下汉字占3字节，用字节数估算非ASCII字符数，避免逐字符判断
+    extra_bytes = len(text.encode('utf-8')) - len(text)
+    non_ascii = min(len(text), (extra_bytes + 1) // 2)
+    return math.ceil(non_ascii * 1.5 + (len(text) - non_ascii) / 4)
+
+
+class BatchPacker:
+    """按token预算把评论打包成批
+    
+    每批在估算的输入token（提示 + 评论）和输出token（每条评论的预计输出）都不超过模型预算的前提下
+    尽量多装评论：短评论一次请求可以装几十条，长评论则自动减少条数，避免输出被截断。
+    批内评论保持原有顺序，各批首尾相接。
+    """
+    
+    # 提示中除评论外的固定部分（说明、格式要求、系统提示）
+    PROMPT_TOKENS = 150
+    # 每条评论的编号和换行
+    ITEM_TOKENS = 4
+    
+    def __init__(self, max_input_tokens: int = 2000, max_output_tokens: int = 1500, max_items: int = 50):
+        """初始化打包器
+        
+        Args:
+            max_input_tokens: 每次请求的输入token预算
+            max_output_tokens: 每次请求的输出token预算
+            max_items: 每批最多的评论数
+        """
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens
+        self.max_items = max(1, max_items)
+    
+    @staticmethod
+    def summary_tokens(max_length: int = 20) -> int:
+        """总结请求中每条评论的预计输出token数（编号 + 总结）"""
+        return math.ceil(max_length * 1.5) + 8
+    
+    @staticmethod
+    def classify_tokens() -> int:
+        """分类请求中每条评论的预计输出token数（编号 + 分类）"""
+        return 8
+    
+    @staticmethod
+    def combined_tokens(max_length: int = 20) -> int:
+        """合并请求中每条评论的预计输出token数（JSON对象 + 总结 + 分类）"""
+        return math.ceil(max_length * 1.5) + 30
+    
+    def pack(self, comments: List[str], item_output_tokens: int,
+             max_items: Optional[int] = None) -> List[Tuple[int, int]]:
+        """把评论切分为满足token预算的连续区间
+        
+        单条评论本身就超过输入预算时单独成批。
+        
+        Args:
+            comments: 评论列表
+            item_output_tokens: 每条评论的预计输出token数
+            max_items: 每批最多的评论数，默认使用打包器的 ``max_items``
+        
+        Returns:
+            List[Tuple[int, int]]: 各批在评论列表中的 [start, end) 区间
+        """
+        limit = min(self.max_items, max_items) if max_items else self.max_items
+        batches = []
+        start = 0
+        input_tokens = self.PROMPT_TOKENS
+        output_tokens = 0
+        for i, comment in enumerate(comments):
+            cost = estimate_tokens(comment) + self.ITEM_TOKENS
+            full = (i - start >= limit
+                    or input_tokens + cost > self.max_input_tokens
+                    or output_tokens + item_output_tokens > self.max_output_tokens)
+            if full and i > start:
+                batches.append((start, i))
+                start = i
+                input_tokens = self.PROMPT_TOKENS
+                output_tokens = 0
+            input_tokens += cost
+            output_tokens += item_output_tokens
+        if start < len(comments):
+            batches.append((start, len(comments)))
+        return batches
+    
+    def max_tokens(self, count: int, item_output_tokens: int) -> int:
+        """一批评论请求时应设置的 ``max_tokens``（预计输出留出余量，不超过输出预算）
+        
+        Args:
+            count: 批内评论数
+            item_output_tokens: 每条评论的预计输出token数
+        
+        Returns:
+            int: max_tokens 参数
+        """
+        return min(self.max_output_tokens, math.ceil(count * item_output_tokens * 1.25) + 50)
@@ -1,17 +1,158 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import hashlib
 import json
 import openai
 from pathlib import Path
-from typing import List, Dict, Optional
+import threading
+import time
+from typing import Awaitable, Callable, List, Dict, Optional, Set, Tuple
+
+from backend.model.analysis_cache import AnalysisCache
+from backend.model.batch_packer import BatchPacker
+from backend.model.governor import get_governor
+from backend.model.lexicon import SentimentLexicon, get_default_lexicon
+from backend.model.local_classifier import NGramClassifier
+from backend.monitoring.metrics import ANALYZE_COMMENTS, ANALYZE_DURATION, ANALYZE_FALLBACKS, LLM_BATCH_SIZE
+from backend.processor.dedup import CommentDeduplicator, collapse
+from backend.storage.column_store import ColumnStore
+from backend.storage.comment_index import build_index
+from backend.storage.result_summary import ResultSummary
+
+# 合法的分类结果
+CLASSIFICATIONS = ('优', '良', '中', '差', '不明意义')
+# 提示版本，修改提示内容后递增，使分析缓存失效
+PROMPT_VERSION = 1
+
+
+def build_analysis_prompt(comments: List[str], max_length: int = 20) -> str:
+    """构建同时要求总结和分类、以JSON数组返回的提示
+    
+    Args:
+        comments: 评论列表
+        max_length: 总结的最大长度（字数）
+        
+    Returns:
+        str: 提示内容
+    """
+    prompt = (
+        f"请对以下每条评论给出{max_length}字左右的简洁总结（保持原意），"
+        "并分类为：优（非常正面）、良（比较正面）、中（中性）、差（负面）、不明意义（无法判断）。\n"
+        '只输出一个JSON数组，不要输出其他内容，每条评论对应一个元素，格式为 '
+        '{"id": 评论编号, "summary": "总结", "classification": "分类"}\n\n'
+    )
+    for i, comment in enumerate(comments, 1):
+        prompt += f"{i}. {comment}\n"
+    return prompt
+
+
+def parse_analysis(text: str, count: int) -> Dict[int, Tuple[str, str]]:
+    """解析并校验模型返回的JSON数组
+    
+    id 越界、总结为空或分类不合法的元素会被丢弃，同一 id 只取第一个。
+    
+    Args:
+        text: 模型返回的文本（允许在JSON数组前后有多余内容，如代码块标记）
+        count: 提示中的评论条数
+        
+    Returns:
+        Dict[int, Tuple[str, str]]: 评论下标（从0开始） -> (总结, 分类)
+    """
+    text = text or ''
+    start, end = text.find('['), text.rfind(']')
+    if start < 0 or end < start:
+        return {}
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+    
+    results = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.get('id'))
+        except (TypeError, ValueError):
+            continue
+        summary = item.get('summary')
+        classification = item.get('classification')
+        if (1 <= index <= count and isinstance(summary, str) and summary.strip()
+                and classification in CLASSIFICATIONS):
+            results.setdefault(index - 1, (summary.strip(), classification))
+    return results
+
+
+def local_summary(comment: str, max_length: int = 20) -> str:
+    """本地总结：截取前max_length个字符"""
+    if len(comment) > max_length:
+        return comment[:max_length] + "..."
+    return comment
+
+
+async def analyze_with_retry(request: Callable[[str, int], Awaitable[str]], comments: List[str],
+                             max_length: int = 20, packer: Optional[BatchPacker] = None,
+                             retries: int = 2) -> Dict[int, Tuple[str, str]]:
+    """一次调用同时总结和分类，只重试结果缺失或不合法的评论
+    
+    评论先按token预算打包，每批一次请求，``max_tokens`` 按批内评论数设置。
+    
+    Args:
+        request: 发送提示并返回模型文本的协程函数 (prompt, max_tokens) -> str
+        comments: 评论列表
+        max_length: 总结的最大长度（字数）
+        packer: 按token预算打包评论，默认使用 :class:`BatchPacker` 的默认预算
+        retries: 最多重试次数
+        
+    Returns:
+        Dict[int, Tuple[str, str]]: 评论下标 -> (总结, 分类)，重试后仍失败的评论不在其中
+    """
+    packer = packer or BatchPacker()
+    item_tokens = packer.combined_tokens(max_length)
+    results: Dict[int, Tuple[str, str]] = {}
+    for start, end in packer.pack(comments, item_tokens):
+        pending = list(range(start, end))
+        for _ in range(retries + 1):
+            if not pending:
+                break
+            text = await request(
+                build_analysis_prompt([comments[i] for i in pending], max_length),
+                packer.max_tokens(len(pending), item_tokens)
+            )
+            for position, result in parse_analysis(text, len(pending)).items():
+                results[pending[position]] = result
+            pending = [i for i in pending if i not in results]
+    return results
 
 
 class DefaultFreeAnalyzer:
     """默认免费分析器 - 使用百度ERNIE Bot"""
     
-    def __init__(self):
-        """初始化默认分析器"""
+    # 同时在途的请求数上限（免费接口限流较严）
+    max_concurrency = 2
+    # ERNIE SDK 只有同步接口，所有实例共用一个有界线程池发请求，不阻塞事件循环
+    ERNIE_WORKERS = 4
+    _ernie_executor: Optional[ThreadPoolExecutor] = None
+    # 每次请求的输入/输出token预算
+    max_input_tokens = 2000
+    max_output_tokens = 2000
+    
+    def __init__(self, lexicon: Optional[SentimentLexicon] = None):
+        """初始化默认分析器
+        
+        Args:
+            lexicon: 本地分类使用的情感词典，默认见 :func:`get_default_lexicon`
+        """
+        self.lexicon = lexicon or get_default_lexicon()
+        self.packer = BatchPacker(self.max_input_tokens, self.max_output_tokens)
+        self.governor = get_governor("ernie", max_limit=self.ERNIE_WORKERS)
         try:
             # 尝试导入百度ERNIE Bot SDK
             from erniebot import ChatCompletion
@@ -21,54 +162,125 @@ class DefaultFreeAnalyzer:
             self.use_ernie = False
             print("百度ERNIE Bot SDK未安装，使用本地实现")
     
-    async def summarize_comments(self, comments: List[str], max_length: int = 20) -> List[str]:
+    async def summarize_comments(self, comments: List[str], max_length: int = 20,
+                                 produced: Optional[Set[int]] = None) -> List[str]:
         """批量总结评论
         
         Args:
             comments: 评论列表
             max_length: 总结的最大长度（字数）
+            produced: 传入时，加入由模型（而不是本地备用实现）给出结果的评论下标
             
         Returns:
             List[str]: 总结后的评论列表
         """
         if self.use_ernie:
-            return await self._ernie_summarize(comments, max_length)
+            return await self._ernie_summarize(comments, max_length, produced)
         else:
+            ANALYZE_FALLBACKS.inc(len(comments), reason="ernie_unavailable")
             return await self._local_summarize(comments, max_length)
     
-    async def classify_comments(self, comments: List[str]) -> List[str]:
+    async def classify_comments(self, comments: List[str], produced: Optional[Set[int]] = None) -> List[str]:
         """批量分类评论
         
         Args:
             comments: 评论列表
+            produced: 传入时，加入由模型（而不是本地备用实现）给出结果的评论下标
             
         Returns:
             List[str]: 分类结果列表（优/良/中/差/不明意义）
         """
         if self.use_ernie:
-            return await self._ernie_classify(comments)
+            return await self._ernie_classify(comments, produced)
         else:
             return await self._local_classify(comments)
     
-    async def _ernie_summarize(self, comments: List[str], max_length: int = 20) -> List[str]:
+    async def analyze_comments(self, comments: List[str], max_length: int = 20,
+                               produced: Optional[Set[int]] = None) -> Tuple[List[str], List[str]]:
+        """一次请求同时总结并分类评论
+        
+        Args:
+            comments: 评论列表
+            max_length: 总结的最大长度（字数）
+            produced: 传入时，加入由模型（而不是本地备用实现）给出结果的评论下标
+            
+        Returns:
+            Tuple[List[str], List[str]]: (总结列表, 分类列表)
+        """
+        results = {}
+        if self.use_ernie:
+            try:
+                results = await analyze_with_retry(self._ernie_request, comments, max_length, self.packer)
+            except Exception as e:
+                print(f"ERNIE Bot分析失败: {str(e)}")
+        if produced is not None:
+            produced.update(results)
+        
+        # ERNIE不可用或多次重试仍失败的评论使用本地实现
+        missing = [i for i in range(len(comments)) if i not in results]
+        if missing:
+            ANALYZE_FALLBACKS.inc(len(missing), reason="ernie_error" if self.use_ernie else "ernie_unavailable")
+            missing_comments = [comments[i] for i in missing]
+            local_summaries = await self._local_summarize(missing_comments, max_length)
+            local_classifications = await self._local_classify(missing_comments)
+            for i, summary, classification in zip(missing, local_summaries, local_classifications):
+                results[i] = (summary, classification)
+        return [results[i][0] for i in range(len(comments))], [results[i][1] for i in range(len(comments))]
+    
+    async def _ernie_create(self, **kwargs) -> dict:
+        """在专用线程池中调用同步的 ``ChatCompletion.create``
+        
+        请求经过共享的调度器：限流时退避重试并降低并发，连续失败时熔断。
+        
+        Args:
+            **kwargs: 传给 ``ChatCompletion.create`` 的参数
+            
+        Returns:
+            dict: ERNIE Bot 的响应
+        """
+        from erniebot import ChatCompletion
+        
+        if DefaultFreeAnalyzer._ernie_executor is None:
+            DefaultFreeAnalyzer._ernie_executor = ThreadPoolExecutor(
+                max_workers=self.ERNIE_WORKERS, thread_name_prefix="ernie"
+            )
+        loop = asyncio.get_running_loop()
+        return await self.governor.run(lambda: loop.run_in_executor(
+            DefaultFreeAnalyzer._ernie_executor, functools.partial(ChatCompletion.create, **kwargs)
+        ))
+    
+    async def _ernie_request(self, prompt: str, max_tokens: int) -> str:
+        """发送一次分析请求，返回模型文本"""
+        response = await self._ernie_create(
+            model="ernie-3.5",
+            messages=[
+                {"role": "system", "content": "你是一个专业的评论分析助手，擅长提炼评论的核心观点并判断情感倾向。"},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.1,
+            max_tokens=max_tokens
+        )
+        return response.get('result', '')
+    
+    async def _ernie_summarize(self, comments: List[str], max_length: int = 20,
+                               produced: Optional[Set[int]] = None) -> List[str]:
         """使用ERNIE Bot总结评论
         
         Args:
             comments: 评论列表
             max_length: 总结的最大长度（字数）
+            produced: 传入时，加入由模型给出结果的评论下标（失败改用本地实现时不加入）
             
         Returns:
             List[str]: 总结后的评论列表
         """
         try:
-            from erniebot import ChatCompletion
-            
             summaries = []
-            # 分批处理，每批最多5条评论
-            batch_size = 5
+            # 按token预算分批处理
+            item_tokens = self.packer.summary_tokens(max_length)
             
-            for i in range(0, len(comments), batch_size):
-                batch = comments[i:i+batch_size]
+            for start, end in self.packer.pack(comments, item_tokens):
+                batch = comments[start:end]
                 
                 # 构建提示
                 prompt = f"请将以下每条评论总结为{max_length}字左右的简洁描述，保持原意：\n\n"
@@ -76,14 +288,14 @@ class DefaultFreeAnalyzer:
                     prompt += f"{j}. {comment}\n"
                 
                 # 调用ERNIE Bot API
-                response = ChatCompletion.create(
+                response = await self._ernie_create(
                     model="ernie-3.5",
                     messages=[
                         {"role": "system", "content": "你是一个专业的评论总结助手，擅长提炼评论的核心观点。"},
                         {"role": "user", "content": prompt}
                     ],
                     temperature=0.3,
-                    max_tokens=500
+                    max_tokens=self.packer.max_tokens(len(batch), item_tokens)
                 )
                 
                 # 解析结果
@@ -92,36 +304,35 @@ class DefaultFreeAnalyzer:
                                 for line in summary_text.strip().split('\n') if line]
                 
                 summaries.extend(batch_summaries[:len(batch)])
-                
-                # 避免请求过快
-                import asyncio
-                await asyncio.sleep(0.5)
             
-            return summaries[:len(comments)]
+            summaries = summaries[:len(comments)]
+            if produced is not None:
+                produced.update(range(len(summaries)))
+            return summaries
             
         except Exception as e:
             print(f"ERNIE Bot总结失败: {str(e)}")
             # 失败时使用本地实现
+            ANALYZE_FALLBACKS.inc(len(comments), reason="ernie_error")
             return await self._local_summarize(comments, max_length)
     
-    async def _ernie_classify(self, comments: List[str]) -> List[str]:
+    async def _ernie_classify(self, comments: List[str], produced: Optional[Set[int]] = None) -> List[str]:
         """使用ERNIE Bot分类评论
         
         Args:
             comments: 评论列表
+            produced: 传入时，加入由模型给出结果的评论下标（失败改用本地实现时不加入）
             
         Returns:
             List[str]: 分类结果列表（优/良/中/差/不明意义）
         """
         try:
-            from erniebot import ChatCompletion
-            
             classifications = []
-            # 分批处理，每批最多5条评论
-            batch_size = 5
+            # 按token预算分批处理
+            item_tokens = self.packer.classify_tokens()
             
-            for i in range(0, len(comments), batch_size):
-                batch = comments[i:i+batch_size]
+            for start, end in self.packer.pack(comments, item_tokens):
+                batch = comments[start:end]
                 
                 # 构建提示
                 prompt = "请将以下每条评论分类为：优（非常正面）、良（比较正面）、中（中性）、差（负面）、不明意义（无法判断）\n\n"
@@ -129,14 +340,14 @@ class DefaultFreeAnalyzer:
                     prompt += f"{j}. {comment}\n"
                 
                 # 调用ERNIE Bot API
-                response = ChatCompletion.create(
+                response = await self._ernie_create(
                     model="ernie-3.5",
                     messages=[
                         {"role": "system", "content": "你是一个专业的评论分类助手，擅长根据评论内容判断情感倾向。"},
                         {"role": "user", "content": prompt}
                     ],
                     temperature=0.1,
-                    max_tokens=500
+                    max_tokens=self.packer.max_tokens(len(batch), item_tokens)
                 )
                 
                 # 解析结果
@@ -145,16 +356,16 @@ class DefaultFreeAnalyzer:
                                       for line in classification_text.strip().split('\n') if line]
                 
                 classifications.extend(batch_classifications[:len(batch)])
-                
-                # 避免请求过快
-                import asyncio
-                await asyncio.sleep(0.5)
             
-            return classifications[:len(comments)]
+            classifications = classifications[:len(comments)]
+            if produced is not None:
+                produced.update(range(len(classifications)))
+            return classifications
             
         except Exception as e:
             print(f"ERNIE Bot分类失败: {str(e)}")
             # 失败时使用本地实现
+            ANALYZE_FALLBACKS.inc(len(comments), reason="ernie_error")
             return await self._local_classify(comments)
     
     async def _local_summarize(self, comments: List[str], max_length: int = 20) -> List[str]:
@@ -167,14 +378,7 @@ class DefaultFreeAnalyzer:
         Returns:
             List[str]: 总结后的评论列表
         """
-        summaries = []
-        for comment in comments:
-            # 简单实现：截取前max_length个字符
-            summary = comment[:max_length]
-            if len(comment) > max_length:
-                summary += "..."
-            summaries.append(summary)
-        return summaries
+        return [local_summary(comment, max_length) for comment in comments]
     
     async def _local_classify(self, comments: List[str]) -> List[str]:
         """本地分类评论（备用实现）
@@ -185,48 +389,66 @@ class DefaultFreeAnalyzer:
         Returns:
             List[str]: 分类结果列表（优/良/中/差/不明意义）
         """
-        classifications = []
-        # 正面关键词
-        positive_words = ['好', '棒', '优秀', '喜欢', '赞', '精彩', '完美', '满意', '支持', '厉害']
-        # 负面关键词
-        negative_words = ['差', '糟糕', '垃圾', '失望', '讨厌', '不满', '反对', '无聊', '错误', '失败']
-        
-        for comment in comments:
-            comment_lower = comment.lower()
-            pos_count = sum(1 for word in positive_words if word in comment_lower)
-            neg_count = sum(1 for word in negative_words if word in comment_lower)
-            
-            if pos_count > neg_count:
-                if pos_count >= 2:
-                    classifications.append('优')
-                else:
-                    classifications.append('良')
-            elif neg_count > pos_count:
-                classifications.append('差')
-            else:
-                classifications.append('中')
-        return classifications
+        # 情感词典编译为多模式匹配自动机，每条评论只扫描一遍
+        return self.lexicon.classify_batch(comments)
 
 
 class OpenAIAnalyzer:
     """OpenAI分析器"""
     
+    # 同时在途的请求数上限
+    max_concurrency = 8
+    # 每次请求的输入/输出token预算（gpt-3.5-turbo 上下文为4096）
+    max_input_tokens = 2000
+    max_output_tokens = 1500
+    
     def __init__(self, api_key: str, model: str = "gpt-3.5-turbo"):
         """初始化OpenAI分析器
         
+        API密钥保存在实例自己的客户端中，不修改全局的 ``openai.api_key``，
+        不同密钥的分析任务可以同时进行。
+        
         Args:
             api_key: OpenAI API密钥
             model: 使用的模型名称
         """
-        openai.api_key = api_key
+        self.api_key = api_key
         self.model = model
+        self.packer = BatchPacker(self.max_input_tokens, self.max_output_tokens)
+        # 限流时退避重试并降低并发，连续失败时熔断
+        self.governor = get_governor(f"openai/{model}", max_limit=self.max_concurrency)
+        self._client = None
+        self._client_loop = None
     
-    async def summarize_comments(self, comments: List[str], max_length: int = 20) -> List[str]:
+    def _get_client(self) -> "openai.AsyncOpenAI":
+        """获取当前事件循环下的客户端（带连接池，复用TCP/TLS连接）
+        
+        异步HTTP连接绑定在创建它的事件循环上，换了事件循环时重新创建。
+        """
+        loop = asyncio.get_running_loop()
+        if self._client_loop is not loop:
+            import httpx
+            self._client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                # 重试由调度器统一处理
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=self.max_concurrency,
+                                        max_keepalive_connections=self.max_concurrency),
+                    timeout=httpx.Timeout(60.0, connect=10.0)
+                )
+            )
+            self._client_loop = loop
+        return self._client
+    
+    async def summarize_comments(self, comments: List[str], max_length: int = 20,
+                                 produced: Optional[Set[int]] = None) -> List[str]:
         """批量总结评论
         
         Args:
             comments: 评论列表
             max_length: 总结的最大长度（字数）
+            produced: 传入时，加入由模型给出结果的评论下标
             
         Returns:
             List[str]: 总结后的评论列表
@@ -236,29 +458,37 @@ class OpenAIAnalyzer:
         for i, comment in enumerate(comments, 1):
             prompt += f"{i}. {comment}\n"
         
-        # 调用API
-        response = await openai.ChatCompletion.acreate(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": "你是一个专业的评论总结助手，擅长提炼评论的核心观点。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=1000
-        )
+        # 调用API（失败时返回空列表，由调用方补齐，不影响其他批次）
+        try:
+            response = await self.governor.run(functools.partial(
+                self._get_client().chat.completions.create,
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "你是一个专业的评论总结助手，擅长提炼评论的核心观点。"},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                max_tokens=self.packer.max_tokens(len(comments), self.packer.summary_tokens(max_length))
+            ))
+        except Exception as e:
+            print(f"OpenAI总结失败: {str(e)}")
+            ANALYZE_FALLBACKS.inc(len(comments), reason="openai_error")
+            return []
         
         # 解析结果
         summary_text = response.choices[0].message.content
         summaries = [line.split('. ', 1)[1] if '. ' in line else line 
-                    for line in summary_text.strip().split('\n') if line]
-        
-        return summaries[:len(comments)]
+                    for line in summary_text.strip().split('\n') if line][:len(comments)]
+        if produced is not None:
+            produced.update(range(len(summaries)))
+        return summaries
     
-    async def classify_comments(self, comments: List[str]) -> List[str]:
+    async def classify_comments(self, comments: List[str], produced: Optional[Set[int]] = None) -> List[str]:
         """批量分类评论
         
         Args:
             comments: 评论列表
+            produced: 传入时，加入由模型给出结果的评论下标
             
         Returns:
             List[str]: 分类结果列表（优/良/中/差/不明意义）
@@ -268,28 +498,77 @@ class OpenAIAnalyzer:
         for i, comment in enumerate(comments, 1):
             prompt += f"{i}. {comment}\n"
         
-        # 调用API
-        response = await openai.ChatCompletion.acreate(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": "你是一个专业的评论分类助手，擅长根据评论内容判断情感倾向。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
-            max_tokens=500
-        )
+        # 调用API（失败时返回空列表，由调用方补齐，不影响其他批次）
+        try:
+            response = await self.governor.run(functools.partial(
+                self._get_client().chat.completions.create,
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "你是一个专业的评论分类助手，擅长根据评论内容判断情感倾向。"},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.1,
+                max_tokens=self.packer.max_tokens(len(comments), self.packer.classify_tokens())
+            ))
+        except Exception as e:
+            print(f"OpenAI分类失败: {str(e)}")
+            ANALYZE_FALLBACKS.inc(len(comments), reason="openai_error")
+            return []
         
         # 解析结果
         classification_text = response.choices[0].message.content
         classifications = [line.split('. ', 1)[1] if '. ' in line else line 
-                          for line in classification_text.strip().split('\n') if line]
+                          for line in classification_text.strip().split('\n') if line][:len(comments)]
+        if produced is not None:
+            produced.update(range(len(classifications)))
+        return classifications
+    
+    async def analyze_comments(self, comments: List[str], max_length: int = 20,
+                               produced: Optional[Set[int]] = None) -> Tuple[List[str], List[str]]:
+        """一次请求同时总结并分类评论
+        
+        Args:
+            comments: 评论列表
+            max_length: 总结的最大长度（字数）
+            produced: 传入时，加入由模型给出结果的评论下标
+            
+        Returns:
+            Tuple[List[str], List[str]]: (总结列表, 分类列表)，多次重试仍失败的评论为空总结和"不明意义"
+        """
+        async def request(prompt: str, max_tokens: int) -> str:
+            response = await self.governor.run(functools.partial(
+                self._get_client().chat.completions.create,
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "你是一个专业的评论分析助手，擅长提炼评论的核心观点并判断情感倾向。"},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.1,
+                max_tokens=max_tokens
+            ))
+            return response.choices[0].message.content
         
-        return classifications[:len(comments)]
+        results = {}
+        try:
+            results = await analyze_with_retry(request, comments, max_length, self.packer)
+        except Exception as e:
+            # 熔断、重试用尽等错误只影响本批，其他批次继续
+            print(f"OpenAI分析失败: {str(e)}")
+        if produced is not None:
+            produced.update(results)
+        if len(results) < len(comments):
+            ANALYZE_FALLBACKS.inc(len(comments) - len(results), reason="openai_error")
+        summaries = [results[i][0] if i in results else '' for i in range(len(comments))]
+        classifications = [results[i][1] if i in results else '不明意义' for i in range(len(comments))]
+        return summaries, classifications
 
 
 class OtherAPIAnalyzer:
     """其他API分析器（预留接口）"""
     
+    # 同时在途的请求数上限
+    max_concurrency = 2
+    
     def __init__(self, api_key: str, model: str = "default"):
         """初始化其他API分析器
         
@@ -299,123 +578,578 @@ class OtherAPIAnalyzer:
         """
         self.api_key = api_key
         self.model = model
+        # 暂时使用默认实现（共用已创建的默认分析器）及其token预算
+        self.fallback = get_analyzer("default")
+        self.packer = self.fallback.packer
     
-    async def summarize_comments(self, comments: List[str], max_length: int = 20) -> List[str]:
+    async def summarize_comments(self, comments: List[str], max_length: int = 20,
+                                 produced: Optional[Set[int]] = None) -> List[str]:
         """批量总结评论
         
         Args:
             comments: 评论列表
             max_length: 总结的最大长度（字数）
+            produced: 传入时，加入由模型（而不是本地备用实现）给出结果的评论下标
             
         Returns:
             List[str]: 总结后的评论列表
         """
         # 暂时使用默认实现
-        analyzer = DefaultFreeAnalyzer()
-        return await analyzer.summarize_comments(comments, max_length)
+        return await self.fallback.summarize_comments(comments, max_length, produced)
     
-    async def classify_comments(self, comments: List[str]) -> List[str]:
+    async def classify_comments(self, comments: List[str], produced: Optional[Set[int]] = None) -> List[str]:
         """批量分类评论
         
         Args:
             comments: 评论列表
+            produced: 传入时，加入由模型（而不是本地备用实现）给出结果的评论下标
             
         Returns:
             List[str]: 分类结果列表（优/良/中/差/不明意义）
         """
         # 暂时使用默认实现
+        return await self.fallback.classify_comments(comments, produced)
+    
+    async def analyze_comments(self, comments: List[str], max_length: int = 20,
+                               produced: Optional[Set[int]] = None) -> Tuple[List[str], List[str]]:
+        """一次请求同时总结并分类评论
+        
+        Args:
+            comments: 评论列表
+            max_length: 总结的最大长度（字数）
+            produced: 传入时，加入由模型（而不是本地备用实现）给出结果的评论下标
+            
+        Returns:
+            Tuple[List[str], List[str]]: (总结列表, 分类列表)
+        """
+        # 暂时使用默认实现
+        return await self.fallback.analyze_comments(comments, max_length, produced)
+
+
+# 已创建的模型分析器，所有分析任务共用（保持SDK、客户端和连接池常驻）
+_analyzers: "OrderedDict[tuple, object]" = OrderedDict()
+_analyzers_lock = threading.Lock()
+# 最多保留的分析器数量（不同API密钥各占一个），超出时淘汰最久未使用的
+MAX_ANALYZERS = 32
+
+
+def get_analyzer(model_type: str = "default", api_key: Optional[str] = None, model: str = "gpt-3.5-turbo"):
+    """获取（不存在时创建）共享的模型分析器
+    
+    以 模型类型、模型名称、API密钥的哈希 为键缓存实例，相同配置的任务复用同一个分析器。
+    
+    Args:
+        model_type: 模型类型（default/openai/other）
+        api_key: API密钥（对于需要的模型）
+        model: 使用的模型名称
+        
+    Returns:
+        DefaultFreeAnalyzer | OpenAIAnalyzer | OtherAPIAnalyzer: 模型分析器
+    """
+    if model_type == "default":
+        key = (model_type, "", "")
+    elif model_type in ("openai", "other"):
+        if not api_key:
+            raise ValueError(f"{'OpenAI' if model_type == 'openai' else '其他API'}模型需要API密钥")
+        key = (model_type, model, hashlib.sha256(api_key.encode('utf-8')).hexdigest())
+    else:
+        raise ValueError(f"不支持的模型类型: {model_type}")
+    
+    with _analyzers_lock:
+        analyzer = _analyzers.get(key)
+        if analyzer is not None:
+            _analyzers.move_to_end(key)
+            return analyzer
+    
+    # 在锁外创建（OtherAPIAnalyzer 创建时会获取默认分析器），并发创建时以先写入的为准
+    if model_type == "default":
         analyzer = DefaultFreeAnalyzer()
-        return await analyzer.classify_comments(comments)
+    elif model_type == "openai":
+        analyzer = OpenAIAnalyzer(api_key, model)
+    else:
+        analyzer = OtherAPIAnalyzer(api_key, model)
+    
+    with _analyzers_lock:
+        analyzer = _analyzers.setdefault(key, analyzer)
+        _analyzers.move_to_end(key)
+        while len(_analyzers) > MAX_ANALYZERS:
+            _analyzers.popitem(last=False)
+        return analyzer
 
 
 class CommentAnalyzer:
-    """评论分析器（工厂模式）"""
+    """评论分析器（工厂模式）
     
-    def __init__(self, model_type: str = "default", api_key: Optional[str] = None, model: str = "gpt-3.5-turbo"):
+    每个分析任务创建一个实例（去重、缓存命名空间和并发控制按任务区分），
+    实际请求模型的分析器通过 :func:`get_analyzer` 在任务之间共用。
+    """
+    
+    # process_batch 每次读取并分析的评论数（块内各批次并发请求）
+    CHUNK_COMMENTS = 1000
+    # process_batch 最多保留的去重组数和代表评论结果数（淘汰最久没有命中的）
+    MAX_GROUPS = 100000
+    
+    def __init__(self, model_type: str = "default", api_key: Optional[str] = None, model: str = "gpt-3.5-turbo",
+                 deduplicate: bool = True, max_concurrency: Optional[int] = None, combined: bool = True,
+                 cache: Optional[AnalysisCache] = None, local_classifier: Optional[NGramClassifier] = None,
+                 confidence_threshold: float = 0.9):
         """初始化分析器
         
         Args:
             model_type: 模型类型（default/openai/other）
             api_key: API密钥（对于需要的模型）
             model: 使用的模型名称
+            deduplicate: 是否合并重复/近似重复的评论，每组只分析一条
+            max_concurrency: 同时在途的模型请求数上限，默认使用各模型分析器的 ``max_concurrency``
+            combined: 是否用一次请求同时完成总结和分类（JSON输出），否则分别请求
+            cache: 分析结果缓存，命中的评论不再请求模型
+            local_classifier: 本地分类器，置信度达到阈值的评论直接使用本地结果，不再请求模型
+            confidence_threshold: 使用本地分类结果的最低置信度
         """
+        self.model_type = model_type
+        self.combined = combined
+        self.cache = cache
+        self.local_classifier = local_classifier
+        self.confidence_threshold = confidence_threshold
+        self.route_stats = {"local": 0, "model": 0}
+        self.deduplicator = CommentDeduplicator() if deduplicate else None
+        self._max_concurrency = max_concurrency
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop = None
+        self.analyzer = get_analyzer(model_type, api_key, model)
+        
+        # 缓存命名空间：默认分析器未安装ERNIE时使用本地实现，与ERNIE的结果分开缓存（并区分情感词典）
         if model_type == "default":
-            self.analyzer = DefaultFreeAnalyzer()
-        elif model_type == "openai":
-            if not api_key:
-                raise ValueError("OpenAI模型需要API密钥")
-            self.analyzer = OpenAIAnalyzer(api_key, model)
-        elif model_type == "other":
-            if not api_key:
-                raise ValueError("其他API模型需要API密钥")
-            self.analyzer = OtherAPIAnalyzer(api_key, model)
-        else:
-            raise ValueError(f"不支持的模型类型: {model_type}")
+            model = "ernie-3.5" if self.analyzer.use_ernie else f"local-{self.analyzer.lexicon.fingerprint}"
+        self.cache_namespace = f"{model_type}/{model}/v{PROMPT_VERSION}/{'combined' if combined else 'split'}"
+    
+    @property
+    def max_concurrency(self) -> int:
+        """同时在途的模型请求数上限"""
+        return max(1, self._max_concurrency or getattr(self.analyzer, 'max_concurrency', 1))
     
-    async def summarize_comments(self, comments: List[str], max_length: int = 20) -> List[str]:
+    def _get_slots(self) -> asyncio.Semaphore:
+        """获取当前事件循环下限制在途请求数的信号量"""
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._slots_loop = loop
+        return self._slots
+    
+    async def summarize_comments(self, comments: List[str], max_length: int = 20,
+                                 produced: Optional[Set[int]] = None) -> List[str]:
         """批量总结评论
         
         Args:
             comments: 评论列表
             max_length: 总结的最大长度（字数）
+            produced: 传入时，加入由模型（而不是本地备用实现）给出结果的评论下标
             
         Returns:
             List[str]: 总结后的评论列表
         """
-        return await self.analyzer.summarize_comments(comments, max_length)
+        return await self.analyzer.summarize_comments(comments, max_length, produced)
     
-    async def classify_comments(self, comments: List[str]) -> List[str]:
+    async def classify_comments(self, comments: List[str], produced: Optional[Set[int]] = None) -> List[str]:
         """批量分类评论
         
         Args:
             comments: 评论列表
+            produced: 传入时，加入由模型（而不是本地备用实现）给出结果的评论下标
             
         Returns:
             List[str]: 分类结果列表（优/良/中/差/不明意义）
         """
-        return await self.analyzer.classify_comments(comments)
+        return await self.analyzer.classify_comments(comments, produced)
+    
+    async def _lookup(self, comments: List[str]) -> Dict[int, Tuple[str, str]]:
+        """从缓存读取分析结果（SQLite查询在线程中执行）
+        
+        Returns:
+            Dict[int, Tuple[str, str]]: 命中的 评论下标 -> (总结, 分类)
+        """
+        if self.cache is None or not comments:
+            return {}
+        keys = [AnalysisCache.make_key(comment, self.cache_namespace) for comment in comments]
+        found = await asyncio.to_thread(self.cache.get_many, keys)
+        return {i: found[key] for i, key in enumerate(keys) if key in found}
     
-    async def process_batch(self, input_file: Path, batch_size: int = 10) -> Path:
+    async def _remember(self, comments: List[str], summaries: List[str], classifications: List[str],
+                        produced: Set[int]) -> None:
+        """把模型给出的分析结果写入缓存（SQLite写入在线程中执行）
+        
+        只缓存 ``produced`` 中的评论：模型失败或熔断时由本地备用实现补上的结果、
+        没有得到总结或分类不合法的结果都不缓存，下次重新请求模型。
+        """
+        if self.cache is None:
+            return
+        entries = {
+            AnalysisCache.make_key(comments[i], self.cache_namespace): (summaries[i], classifications[i])
+            for i in sorted(produced)
+            if summaries[i] and classifications[i] in CLASSIFICATIONS
+        }
+        if entries:
+            await asyncio.to_thread(self.cache.put_many, entries)
+    
+    def _pack(self, comments: List[str], batch_size: Optional[int] = None) -> List[List[str]]:
+        """按模型的token预算把评论打包成若干次请求
+        
+        Args:
+            comments: 评论列表
+            batch_size: 每批最多的评论数，None 表示只受token预算限制
+            
+        Returns:
+            List[List[str]]: 各次请求的评论
+        """
+        packer = getattr(self.analyzer, 'packer', None) or BatchPacker()
+        if self.combined and hasattr(self.analyzer, 'analyze_comments'):
+            item_tokens = packer.combined_tokens()
+        else:
+            item_tokens = packer.summary_tokens()
+        return [comments[start:end] for start, end in packer.pack(comments, item_tokens, batch_size)]
+    
+    def _route(self, comments: List[str]) -> Dict[int, Tuple[str, str]]:
+        """用本地分类器分类，返回置信度达到阈值的评论的结果
+        
+        本地分类器只给出分类，这些评论的总结为截断后的原文。
+        预测的分类不在 :data:`CLASSIFICATIONS` 中时（模型用含其他类别的数据训练），仍交给大模型。
+        
+        Returns:
+            Dict[int, Tuple[str, str]]: 评论下标 -> (总结, 分类)
+        """
+        if self.local_classifier is None or not comments:
+            return {}
+        try:
+            labels, confidences = self.local_classifier.predict(comments)
+        except Exception as e:
+            print(f"本地分类失败: {str(e)}")
+            return {}
+        return {
+            i: (local_summary(comments[i]), label)
+            for i, (label, confidence) in enumerate(zip(labels, confidences))
+            if confidence >= self.confidence_threshold and label in CLASSIFICATIONS
+        }
+    
+    async def _request_all(self, comments: List[str], batch_size: Optional[int] = None) -> Tuple[List[str], List[str]]:
+        """分析一批评论，按输入顺序返回结果
+        
+        配置了本地分类器时先在本地分类，只有置信度不足的评论才打包后并发请求模型；
+        只有模型给出的结果写入缓存，本地分类器和本地备用实现的结果不缓存。
+        """
+        results = self._route(comments)
+        uncertain = [i for i in range(len(comments)) if i not in results]
+        uncertain_comments = [comments[i] for i in uncertain]
+        self.route_stats["local"] += len(results)
+        self.route_stats["model"] += len(uncertain)
+        ANALYZE_COMMENTS.inc(len(results), source="local_classifier")
+        ANALYZE_COMMENTS.inc(len(uncertain), source="model")
+        if results:
+            print(f"本地分类器处理 {len(results)}/{len(comments)} 条评论")
+        
+        summaries = []
+        classifications = []
+        produced = set()
+        batch_results = await asyncio.gather(*(
+            self._request_batch(batch) for batch in self._pack(uncertain_comments, batch_size)
+        ))
+        for batch_summaries, batch_classifications, batch_produced in batch_results:
+            produced.update(len(summaries) + i for i in batch_produced)
+            summaries.extend(batch_summaries)
+            classifications.extend(batch_classifications)
+        await self._remember(uncertain_comments, summaries, classifications, produced)
+        
+        results.update(zip(uncertain, zip(summaries, classifications)))
+        return [results[i][0] for i in range(len(comments))], [results[i][1] for i in range(len(comments))]
+    
+    async def analyze_batch(self, comments: List[str]) -> Tuple[List[str], List[str]]:
+        """总结并分类一批评论（先查缓存，只请求缓存中没有的评论）
+        
+        超出模型token预算时自动拆分为多次请求。
+        
+        Args:
+            comments: 评论列表
+            
+        Returns:
+            Tuple[List[str], List[str]]: (总结列表, 分类列表)
+        """
+        started = time.perf_counter()
+        results = await self._lookup(comments)
+        ANALYZE_COMMENTS.inc(len(results), source="cache")
+        missing = [i for i in range(len(comments)) if i not in results]
+        if missing:
+            missing_comments = [comments[i] for i in missing]
+            summaries, classifications = await self._request_all(missing_comments)
+            results.update(zip(missing, zip(summaries, classifications)))
+        ANALYZE_DURATION.observe(time.perf_counter() - started)
+        return [results[i][0] for i in range(len(comments))], [results[i][1] for i in range(len(comments))]
+    
+    async def _request_batch(self, comments: List[str]) -> Tuple[List[str], List[str], Set[int]]:
+        """请求模型总结并分类一批评论
+        
+        合并模式下一次请求同时得到总结和分类；否则分别请求。
+        模型返回的条数不足时，用空总结和"不明意义"补齐，保证结果与输入一一对应。
+        
+        Args:
+            comments: 评论列表
+            
+        Returns:
+            Tuple[List[str], List[str], Set[int]]: (总结列表, 分类列表, 结果由模型给出的评论下标)
+        """
+        slots = self._get_slots()
+        LLM_BATCH_SIZE.observe(len(comments), provider=self.model_type)
+        summarized: Set[int] = set()
+        classified: Set[int] = set()
+        
+        async def summarize() -> List[str]:
+            async with slots:
+                return list(await self.summarize_comments(comments, produced=summarized))[:len(comments)]
+        
+        async def classify() -> List[str]:
+            async with slots:
+                return list(await self.classify_comments(comments, produced=classified))[:len(comments)]
+        
+        if self.combined and hasattr(self.analyzer, 'analyze_comments'):
+            async with slots:
+                summaries, classifications = await self.analyzer.analyze_comments(comments, produced=summarized)
+            summaries = list(summaries)[:len(comments)]
+            classifications = list(classifications)[:len(comments)]
+            classified = summarized
+        else:
+            # 总结和分类互不依赖，同时发出
+            summaries, classifications = await asyncio.gather(summarize(), classify())
+        summaries += [''] * (len(comments) - len(summaries))
+        classifications += ['不明意义'] * (len(comments) - len(classifications))
+        produced = {i for i in summarized & classified if i < len(comments)}
+        return summaries, classifications, produced
+    
+    async def _analyze_all(self, comments: List[str],
+                           batch_size: Optional[int] = None) -> Tuple[List[str], List[str]]:
+        """分批总结并分类全部评论
+        
+        评论按模型的token预算打包成批，各批次并发分析，同时在途的模型请求数不超过
+        :attr:`max_concurrency`，结果按输入顺序拼接。
+        启用去重时，重复和近似重复的评论只分析组内第一条，结果复制给组内所有评论；
+        配置了缓存时，只有缓存未命中的评论才会分批请求模型。
+        
+        Args:
+            comments: 评论列表
+            batch_size: 每批最多的评论数，None 表示只受token预算限制
+            
+        Returns:
+            Tuple[List[str], List[str]]: (总结列表, 分类列表)
+        """
+        started = time.perf_counter()
+        if self.deduplicator is not None:
+            # SimHash 是纯Python计算，放到线程中执行，不阻塞事件循环
+            unique, mapping = await asyncio.to_thread(collapse, comments, self.deduplicator)
+            if len(unique) < len(comments):
+                print(f"去重后需要分析 {len(unique)}/{len(comments)} 条评论")
+        else:
+            unique, mapping = comments, list(range(len(comments)))
+        ANALYZE_COMMENTS.inc(len(comments) - len(unique), source="duplicate")
+        
+        summaries, classifications = await self._analyze_unique(unique, batch_size)
+        ANALYZE_DURATION.observe(time.perf_counter() - started)
+        
+        return [summaries[k] for k in mapping], [classifications[k] for k in mapping]
+    
+    async def _analyze_unique(self, comments: List[str],
+                              batch_size: Optional[int] = None) -> Tuple[List[str], List[str]]:
+        """分析已去重的评论：先查缓存，只把未命中的评论分批请求模型
+        
+        Args:
+            comments: 评论列表
+            batch_size: 每批最多的评论数，None 表示只受token预算限制
+            
+        Returns:
+            Tuple[List[str], List[str]]: (总结列表, 分类列表)
+        """
+        results = await self._lookup(comments)
+        if results:
+            print(f"缓存命中 {len(results)}/{len(comments)} 条评论")
+        ANALYZE_COMMENTS.inc(len(results), source="cache")
+        missing = [i for i in range(len(comments)) if i not in results]
+        missing_comments = [comments[i] for i in missing]
+        
+        summaries, classifications = await self._request_all(missing_comments, batch_size)
+        results.update(zip(missing, zip(summaries, classifications)))
+        return [results[i][0] for i in range(len(comments))], [results[i][1] for i in range(len(comments))]
+    
+    async def process_store(self, store: ColumnStore, batch_size: Optional[int] = None) -> ColumnStore:
+        """批量分析列存储中的评论，追加 ``summary`` 和 ``classification`` 列
+        
+        只读取 ``cleaned_text`` 列；清洗时被过滤的行两列均为空字符串。
+        
+        Args:
+            store: 已清洗的列存储
+            batch_size: 每批最多的评论数，None 表示按模型的token预算打包
+            
+        Returns:
+            ColumnStore: 同一个列存储
+        """
+        cleaned_texts = store.read_column('cleaned_text')
+        indices = [i for i, text in enumerate(cleaned_texts) if text]
+        summaries = [''] * store.rows
+        classifications = [''] * store.rows
+        
+        batch_summaries, batch_classifications = await self._analyze_all(
+            [cleaned_texts[j] for j in indices], batch_size
+        )
+        for j, summary, classification in zip(indices, batch_summaries, batch_classifications):
+            summaries[j] = summary
+            classifications[j] = classification
+        
+        store.write_column('summary', summaries)
+        store.write_column('classification', classifications)
+        ResultSummary.build(store.path).save(store.path)
+        await asyncio.to_thread(build_index, store.path)
+        return store
+    
+    async def process_batch(self, input_file: Path, batch_size: Optional[int] = None, resume: bool = False,
+                            on_progress: Optional[Callable[[int], None]] = None) -> Path:
         """批量处理评论
         
+        逐块读取输入（每块 :attr:`CHUNK_COMMENTS` 条），每块分析完立即追加写入结果文件，
+        并更新结果汇总（见 :class:`ResultSummary`），中断时已写出的结果不会丢失。
+        启用去重时整个文件共用一个去重器和 代表评论 -> 结果 的映射，与之前各块重复或近似重复的评论
+        直接复用已有结果；两者最多保留 :attr:`MAX_GROUPS` 组，内存占用与文件大小无关。
+        全部写完后为结果文件建立查询索引（见 :class:`CommentIndex`）。
+        
         Args:
             input_file: 清洗后的评论文件路径
-            batch_size: 批量处理大小
+            batch_size: 每批最多的评论数，None 表示按模型的token预算打包
+            resume: 结果文件已存在时跳过其中已有的评论（按 ``id``，没有 ``id`` 时按输入文件中的行号），继续追加；
+                否则重新生成结果文件。没有 ``id`` 的评论在结果中记录 ``input_line``（输入文件中的行号）
+            on_progress: 进度回调，参数为结果文件中的评论数
             
         Returns:
             Path: 分析结果文件路径
         """
         output_file = input_file.with_name(f"{input_file.stem}_analyzed.jsonl")
-        comments = []
-        comment_datas = []
-        
-        # 读取评论
-        with open(input_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                comment_data = json.loads(line.strip())
-                comments.append(comment_data['cleaned_text'])
-                comment_datas.append(comment_data)
-        
-        # 分批处理
-        results = []
-        for i in range(0, len(comments), batch_size):
-            batch_comments = comments[i:i+batch_size]
-            batch_datas = comment_datas[i:i+batch_size]
-            
-            # 总结
-            summaries = await self.summarize_comments(batch_comments)
-            # 分类
-            classifications = await self.classify_comments(batch_comments)
-            
-            for data, summary, classification in zip(batch_datas, summaries, classifications):
-                data['summary'] = summary
-                data['classification'] = classification
-                results.append(data)
+        done = await asyncio.to_thread(self._load_done, output_file) if resume else set()
+        written = len(done)
+        if done:
+            print(f"从已有结果继续分析，跳过 {len(done)} 条评论")
+            summary = await asyncio.to_thread(
+                lambda: ResultSummary.load(output_file) or ResultSummary.build(output_file)
+            )
+        else:
+            summary = ResultSummary()
+        if self.deduplicator is not None:
+            deduplicator = CommentDeduplicator(max_groups=self.MAX_GROUPS)
+        else:
+            deduplicator = None
+        # 代表评论序号 -> (总结, 分类)，按最近使用排序
+        results: "OrderedDict[int, Tuple[str, str]]" = OrderedDict()
         
-        # 保存结果
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for result in results:
-                json.dump(result, f, ensure_ascii=False)
-                f.write('\n')
+        with open(input_file, 'r', encoding='utf-8') as f, \
+             open(output_file, 'a' if resume else 'w', encoding='utf-8') as out_f:
+            chunk = []
+            for index, line in enumerate(f):
+                if not line.strip():
+                    continue
+                comment_data = json.loads(line)
+                if self._record_key(comment_data, index) in done:
+                    continue
+                if comment_data.get('id') is None:
+                    comment_data['input_line'] = index
+                chunk.append(comment_data)
+                if len(chunk) >= self.CHUNK_COMMENTS:
+                    written += await self._analyze_chunk(chunk, batch_size, out_f, summary, deduplicator, results)
+                    chunk = []
+                    if on_progress is not None:
+                        on_progress(written)
+            if chunk:
+                written += await self._analyze_chunk(chunk, batch_size, out_f, summary, deduplicator, results)
+                if on_progress is not None:
+                    on_progress(written)
         
+        await asyncio.to_thread(summary.save, output_file)
+        await asyncio.to_thread(build_index, output_file)
         return output_file
+    
+    async def _analyze_chunk(self, comment_datas: List[dict], batch_size: Optional[int], out_f,
+                             result_summary: ResultSummary, deduplicator: Optional[CommentDeduplicator],
+                             results: "OrderedDict[int, Tuple[str, str]]") -> int:
+        """分析一块评论，追加写入结果文件并更新汇总
+        
+        只分析 ``results`` 中还没有结果的代表评论（结果已被淘汰的组用本块中的评论代替代表评论重新分析），
+        写出后把 ``results`` 裁剪到 :attr:`MAX_GROUPS` 条。
+        
+        Returns:
+            int: 写入的评论数
+        """
+        started = time.perf_counter()
+        texts = [data['cleaned_text'] for data in comment_datas]
+        if deduplicator is None:
+            summaries, classifications = await self._analyze_unique(texts, batch_size)
+        else:
+            # SimHash 是纯Python计算，放到线程中执行，不阻塞事件循环
+            representatives = await asyncio.to_thread(lambda: [deduplicator.add(text) for text in texts])
+            pending: Dict[int, str] = {}
+            for representative, text in zip(representatives, texts):
+                if representative not in results:
+                    pending.setdefault(representative, text)
+            if len(pending) < len(texts):
+                print(f"去重后需要分析 {len(pending)}/{len(texts)} 条评论")
+            ANALYZE_COMMENTS.inc(len(texts) - len(pending), source="duplicate")
+            pending_summaries, pending_classifications = await self._analyze_unique(list(pending.values()), batch_size)
+            results.update(zip(pending, zip(pending_summaries, pending_classifications)))
+            for representative in representatives:
+                results.move_to_end(representative)
+            summaries = [results[representative][0] for representative in representatives]
+            classifications = [results[representative][1] for representative in representatives]
+            while len(results) > self.MAX_GROUPS:
+                results.popitem(last=False)
+        ANALYZE_DURATION.observe(time.perf_counter() - started)
+        
+        for data, summary, classification in zip(comment_datas, summaries, classifications):
+            data['summary'] = summary
+            data['classification'] = classification
+        
+        def write() -> None:
+            out_f.writelines(f"{json.dumps(data, ensure_ascii=False)}\n" for data in comment_datas)
+            out_f.flush()
+            result_summary.add(comment_datas)
+            result_summary.save(Path(out_f.name))
+        
+        # 写入结果和重写汇总文件都是阻塞I/O，一起放到线程中执行
+        await asyncio.to_thread(write)
+        return len(comment_datas)
+    
+    @staticmethod
+    def _record_key(comment_data: dict, index: int) -> str:
+        """续跑时识别评论的键：评论 ``id``，没有时为输入文件中的行号
+        
+        Args:
+            comment_data: 输入或结果记录（结果记录的 ``input_line`` 为其在输入文件中的行号）
+            index: 记录所在的行号，只在记录中没有 ``input_line`` 时使用
+        """
+        comment_id = comment_data.get('id')
+        if comment_id is not None:
+            return str(comment_id)
+        return f"#{comment_data.get('input_line', index)}"
+    
+    @classmethod
+    def _load_done(cls, output_file: Path) -> set:
+        """读取已有结果文件中的评论键
+        
+        中断时最后一行可能只写了一半，截掉这部分，之后从完整的行末继续追加。
+        """
+        if not output_file.exists():
+            return set()
+        done = set()
+        end = 0
+        with open(output_file, 'rb') as f:
+            for index, line in enumerate(f):
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    done.add(cls._record_key(json.loads(line), index))
+                except Exception:
+                    break
+                end += len(line)
+        if end < output_file.stat().st_size:
+            with open(output_file, 'r+b') as f:
+                f.truncate(end)
+        return done
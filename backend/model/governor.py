@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from backend.monitoring.metrics import LLM_INFLIGHT, LLM_LATENCY, LLM_REQUESTS
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开，暂停向该模型服务发送请求"""
+
+
+# 千帆/ERNIE Bot 表示QPS、RPM、TPM超限的错误码
+RATE_LIMIT_CODES = frozenset({18, 336501, 336502})
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """判断异常是否为模型服务的限流
+    
+    只根据异常类型（openai.RateLimitError、erniebot.errors.RequestLimitError 及其子类）、
+    HTTP 状态码 429 和 ERNIE 的限流错误码判断，不匹配错误消息文本。
+    """
+    if any('RateLimit' in cls.__name__ or 'RequestLimit' in cls.__name__ for cls in type(error).__mro__):
+        return True
+    response = getattr(error, 'response', None)
+    statuses = (getattr(error, 'status_code', None), getattr(error, 'http_status', None),
+                getattr(response, 'status_code', None))
+    if 429 in statuses:
+        return True
+    return getattr(error, 'ecode', None) in RATE_LIMIT_CODES or getattr(error, 'error_code', None) in RATE_LIMIT_CODES
+
+
+def is_retryable(error: Exception) -> bool:
+    """判断异常是否值得重试（限流、超时、连接错误、服务端错误）"""
+    if is_rate_limited(error) or isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    name = type(error).__name__
+    if any(word in name for word in ('Timeout', 'Connection', 'ServerError', 'ServiceUnavailable', 'InternalServer')):
+        return True
+    status = getattr(error, 'status_code', None) or getattr(error, 'http_status', None)
+    return isinstance(status, int) and status >= 500
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ProviderGovernor:
+    """模型服务请求调度器（每个模型服务一个实例，所有分析任务共用）
+    
+    - 重试：限流、超时和服务端错误按指数退避重试，等待时间带随机抖动，避免并发请求同时重试；
+    - AIMD并发控制：成功时在途上限缓慢增加（每轮约+1），限流时减半；上次减半之前发出的请求
+      再被限流不会重复减半，吞吐量会稳定在服务实际允许的并发附近；
+    - 熔断：连续失败（不含限流）达到阈值后熔断 ``reset_timeout`` 秒，期间暂停发送请求，
+      之后只放行一个试探请求，成功则恢复，失败则重新熔断。熔断和试探期间到达的请求不直接拒绝，
+      而是等待试探成功后继续；熔断到期后再过 ``reset_timeout`` 秒仍未恢复才抛出 :class:`CircuitOpenError`；
+    - 统计：请求、成功、失败、重试、限流、熔断次数以及当前并发上限。
+    
+    等待使用各自事件循环的 Future，并用线程锁保护状态，可在多个事件循环中共用。
+    """
+    
+    def __init__(self, name: str, max_limit: int = 8, min_limit: int = 1, initial_limit: Optional[float] = None,
+                 max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """初始化调度器
+        
+        Args:
+            name: 模型服务名称
+            max_limit: 在途请求数上限的最大值
+            min_limit: 在途请求数上限的最小值
+            initial_limit: 初始在途上限，默认等于 max_limit
+            max_retries: 单个请求的最大重试次数
+            base_delay: 首次重试的基准等待秒数，之后每次翻倍
+            max_delay: 单次等待的最大秒数
+            failure_threshold: 触发熔断的连续失败次数
+            reset_timeout: 熔断持续秒数
+        """
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(initial_limit or self.max_limit)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self.metrics = {
+            "requests": 0, "successes": 0, "failures": 0, "retries": 0,
+            "throttled": 0, "circuit_opens": 0, "rejected": 0
+        }
+        self._last_decrease = 0.0
+        self._waiters: deque[asyncio.Future] = deque()
+        # 等待熔断器恢复（或可以试探）的请求
+        self._circuit_waiters: list[asyncio.Future] = []
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        """熔断器状态：closed（正常）/open（熔断中）/half_open（试探中）"""
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.reset_timeout else "half_open"
+    
+    @property
+    def stats(self) -> dict:
+        """调度统计"""
+        with self._lock:
+            return dict(self.metrics, name=self.name, limit=round(self.limit, 2), in_flight=self.in_flight,
+                        state=self.state)
+    
+    async def run(self, call: Callable[[], Awaitable[T]]) -> T:
+        """在并发上限、重试和熔断控制下执行一次请求
+        
+        Args:
+            call: 发出请求的协程函数（每次重试都会重新调用）
+        
+        Returns:
+            请求结果
+        
+        Raises:
+            CircuitOpenError: 等待 ``reset_timeout`` 秒后仍处于熔断中
+            Exception: 不可重试的错误，或重试次数用尽后的最后一个错误
+        """
+        for attempt in range(self.max_retries + 1):
+            probe = await self._admit()
+            try:
+                started = await self._acquire()
+            except BaseException:
+                self._end_probe(probe)
+                raise
+            LLM_INFLIGHT.inc(provider=self.name)
+            try:
+                result = await call()
+            except BaseException as e:
+                self._release()
+                if not isinstance(e, Exception):
+                    # 取消等：归还名额后直接抛出
+                    self._observe(started, "error")
+                    self._end_probe(probe)
+                    raise
+                self._observe(started, "rate_limited" if is_rate_limited(e) else "error")
+                retryable = self._on_error(e, started)
+                # 先由 _on_error 重新熔断，再允许下一次试探
+                self._end_probe(probe)
+                if not retryable or attempt == self.max_retries:
+                    raise
+                delay = random.uniform(0.5, 1.0) * min(self.max_delay, self.base_delay * 2 ** attempt)
+                with self._lock:
+                    self.metrics["retries"] += 1
+                print(f"{self.name} 请求失败（{str(e)}），{delay:.1f} 秒后重试，当前并发上限 {self.limit:.1f}")
+                await asyncio.sleep(delay)
+                continue
+            self._release()
+            self._observe(started, "ok")
+            self._on_success()
+            self._end_probe(probe)
+            return result
+        raise RuntimeError("unreachable")
+    
+    async def _admit(self) -> bool:
+        """等待熔断器放行本次请求，返回本次请求是否为半开状态下的试探请求
+        
+        熔断中或已有试探请求在途时，等待试探结束或熔断到期后重新检查；
+        最多等待到熔断到期后再过 ``reset_timeout`` 秒（留给试探请求的时间）。
+        
+        Raises:
+            CircuitOpenError: 等待超时后仍未放行
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None
+        while True:
+            with self._lock:
+                state = self.state
+                if state == "closed":
+                    return False
+                if state == "half_open" and not self._probing:
+                    self._probing = True
+                    return True
+                now = time.monotonic()
+                if deadline is None:
+                    reopen_at = self.opened_at + self.reset_timeout if state == "open" else now
+                    deadline = max(now, reopen_at) + self.reset_timeout
+                if now >= deadline:
+                    self.metrics["rejected"] += 1
+                    break
+                timeout = deadline - now
+                if state == "open":
+                    # 熔断到期时可以试探，不必等到截止时间
+                    timeout = min(timeout, self.opened_at + self.reset_timeout - now)
+                future = loop.create_future()
+                self._circuit_waiters.append(future)
+            try:
+                await asyncio.wait_for(future, max(timeout, 0.001))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._lock:
+                    if future in self._circuit_waiters:
+                        self._circuit_waiters.remove(future)
+        LLM_REQUESTS.inc(provider=self.name, outcome="rejected")
+        raise CircuitOpenError(f"{self.name} 已熔断，等待试探恢复超时")
+    
+    def _end_probe(self, probe: bool) -> None:
+        """试探请求结束（结果已由 _on_success/_on_error 记录），唤醒等待熔断器的请求重新检查"""
+        if probe:
+            with self._lock:
+                self._probing = False
+                self._wake_circuit_waiters()
+    
+    def _wake_circuit_waiters(self) -> None:
+        """唤醒所有等待熔断器的请求（调用方持有锁）"""
+        waiters, self._circuit_waiters = self._circuit_waiters, []
+        for future in waiters:
+            if not future.done():
+                future.get_loop().call_soon_threadsafe(_wake, future)
+    
+    async def _acquire(self) -> float:
+        """获取并发名额，返回获取的时刻"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self.in_flight < max(self.min_limit, int(self.limit)):
+                    self.in_flight += 1
+                    self.metrics["requests"] += 1
+                    return time.monotonic()
+                future = loop.create_future()
+                self._waiters.append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self._lock:
+                    if future in self._waiters:
+                        self._waiters.remove(future)
+                raise
+    
+    def _observe(self, started: float, outcome: str) -> None:
+        """记录一次请求的耗时和结果"""
+        LLM_INFLIGHT.dec(provider=self.name)
+        LLM_LATENCY.observe(time.monotonic() - started, provider=self.name)
+        LLM_REQUESTS.inc(provider=self.name, outcome=outcome)
+    
+    def _release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._wake_waiters()
+    
+    def _wake_waiters(self) -> None:
+        """唤醒可以获得并发名额的等待者（调用方持有锁）"""
+        free = max(self.min_limit, int(self.limit)) - self.in_flight
+        while free > 0 and self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.get_loop().call_soon_threadsafe(_wake, future)
+                free -= 1
+    
+    def _on_success(self) -> None:
+        with self._lock:
+            self.metrics["successes"] += 1
+            self.consecutive_failures = 0
+            if self.opened_at is not None:
+                self.opened_at = None
+                self._wake_circuit_waiters()
+            # 加性增：每轮（约 limit 个请求）上限 +1
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / max(self.limit, 1.0))
+            self._wake_waiters()
+    
+    def _on_error(self, error: Exception, started: float) -> bool:
+        """记录失败并调整并发上限，返回是否应重试"""
+        with self._lock:
+            if is_rate_limited(error):
+                self.metrics["throttled"] += 1
+                # 乘性减：在上次减半之前发出的请求反映的是旧的并发上限，不再重复减半
+                if started >= self._last_decrease:
+                    self.limit = max(float(self.min_limit), self.limit / 2)
+                    self._last_decrease = time.monotonic()
+                return True
+            
+            self.metrics["failures"] += 1
+            self.consecutive_failures += 1
+            if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+                # 试探请求失败或连续失败过多时（重新）熔断
+                if self.state != "open":
+                    self.metrics["circuit_opens"] += 1
+                    print(f"{self.name} 连续失败 {self.consecutive_failures} 次，熔断 {self.reset_timeout:.0f} 秒")
+                self.opened_at = time.monotonic()
+            return is_retryable(error)
+
+
+_governors: Dict[str, ProviderGovernor] = {}
+_governors_lock = threading.Lock()
+
+
+def get_governor(name: str, **options) -> ProviderGovernor:
+    """获取（不存在时创建）某个模型服务的共享调度器
+    
+    Args:
+        name: 模型服务名称
+        **options: 首次创建时传给 :class:`ProviderGovernor` 的参数
+    
+    Returns:
+        ProviderGovernor: 调度器
+    """
+    with _governors_lock:
+        if name not in _governors:
+            _governors[name] = ProviderGovernor(name, **options)
+        return _governors[name]
+
+
+def governor_stats() -> list[dict]:
+    """所有模型服务调度器的统计"""
+    with _governors_lock:
+        governors = list(_governors.values())
+    return [governor.stats for governor in governors]
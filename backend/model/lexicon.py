@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class AhoCorasick:
+    """Aho-Corasick 多模式匹配自动机
+    
+    一次扫描文本即可找出所有词条的出现位置，每个字符的匹配开销与词条数量无关。
+    """
+    
+    def __init__(self, terms: Iterable[str]):
+        """编译自动机
+        
+        Args:
+            terms: 词条列表（空串会被忽略），词条编号为其在去重后列表中的下标
+        """
+        self.terms: List[str] = list(dict.fromkeys(term for term in terms if term))
+        self._goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        
+        # 构建字典树
+        for term_id, term in enumerate(self.terms):
+            state = 0
+            for char in term:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(term_id)
+        
+        # 按层（BFS）计算失配指针，并把失配链上的输出合并到当前状态
+        self._fail = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                outputs[next_state].extend(outputs[self._fail[next_state]])
+        self._outputs: List[Tuple[int, ...]] = [tuple(output) for output in outputs]
+    
+    def find_ids(self, text: str) -> set[int]:
+        """找出文本中出现过的词条编号（每个词条只计一次）
+        
+        Args:
+            text: 文本
+        
+        Returns:
+            set[int]: 出现过的词条编号
+        """
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        found: set[int] = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
+    
+    def find(self, text: str) -> List[str]:
+        """找出文本中出现过的词条
+        
+        Args:
+            text: 文本
+        
+        Returns:
+            List[str]: 出现过的词条（按编号排序）
+        """
+        return [self.terms[term_id] for term_id in sorted(self.find_ids(text))]
+
+
+class SentimentLexicon:
+    """带权重的情感词典
+    
+    正权重为正面词，负权重为负面词。每条评论中每个词只计一次，正面得分为命中正面词的权重之和，
+    负面得分为命中负面词的权重绝对值之和。内置词典每个词权重为1，与原来逐词查找的结果一致。
+    
+    词典文件为UTF-8文本，每行 ``词语<TAB>权重``（权重省略时为1），``#`` 开头的行为注释。
+    """
+    
+    POSITIVE_WORDS = ['好', '棒', '优秀', '喜欢', '赞', '精彩', '完美', '满意', '支持', '厉害']
+    NEGATIVE_WORDS = ['差', '糟糕', '垃圾', '失望', '讨厌', '不满', '反对', '无聊', '错误', '失败']
+    
+    def __init__(self, weights: Dict[str, float]):
+        """编译词典
+        
+        Args:
+            weights: 词语 -> 权重（词语按小写匹配）
+        """
+        merged: Dict[str, float] = {}
+        for term, weight in weights.items():
+            if term and weight:
+                merged[term.lower()] = weight
+        self.automaton = AhoCorasick(merged)
+        self.weights = [merged[term] for term in self.automaton.terms]
+        digest = hashlib.sha1(repr(sorted(merged.items())).encode('utf-8')).hexdigest()
+        self.fingerprint = digest[:12]
+    
+    def __len__(self) -> int:
+        return len(self.weights)
+    
+    @classmethod
+    def builtin(cls) -> "SentimentLexicon":
+        """内置的小词典"""
+        weights = {word: 1.0 for word in cls.POSITIVE_WORDS}
+        weights.update({word: -1.0 for word in cls.NEGATIVE_WORDS})
+        return cls(weights)
+    
+    @staticmethod
+    def read_file(path: Path) -> Dict[str, float]:
+        """读取词典文件
+        
+        Args:
+            path: 词典文件路径
+        
+        Returns:
+            Dict[str, float]: 词语 -> 权重
+        """
+        weights = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                term, _, weight = line.partition('\t')
+                try:
+                    weights[term.strip()] = float(weight) if weight.strip() else 1.0
+                except ValueError:
+                    print(f"忽略词典中无法解析的行: {line}")
+        return weights
+    
+    @classmethod
+    def from_file(cls, path: Path, include_builtin: bool = True) -> "SentimentLexicon":
+        """从词典文件加载
+        
+        Args:
+            path: 词典文件路径
+            include_builtin: 是否合并内置词典（文件中的同名词覆盖内置权重）
+        
+        Returns:
+            SentimentLexicon: 情感词典
+        """
+        weights = {}
+        if include_builtin:
+            weights.update({word: 1.0 for word in cls.POSITIVE_WORDS})
+            weights.update({word: -1.0 for word in cls.NEGATIVE_WORDS})
+        weights.update(cls.read_file(Path(path)))
+        return cls(weights)
+    
+    def score(self, text: str) -> Tuple[float, float]:
+        """计算一条评论的情感得分
+        
+        Args:
+            text: 评论文本
+        
+        Returns:
+            Tuple[float, float]: (正面得分, 负面得分)
+        """
+        positive = 0.0
+        negative = 0.0
+        weights = self.weights
+        for term_id in self.automaton.find_ids(text.lower()):
+            weight = weights[term_id]
+            if weight > 0:
+                positive += weight
+            else:
+                negative -= weight
+        return positive, negative
+    
+    def classify_batch(self, comments: List[str]) -> List[str]:
+        """按情感得分批量分类评论
+        
+        正面得分高于负面时，得分达到2为"优"，否则为"良"；负面得分更高为"差"；持平为"中"。
+        
+        Args:
+            comments: 评论列表
+        
+        Returns:
+            List[str]: 分类结果列表（优/良/中/差）
+        """
+        classifications = []
+        for comment in comments:
+            positive, negative = self.score(comment)
+            if positive > negative:
+                classifications.append('优' if positive >= 2 else '良')
+            elif negative > positive:
+                classifications.append('差')
+            else:
+                classifications.append('中')
+        return classifications
+
+
+_default_lexicon: Optional[SentimentLexicon] = None
+
+
+def get_default_lexicon() -> SentimentLexicon:
+    """获取默认情感词典
+    
+    设置了环境变量 ``BILI_SENTIMENT_LEXICON`` 时加载该词典文件（合并内置词典），否则使用内置词典。
+    """
+    global _default_lexicon
+    if _default_lexicon is None:
+        path = os.getenv("BILI_SENTIMENT_LEXICON")
+        _default_lexicon = SentimentLexicon.from_file(Path(path)) if path else SentimentLexicon.builtin()
+    return _default_lexicon
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""本地字符 n-gram 线性分类器
+
+用已有的分析结果（``*_analyzed.jsonl`` 中的 ``cleaned_text`` -> ``classification``）训练一个
+多分类逻辑回归模型，分析时先用它分类，只有置信度不够的评论才交给大模型：
+
+    python -m backend.model.local_classifier train data/comments/*_analyzed.jsonl
+    python -m backend.model.local_classifier eval data/comments/BV1uWFzz3Ewd_raw_cleaned_analyzed.jsonl
+
+依赖 numpy（可选依赖），未安装时 :func:`NGramClassifier.load_if_exists` 返回 None，分析流程不受影响。
+"""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+import random
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 合法的分类结果（训练数据中的其他类别会被忽略）
+CLASSIFICATIONS = ('优', '良', '中', '差', '不明意义')
+
+
+class NGramClassifier:
+    """字符 n-gram + 特征哈希的多分类逻辑回归
+    
+    每条评论取 1..``max_n`` 字符 n-gram，用 CRC32 哈希到 ``2 ** hash_bits`` 维（与进程无关，模型可保存复用），
+    特征值按评论的 n-gram 数归一化。推理时整批评论的稀疏特征拼成一个数组，用一次 ``np.add.reduceat``
+    算出所有评论的得分。
+    
+    训练数据往往以某一类为主，完全陌生的评论会直接落到多数类上且概率很高，
+    因此 :meth:`predict` 的置信度还要乘以评论中训练时见过的 n-gram 比例。
+    """
+    
+    DEFAULT_PATH = Path("data/models/local_classifier.npz")
+    
+    def __init__(self, classes: List[str], hash_bits: int = 16, max_n: int = 3):
+        """初始化分类器
+        
+        Args:
+            classes: 类别列表
+            hash_bits: 特征哈希的位数
+            max_n: 最长的字符 n-gram
+        """
+        if np is None:
+            raise ImportError("本地分类器需要 numpy，请先安装: pip install numpy")
+        self.classes = list(classes)
+        self.hash_bits = hash_bits
+        self.max_n = max_n
+        self.weights = np.zeros((1 << hash_bits, len(self.classes)), dtype=np.float32)
+        self.seen = np.zeros(1 << hash_bits, dtype=bool)
+        self._gram_ids: Dict[str, int] = {}
+    
+    def _gram_id(self, gram: str) -> int:
+        feature = self._gram_ids.get(gram)
+        if feature is None:
+            feature = zlib.crc32(gram.encode('utf-8')) & ((1 << self.hash_bits) - 1)
+            if len(self._gram_ids) < 1_000_000:
+                self._gram_ids[gram] = feature
+        return feature
+    
+    def _featurize(self, texts: List[str]) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+        """把评论转换为拼接的稀疏特征
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: (特征编号, 特征值, 每条评论的起始位置)
+        """
+        indices: List[int] = []
+        values: List[float] = []
+        offsets = []
+        for text in texts:
+            offsets.append(len(indices))
+            # 首尾标记让短评论也有区分度，"\x00" 是恒定存在的偏置特征，保证每行至少有一个特征
+            text = f"^{text.lower()}$"
+            features = {self._gram_id("\x00")}
+            for n in range(1, self.max_n + 1):
+                for i in range(len(text) - n + 1):
+                    features.add(self._gram_id(text[i:i + n]))
+            value = 1.0 / len(features) ** 0.5
+            indices.extend(features)
+            values.extend([value] * len(features))
+        return (np.asarray(indices, dtype=np.int64), np.asarray(values, dtype=np.float32),
+                np.asarray(offsets, dtype=np.int64))
+    
+    def _logits(self, indices: "np.ndarray", values: "np.ndarray", offsets: "np.ndarray") -> "np.ndarray":
+        return np.add.reduceat(self.weights[indices] * values[:, None], offsets, axis=0)
+    
+    @staticmethod
+    def _softmax(logits: "np.ndarray") -> "np.ndarray":
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+    
+    def fit(self, texts: List[str], labels: List[str], epochs: int = 8, learning_rate: float = 2.0,
+            batch_size: int = 256, l2: float = 1e-6, seed: int = 0) -> "NGramClassifier":
+        """用小批量 AdaGrad 训练，各类别的样本按出现频率的倒数加权
+        
+        Args:
+            texts: 评论列表
+            labels: 类别列表（不在 ``classes`` 中的样本被忽略）
+            epochs: 训练轮数
+            learning_rate: 学习率
+            batch_size: 每批样本数
+            l2: L2 正则系数
+            seed: 随机种子
+        
+        Returns:
+            NGramClassifier: 自身
+        """
+        class_ids = {name: i for i, name in enumerate(self.classes)}
+        samples = [(text, class_ids[label]) for text, label in zip(texts, labels) if label in class_ids]
+        rng = random.Random(seed)
+        squared = np.full(self.weights.shape, 1e-8, dtype=np.float32)
+        dim, num_classes = self.weights.shape
+        counts = np.bincount([label for _, label in samples], minlength=num_classes)
+        class_weights = (len(samples) / (num_classes * np.maximum(counts, 1))).astype(np.float32)
+        
+        for _ in range(epochs):
+            rng.shuffle(samples)
+            for start in range(0, len(samples), batch_size):
+                batch = samples[start:start + batch_size]
+                indices, values, offsets = self._featurize([text for text, _ in batch])
+                targets = np.asarray([label for _, label in batch], dtype=np.int64)
+                
+                errors = self._softmax(self._logits(indices, values, offsets))
+                errors[np.arange(len(batch)), targets] -= 1.0
+                errors *= class_weights[targets][:, None] / len(batch)
+                rows = np.repeat(np.arange(len(batch)), np.diff(np.append(offsets, len(indices))))
+                
+                # 只更新本批出现过的特征
+                touched = np.unique(indices)
+                self.seen[touched] = True
+                gradient = np.empty((len(touched), num_classes), dtype=np.float32)
+                positions = np.searchsorted(touched, indices)
+                for c in range(num_classes):
+                    gradient[:, c] = np.bincount(positions, weights=values * errors[rows, c], minlength=len(touched))
+                gradient += l2 * self.weights[touched]
+                squared[touched] += gradient ** 2
+                self.weights[touched] -= learning_rate * gradient / np.sqrt(squared[touched])
+        return self
+    
+    def predict_proba(self, texts: List[str]) -> "np.ndarray":
+        """批量计算各类别的概率
+        
+        Args:
+            texts: 评论列表
+        
+        Returns:
+            np.ndarray: 形状为 (评论数, 类别数) 的概率矩阵
+        """
+        if not texts:
+            return np.zeros((0, len(self.classes)), dtype=np.float32)
+        return self._softmax(self._logits(*self._featurize(texts)))
+    
+    def predict(self, texts: List[str]) -> Tuple[List[str], List[float]]:
+        """批量分类
+        
+        Args:
+            texts: 评论列表
+        
+        Returns:
+            Tuple[List[str], List[float]]: (类别列表, 置信度列表)
+        """
+        if not texts:
+            return [], []
+        indices, values, offsets = self._featurize(texts)
+        probabilities = self._softmax(self._logits(indices, values, offsets))
+        best = probabilities.argmax(axis=1)
+        # 置信度乘以见过的 n-gram 比例（偏置特征总是见过，不计入）
+        sizes = np.diff(np.append(offsets, len(indices)))
+        known = (np.add.reduceat(self.seen[indices].astype(np.float32), offsets) - 1) / np.maximum(sizes - 1, 1)
+        confidences = probabilities[np.arange(len(texts)), best] * known
+        return [self.classes[i] for i in best], confidences.tolist()
+    
+    def save(self, path: Path = DEFAULT_PATH) -> Path:
+        """保存模型
+        
+        Args:
+            path: 模型文件路径（.npz）
+        
+        Returns:
+            Path: 模型文件路径
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, weights=self.weights, seen=self.seen, classes=np.asarray(self.classes),
+                                config=np.asarray([self.hash_bits, self.max_n]))
+        return path
+    
+    @classmethod
+    def load(cls, path: Path = DEFAULT_PATH) -> "NGramClassifier":
+        """加载模型
+        
+        Args:
+            path: 模型文件路径
+        
+        Returns:
+            NGramClassifier: 分类器
+        """
+        if np is None:
+            raise ImportError("本地分类器需要 numpy，请先安装: pip install numpy")
+        with np.load(path) as data:
+            hash_bits, max_n = (int(value) for value in data['config'])
+            model = cls([str(name) for name in data['classes']], hash_bits, max_n)
+            model.weights = data['weights'].astype(np.float32)
+            model.seen = data['seen'].astype(bool)
+        return model
+    
+    @classmethod
+    def load_if_exists(cls, path: Path = DEFAULT_PATH) -> Optional["NGramClassifier"]:
+        """模型文件存在且已安装 numpy 时加载模型，否则返回None"""
+        if np is None or not Path(path).exists():
+            return None
+        try:
+            return cls.load(path)
+        except Exception as e:
+            print(f"加载本地分类器失败: {str(e)}")
+            return None
+
+
+def read_labelled(files: Iterable[Path]) -> Tuple[List[str], List[str]]:
+    """读取分析结果文件中的 (cleaned_text, classification)
+    
+    分类不在 :data:`CLASSIFICATIONS` 中的记录不参与训练。
+    
+    Args:
+        files: ``*_analyzed.jsonl`` 文件列表
+    
+    Returns:
+        Tuple[List[str], List[str]]: (评论列表, 类别列表)
+    """
+    texts = []
+    labels = []
+    for file in files:
+        with open(file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except Exception:
+                    continue
+                text = record.get('cleaned_text')
+                label = record.get('classification')
+                if isinstance(text, str) and text and label in CLASSIFICATIONS:
+                    texts.append(text)
+                    labels.append(label)
+    return texts, labels
+
+
+def accuracy_report(model: NGramClassifier, texts: List[str], labels: List[str],
+                    thresholds: Iterable[float] = (0.5, 0.7, 0.8, 0.9, 0.95)) -> List[dict]:
+    """各置信度阈值下本地分类器覆盖的评论比例和准确率
+    
+    Returns:
+        List[dict]: 每个阈值的 coverage（置信度达到阈值的比例）和 accuracy（这部分的准确率）
+    """
+    predictions, confidences = model.predict(texts)
+    report = []
+    for threshold in thresholds:
+        covered = [i for i, confidence in enumerate(confidences) if confidence >= threshold]
+        correct = sum(1 for i in covered if predictions[i] == labels[i])
+        report.append({
+            "threshold": threshold,
+            "coverage": round(len(covered) / len(texts), 4) if texts else 0.0,
+            "accuracy": round(correct / len(covered), 4) if covered else 0.0
+        })
+    return report
+
+
+def main() -> None:
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="训练/评估本地评论分类器")
+    parser.add_argument("command", choices=["train", "eval"])
+    parser.add_argument("files", type=Path, nargs="+", help="分析结果文件（*_analyzed.jsonl）")
+    parser.add_argument("--model", type=Path, default=NGramClassifier.DEFAULT_PATH, help="模型文件路径")
+    parser.add_argument("--epochs", type=int, default=8)
+    parser.add_argument("--holdout", type=float, default=0.2, help="训练时留作评估的样本比例")
+    args = parser.parse_args()
+    
+    texts, labels = read_labelled(args.files)
+    if not texts:
+        raise SystemExit("没有可用的标注数据")
+    
+    if args.command == "train":
+        samples = list(zip(texts, labels))
+        random.Random(0).shuffle(samples)
+        split = int(len(samples) * (1 - args.holdout))
+        train, test = samples[:split], samples[split:]
+        model = NGramClassifier(sorted(set(labels)))
+        model.fit([t for t, _ in train], [l for _, l in train], epochs=args.epochs)
+        print(f"训练样本 {len(train)} 条，模型已保存到 {model.save(args.model)}")
+        if test:
+            texts, labels = [t for t, _ in test], [l for _, l in test]
+    else:
+        model = NGramClassifier.load(args.model)
+    
+    for row in accuracy_report(model, texts, labels):
+        print(f"置信度 >= {row['threshold']}: 覆盖 {row['coverage']:.1%}，准确率 {row['accuracy']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
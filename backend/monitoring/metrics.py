@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""进程内指标（Prometheus 文本格式）
+
+提供计数器、仪表盘和直方图三种指标，所有指标注册在模块级的 :data:`REGISTRY` 中，
+由 ``GET /metrics`` 输出。各阶段的指标在本模块中统一定义，业务代码只需导入使用::
+
+    from backend.monitoring.metrics import LLM_LATENCY, timed
+    
+    with timed(LLM_LATENCY, provider="ernie"):
+        ...
+
+指标只在当前进程内累计；多个工作进程时每个进程分别输出（Prometheus 按实例分别抓取）。
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    """指标基类
+    
+    每组标签值对应一个样本，标签名在创建时确定，使用时以关键字参数给出标签值。
+    """
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        """创建指标
+        
+        Args:
+            name: 指标名称
+            documentation: 指标说明
+            labels: 标签名列表
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labels}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+    
+    def _label_text(self, values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labels, values))
+        if extra is not None:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+    
+    def samples(self) -> List[str]:
+        """输出样本行"""
+        raise NotImplementedError
+    
+    def render(self) -> str:
+        """输出该指标的 HELP/TYPE 行和样本行"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """单调递增的计数器"""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+    
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """增加计数"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def value(self, **labels: str) -> float:
+        """读取当前计数"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+    
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._label_text(key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Metric):
+    """可增可减的仪表盘（在途请求数等）"""
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+    
+    def set(self, value: float, **labels: str) -> None:
+        """设置当前值"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+    
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """增加当前值"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        """减少当前值"""
+        self.inc(-amount, **labels)
+    
+    def value(self, **labels: str) -> float:
+        """读取当前值"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+    
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._label_text(key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(Metric):
+    """直方图：按桶累计观测值的分布，同时记录总和与次数"""
+    
+    kind = "histogram"
+    # 默认桶（秒），覆盖毫秒级的清洗到数十秒的模型请求
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # 标签值 -> [各桶计数（非累计）, 总和, 次数]
+        self._values: Dict[LabelValues, list] = {}
+    
+    def observe(self, value: float, **labels: str) -> None:
+        """记录一次观测值"""
+        key = self._key(labels)
+        # 二分查找所在的桶
+        low, high = 0, len(self.buckets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if value <= self.buckets[middle]:
+                high = middle
+            else:
+                low = middle + 1
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            state[0][low] += 1
+            state[1] += value
+            state[2] += 1
+    
+    def count(self, **labels: str) -> int:
+        """读取观测次数"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+    
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{self._label_text(key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {count}")
+        return lines
+
+
+class Registry:
+    """指标注册表
+    
+    除了注册的指标，还可以注册采集函数：输出时调用，返回 Prometheus 文本，
+    用于导出模型调度器、分析缓存等已有统计。
+    """
+    
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], str]] = []
+        self._lock = threading.Lock()
+    
+    def register(self, metric: Metric) -> Metric:
+        """注册指标（同名指标只注册一次，返回已注册的实例）"""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+    
+    def add_collector(self, collector: Callable[[], str]) -> None:
+        """注册采集函数"""
+        with self._lock:
+            self._collectors.append(collector)
+    
+    def render(self) -> str:
+        """输出所有指标的 Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        parts = [metric.render() for metric in metrics]
+        for collector in collectors:
+            try:
+                text = collector()
+            except Exception as e:
+                print(f"采集指标失败: {str(e)}")
+                continue
+            if text:
+                parts.append(text.rstrip("\n"))
+        return "\n".join(parts) + "\n"
+
+
+def render_family(name: str, kind: str, documentation: str,
+                  samples: Iterable[Tuple[Dict[str, str], float]]) -> str:
+    """把已有统计输出为一个指标族（供采集函数使用）
+    
+    Args:
+        name: 指标名称
+        kind: 指标类型（counter/gauge）
+        documentation: 指标说明
+        samples: (标签, 值) 列表
+    
+    Returns:
+        str: Prometheus 文本
+    """
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+        lines.append(f"{name}{{{label_text}}} {_format_value(float(value))}" if label_text
+                     else f"{name} {_format_value(float(value))}")
+    return "\n".join(lines)
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labels: Iterable[str] = ()) -> Counter:
+    """创建并注册计数器"""
+    return REGISTRY.register(Counter(name, documentation, labels))
+
+
+def gauge(name: str, documentation: str, labels: Iterable[str] = ()) -> Gauge:
+    """创建并注册仪表盘"""
+    return REGISTRY.register(Gauge(name, documentation, labels))
+
+
+def histogram(name: str, documentation: str, labels: Iterable[str] = (),
+              buckets: Iterable[float] = Histogram.DEFAULT_BUCKETS) -> Histogram:
+    """创建并注册直方图"""
+    return REGISTRY.register(Histogram(name, documentation, labels, buckets))
+
+
+@contextmanager
+def timed(metric: Histogram, inflight: Optional[Gauge] = None, **labels: str) -> Iterator[None]:
+    """记录代码块的耗时（秒），可同时维护在途数量
+    
+    同步代码和协程中都可以使用（``with`` 块内可以 ``await``）。
+    
+    Args:
+        metric: 记录耗时的直方图
+        inflight: 代码块执行期间加一的仪表盘
+        **labels: 标签值（两个指标使用相同的标签）
+    """
+    if inflight is not None:
+        inflight.inc(**labels)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metric.observe(time.perf_counter() - started, **labels)
+        if inflight is not None:
+            inflight.dec(**labels)
+
+
+# 爬取
+CRAWL_DURATION = histogram("bili_crawl_duration_seconds", "单个视频爬取耗时", ["transport"],
+                           buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+CRAWL_PAGES = counter("bili_crawl_pages_total", "请求的评论分页数", ["kind", "outcome"])
+CRAWL_PAGE_LATENCY = histogram("bili_crawl_page_seconds", "单次评论分页请求耗时（含重试等待）", ["kind"])
+CRAWL_COMMENTS = counter("bili_crawl_comments_total", "写入文件的评论数")
+CRAWL_INFLIGHT = gauge("bili_crawl_inflight", "正在爬取的视频数")
+CRAWL_FALLBACKS = counter("bili_crawl_fallbacks_total", "爬取回退次数（切换传输层、生成模拟数据）", ["reason"])
+
+# 清洗
+CLEAN_DURATION = histogram("bili_clean_duration_seconds", "清洗耗时", ["stage"])
+CLEAN_COMMENTS = counter("bili_clean_comments_total", "清洗的评论数", ["stage"])
+
+# 分析
+LLM_LATENCY = histogram("bili_llm_request_seconds", "单次模型请求耗时（不含重试等待）", ["provider"])
+LLM_REQUESTS = counter("bili_llm_requests_total", "模型请求数", ["provider", "outcome"])
+LLM_INFLIGHT = gauge("bili_llm_inflight", "在途的模型请求数", ["provider"])
+LLM_BATCH_SIZE = histogram("bili_llm_batch_size", "每次模型请求包含的评论数", ["provider"],
+                           buckets=(1, 5, 10, 20, 30, 50, 100, 200))
+ANALYZE_DURATION = histogram("bili_analyze_duration_seconds", "一批评论的分析耗时（含缓存查询和本地分类）")
+ANALYZE_COMMENTS = counter("bili_analyze_comments_total", "分析的评论数（按结果来源）", ["source"])
+ANALYZE_FALLBACKS = counter("bili_analyze_fallbacks_total", "模型不可用或失败后使用本地实现的评论数", ["reason"])
+
+# API
+HTTP_LATENCY = histogram("bili_http_request_seconds", "API请求耗时", ["route"])
+HTTP_INFLIGHT = gauge("bili_http_inflight", "处理中的API请求数", ["route"])
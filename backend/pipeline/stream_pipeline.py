@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import asyncio
+from collections import Counter, OrderedDict, deque
+import json
+from pathlib import Path
+from typing import Callable
+
+from backend.crawler.bilibili_crawler import BilibiliCrawler
+from backend.model.comment_analyzer import CommentAnalyzer
+from backend.processor.comment_processor import CommentProcessor
+from backend.processor.dedup import CommentDeduplicator
+from backend.storage.comment_index import build_index
+from backend.storage.result_summary import ResultSummary
+
+
+class StreamingPipeline:
+    """流式评论处理流水线
+    
+    爬取、清洗、分析三个阶段同时运行，阶段之间用有界的 asyncio 队列连接：
+    每页评论写入原始文件后立即交给清洗阶段，清洗结果凑够一批就交给分析阶段。
+    下游处理不过来时队列写满，上游在 ``put`` 处等待（爬取器暂停翻页），
+    总耗时接近最慢阶段的耗时而不是三者之和。去重状态和已分析的代表评论结果最多保留
+    ``max_groups`` 组（淘汰最久没有命中的），因此内存占用只取决于队列大小和 ``max_groups``，与评论总数无关。
+    
+    输出文件与分阶段处理相同：``{bvid}_raw.jsonl``、``{bvid}_raw_cleaned.jsonl``、
+    ``{bvid}_raw_cleaned_analyzed.jsonl``，分析结果的顺序与清洗结果一致。
+    流水线总是全新爬取，不支持续爬和增量模式。
+    """
+    
+    def __init__(self, crawler: BilibiliCrawler, processor: CommentProcessor, analyzer: CommentAnalyzer,
+                 queue_size: int = 16, batch_size: int = 30, max_groups: int = 100000):
+        """初始化流水线
+        
+        Args:
+            crawler: 评论爬取器
+            processor: 评论处理器
+            analyzer: 评论分析器（启用去重时，重复评论复用组内第一条的分析结果）
+            queue_size: 每个阶段间队列最多缓存的批数
+            batch_size: 凑够多少条待分析评论提交一次（超出模型token预算时自动拆为多次请求）
+            max_groups: 最多保留的去重组数和代表评论结果数，被淘汰的组再次出现时重新分析（或命中分析缓存）
+        """
+        self.crawler = crawler
+        self.processor = processor
+        self.analyzer = analyzer
+        self.queue_size = max(1, queue_size)
+        self.batch_size = max(1, batch_size)
+        self.max_groups = max(1, max_groups)
+    
+    async def run(self, bvid: str, max_comments: int = 10000, include_replies: bool = False,
+                  on_progress: Callable[[dict], None] | None = None) -> dict:
+        """爬取、清洗并分析一个视频的评论
+        
+        Args:
+            bvid: 视频BV号
+            max_comments: 最大评论数
+            include_replies: 是否同时爬取根评论下的回复串（楼中楼）
+            on_progress: 进度回调，参数为各阶段已处理的评论数（crawled/cleaned/analyzed）
+        
+        Returns:
+            dict: 各阶段的输出文件和评论数量
+        """
+        raw_file = self.crawler.output_dir / f"{bvid}_raw.jsonl"
+        cleaned_file = raw_file.with_name(f"{raw_file.stem}_cleaned.jsonl")
+        analyzed_file = cleaned_file.with_name(f"{cleaned_file.stem}_analyzed.jsonl")
+        raw_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        clean_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        stats = {"crawled": 0, "cleaned": 0, "analyzed": 0}
+        
+        def notify() -> None:
+            if on_progress is not None:
+                on_progress(dict(stats))
+        
+        async def push_raw(rows: list[dict]) -> None:
+            stats["crawled"] += len(rows)
+            notify()
+            await raw_queue.put(rows)
+        
+        async def crawl() -> None:
+            await self.crawler.crawl_comments_async(
+                bvid, max_comments, include_replies=include_replies, on_rows=push_raw
+            )
+            await raw_queue.put(None)
+        
+        async def clean() -> None:
+            with open(cleaned_file, 'w', encoding='utf-8') as out_f:
+                while (rows := await raw_queue.get()) is not None:
+                    rows = [row for row in rows if isinstance(row.get('text'), str)]
+                    records = [
+                        dict(row, cleaned_text=cleaned_text)
+                        for row, cleaned_text in zip(rows, self.processor.clean_batch([row['text'] for row in rows]))
+                        # 过滤过短评论
+                        if len(cleaned_text) > 5
+                    ]
+                    out_f.writelines(f"{json.dumps(record, ensure_ascii=False)}\n" for record in records)
+                    out_f.flush()
+                    stats["cleaned"] += len(records)
+                    notify()
+                    if records:
+                        await clean_queue.put(records)
+            await clean_queue.put(None)
+        
+        async def analyze() -> None:
+            await self._analyze_stream(clean_queue, analyzed_file, stats, notify)
+        
+        tasks = [asyncio.ensure_future(stage()) for stage in (crawl, clean, analyze)]
+        try:
+            # 任一阶段失败时取消其余阶段，避免在已满的队列上永久等待
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        await asyncio.to_thread(build_index, analyzed_file)
+        
+        return {
+            "file_path": str(raw_file),
+            "cleaned_file": str(cleaned_file),
+            "result_file": str(analyzed_file),
+            "comment_count": stats["crawled"],
+            "cleaned_count": stats["cleaned"],
+            "analyzed_count": stats["analyzed"]
+        }
+    
+    async def _analyze_stream(self, clean_queue: asyncio.Queue, analyzed_file: Path, stats: dict,
+                              notify: Callable[[], None]) -> None:
+        """分析阶段：按批并发分析代表评论，并按到达顺序写出结果
+        
+        代表评论凑够 ``batch_size`` 条即提交一批，最多同时分析 ``analyzer.max_concurrency`` 批，
+        窗口满时才等待最早提交的一批完成（此时上游因队列写满而暂停）。
+        每批完成后，等待队列开头代表评论已有结果的评论按顺序写出。
+        重复评论要等它的代表评论分析完才能写出，最多积压 ``queue_size * batch_size`` 条，
+        超过后不等凑满一批，立即提交已有的代表评论并等待最早的批次。
+        代表评论结果最多保留 ``max_groups`` 条（仍有评论等待写出的不淘汰）；结果已被淘汰的组再次出现时，
+        用本条评论代替代表评论重新分析。
+        """
+        if self.analyzer.deduplicator is not None:
+            deduplicator = CommentDeduplicator(max_groups=self.max_groups)
+        else:
+            deduplicator = None
+        # 代表评论序号 -> (总结, 分类)，按最近使用排序
+        results: OrderedDict[int, tuple[str, str]] = OrderedDict()
+        waiting: deque[tuple[dict, int]] = deque()  # 等待写出的 (评论, 代表评论序号)
+        references: Counter[int] = Counter()  # 代表评论序号 -> 等待写出的评论数
+        unique: list[tuple[int, str]] = []  # 等待提交的 (代表评论序号, 评论)
+        pending: set[int] = set()  # 已加入 unique 或正在分析、还没有结果的代表评论序号
+        in_flight: deque[asyncio.Future] = deque()  # 按提交顺序排列的分析中批次
+        window = max(1, self.analyzer.max_concurrency)
+        max_waiting = self.queue_size * self.batch_size
+        index = 0
+        result_summary = ResultSummary()
+        
+        async def analyze(batch: list[tuple[int, str]]) -> None:
+            summaries, classifications = await self.analyzer.analyze_batch([text for _, text in batch])
+            for (representative, _), summary, classification in zip(batch, summaries, classifications):
+                results[representative] = (summary, classification)
+                pending.discard(representative)
+        
+        def submit() -> None:
+            nonlocal unique
+            if unique:
+                batch, unique = unique, []
+                in_flight.append(asyncio.ensure_future(analyze(batch)))
+        
+        with open(analyzed_file, 'w', encoding='utf-8') as out_f:
+            def write_ready() -> None:
+                """写出等待队列开头已有结果的评论，并淘汰多余的代表评论结果"""
+                written = []
+                while waiting and waiting[0][1] in results:
+                    record, representative = waiting.popleft()
+                    references[representative] -= 1
+                    if not references[representative]:
+                        del references[representative]
+                    results.move_to_end(representative)
+                    record['summary'], record['classification'] = results[representative]
+                    json.dump(record, out_f, ensure_ascii=False)
+                    out_f.write('\n')
+                    written.append(record)
+                    stats["analyzed"] += 1
+                if not written:
+                    return
+                out_f.flush()
+                excess = len(results) - self.max_groups
+                if excess > 0:
+                    # 从最久未使用的开始淘汰，跳过仍有评论等待写出的
+                    for representative in [key for key in results if key not in references][:excess]:
+                        del results[representative]
+                # 结果汇总随写出的结果更新，查询结果时不必扫描整个文件
+                result_summary.add(written)
+                result_summary.save(analyzed_file)
+                notify()
+            
+            async def wait_oldest() -> None:
+                await in_flight.popleft()
+                write_ready()
+            
+            try:
+                while (records := await clean_queue.get()) is not None:
+                    if deduplicator is not None:
+                        # SimHash 是纯Python计算，整批放到线程中执行，不阻塞事件循环
+                        representatives = await asyncio.to_thread(
+                            lambda: [deduplicator.add(record['cleaned_text']) for record in records]
+                        )
+                    else:
+                        representatives = range(index, index + len(records))
+                    for record, representative in zip(records, representatives):
+                        text = record['cleaned_text']
+                        if representative not in results and representative not in pending:
+                            unique.append((representative, text))
+                            pending.add(representative)
+                        waiting.append((record, representative))
+                        references[representative] += 1
+                        index += 1
+                        if len(unique) >= self.batch_size:
+                            submit()
+                        while len(in_flight) >= window:
+                            await wait_oldest()
+                        while len(waiting) >= max_waiting and (unique or in_flight):
+                            submit()
+                            await wait_oldest()
+                    # 已完成的批次（以及只依赖已有结果的重复评论）及时写出
+                    while in_flight and in_flight[0].done():
+                        await wait_oldest()
+                    write_ready()
+                submit()
+                while in_flight:
+                    await wait_oldest()
+                write_ready()
+            finally:
+                for future in in_flight:
+                    future.cancel()
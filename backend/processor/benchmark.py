@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""评论清洗基准测试
+
+对比逐条清洗（clean_comment）与批量清洗（clean_batch）的耗时，并校验两者输出一致：
+
+    python -m backend.processor.benchmark data/comments/BV1uWFzz3Ewd_raw.jsonl --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from backend.processor.comment_processor import CommentProcessor
+
+
+def load_texts(input_file: Path) -> list[str]:
+    """读取原始评论文件中的评论文本"""
+    texts = []
+    with open(input_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                text = json.loads(line).get('text')
+            except Exception:
+                continue
+            if isinstance(text, str):
+                texts.append(text)
+    return texts
+
+
+def best_of(repeat: int, func) -> float:
+    """重复执行多次，返回最短耗时（秒）"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="评论清洗基准测试")
+    parser.add_argument("input_file", type=Path, nargs="?", default=Path("data/comments/BV1uWFzz3Ewd_raw.jsonl"))
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数（取最短耗时）")
+    parser.add_argument("--batch-size", type=int, default=0, help="每批评论数，0 表示整个文件一批")
+    args = parser.parse_args()
+    
+    processor = CommentProcessor()
+    texts = load_texts(args.input_file)
+    batch_size = args.batch_size or len(texts) or 1
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    
+    expected = [processor.clean_comment(text) for text in texts]
+    actual = [text for batch in batches for text in processor.clean_batch(batch)]
+    if actual != expected:
+        mismatches = sum(1 for a, b in zip(actual, expected) if a != b)
+        raise SystemExit(f"批量清洗结果与逐条清洗不一致: {mismatches} 条不同")
+    
+    single = best_of(args.repeat, lambda: [processor.clean_comment(text) for text in texts])
+    batched = best_of(args.repeat, lambda: [processor.clean_batch(batch) for batch in batches])
+    print(f"评论数: {len(texts)}，每批: {batch_size}")
+    print(f"逐条清洗: {single * 1000:.1f} ms（{len(texts) / single:.0f} 条/秒）" if single else "逐条清洗: 0 ms")
+    print(f"批量清洗: {batched * 1000:.1f} ms（{len(texts) / batched:.0f} 条/秒）" if batched else "批量清洗: 0 ms")
+    if batched:
+        print(f"加速比: {single / batched:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
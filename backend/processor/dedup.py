@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from collections import OrderedDict
+import hashlib
+import re
+
+
+class CommentDeduplicator:
+    """评论去重器
+    
+    把评论分组，每组只需分析一条代表评论：
+        - 完全重复：规范化文本（去掉空白和句中标点，统一大小写，压缩连续5个以上的重复字符）相同即为同一组，
+          句末的问号、感叹号等保留（"好？"和"好！"不合并）
+        - 近似重复：对字符 n-gram 计算 64 位 SimHash，汉明距离不超过 ``max_distance`` 即为同一组。
+          SimHash 按 16 位分成 4 段建立索引，由抽屉原理，距离不超过 3 的两条评论至少有一段完全相同，
+          因此只需比较同一段桶内的候选，整体接近线性时间
+    
+    过短的评论只做完全重复匹配，避免"很好看"和"不好看"这类短评被误合并。
+    设置 ``max_groups`` 后最多保留这么多组，超出时淘汰最久没有命中的组（之后再出现的同组评论会成为新的一组），
+    流式处理任意多条评论时内存占用有上限。
+    """
+    
+    BANDS = 4
+    BAND_BITS = 16
+    # 句末标点统一为半角后保留
+    SENTENCE_END = str.maketrans({'？': '?', '！': '!', '。': '.', '～': '~'})
+    # n-gram 哈希缓存的最大条目数，写满时清空
+    GRAM_CACHE_SIZE = 1 << 16
+    
+    def __init__(self, near_duplicates: bool = True, max_distance: int = 3, ngram: int = 3,
+                 min_near_length: int = 12, max_groups: int | None = None):
+        """初始化去重器
+        
+        Args:
+            near_duplicates: 是否合并近似重复的评论
+            max_distance: 近似重复允许的最大 SimHash 汉明距离（不超过 BANDS - 1）
+            ngram: 计算 SimHash 的字符 n-gram 长度
+            min_near_length: 参与近似重复匹配的最短规范化文本长度
+            max_groups: 最多保留的组数，None 表示不限
+        """
+        self.near_duplicates = near_duplicates
+        self.max_distance = min(max_distance, self.BANDS - 1)
+        self.ngram = ngram
+        self.min_near_length = min_near_length
+        self.max_groups = max_groups
+        self.normalize_pattern = re.compile(r'[^\w]+')
+        self.repeat_pattern = re.compile(r'(.)\1{4,}')
+        self.tail_pattern = re.compile(r'[\W_]+$')
+        self.ending_pattern = re.compile(r'[.!?~…]')
+        self._gram_hashes: dict[str, int] = {}
+        self.reset()
+    
+    def reset(self) -> None:
+        """清空已加入的评论"""
+        self._exact: dict[str, int] = {}
+        self._buckets: list[dict[int, list[tuple[int, int]]]] = [{} for _ in range(self.BANDS)]
+        # 代表评论序号 -> (组内的规范化文本, 代表评论的 SimHash)，按最近命中排序，用于淘汰
+        self._groups: OrderedDict[int, tuple[list[str], int | None]] = OrderedDict()
+        self._count = 0
+    
+    def normalize(self, text: str) -> str:
+        """规范化评论文本，用于完全重复匹配
+        
+        Args:
+            text: 评论文本
+        
+        Returns:
+            str: 规范化后的文本
+        """
+        text = text.lower()
+        tail = self.tail_pattern.search(text)
+        ending = ''
+        if tail is not None:
+            # 句末连续的标点只保留各种标点一次，"好？？？"与"好？"相同
+            ending = ''.join(dict.fromkeys(self.ending_pattern.findall(tail.group().translate(self.SENTENCE_END))))
+        text = self.normalize_pattern.sub('', text).replace('_', '')
+        return self.repeat_pattern.sub(r'\1', text) + ending
+    
+    def _gram_hash(self, gram: str) -> int:
+        value = self._gram_hashes.get(gram)
+        if value is None:
+            if len(self._gram_hashes) >= self.GRAM_CACHE_SIZE:
+                self._gram_hashes.clear()
+            value = int.from_bytes(hashlib.blake2b(gram.encode('utf-8'), digest_size=8).digest(), 'little')
+            self._gram_hashes[gram] = value
+        return value
+    
+    def _bands(self, fingerprint: int) -> list[int]:
+        mask = (1 << self.BAND_BITS) - 1
+        return [fingerprint >> (band * self.BAND_BITS) & mask for band in range(self.BANDS)]
+    
+    def simhash(self, text: str) -> int:
+        """计算规范化文本的 64 位 SimHash
+        
+        Args:
+            text: 规范化后的文本
+        
+        Returns:
+            int: SimHash 值
+        """
+        n = self.ngram
+        grams = {text[i:i + n] for i in range(max(1, len(text) - n + 1))}
+        weights = [0] * 64
+        for gram in grams:
+            value = self._gram_hash(gram)
+            for bit in range(64):
+                weights[bit] += 1 if value >> bit & 1 else -1
+        return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+    
+    def add(self, text: str) -> int:
+        """加入一条评论，返回其所在组的代表评论序号
+        
+        序号为评论的加入顺序（从0开始），代表评论为组内第一条加入的评论，
+        用于流式处理时逐条去重。
+        
+        Args:
+            text: 评论文本
+        
+        Returns:
+            int: 代表评论的序号，等于本条评论的序号时说明它是新的一组
+        """
+        index = self._count
+        self._count += 1
+        key = self.normalize(text)
+        representative = self._exact.get(key)
+        fingerprint = None
+        if representative is None and self.near_duplicates and len(key) >= self.min_near_length:
+            fingerprint = self.simhash(key)
+            bands = self._bands(fingerprint)
+            for band, value in enumerate(bands):
+                for candidate, candidate_fingerprint in self._buckets[band].get(value, ()):
+                    if (fingerprint ^ candidate_fingerprint).bit_count() <= self.max_distance:
+                        representative = candidate
+                        break
+                if representative is not None:
+                    break
+            if representative is None:
+                for band, value in enumerate(bands):
+                    self._buckets[band].setdefault(value, []).append((index, fingerprint))
+        if representative is None:
+            representative = index
+            self._groups[index] = ([], fingerprint)
+        else:
+            self._groups.move_to_end(representative)
+        if key not in self._exact:
+            self._exact[key] = representative
+            self._groups[representative][0].append(key)
+        self._evict()
+        return representative
+    
+    def _evict(self) -> None:
+        """淘汰最久没有命中的组，直到组数不超过 ``max_groups``"""
+        if self.max_groups is None:
+            return
+        while len(self._groups) > self.max_groups:
+            representative, (keys, fingerprint) = self._groups.popitem(last=False)
+            for key in keys:
+                del self._exact[key]
+            if fingerprint is not None:
+                for band, value in enumerate(self._bands(fingerprint)):
+                    bucket = self._buckets[band][value]
+                    bucket.remove((representative, fingerprint))
+                    if not bucket:
+                        del self._buckets[band][value]
+    
+    def group(self, texts: list[str]) -> list[int]:
+        """对评论分组（会清空之前加入的评论）
+        
+        Args:
+            texts: 评论列表
+        
+        Returns:
+            list[int]: 每条评论所在组的代表评论下标（代表评论为组内第一条）
+        """
+        self.reset()
+        return [self.add(text) for text in texts]
+
+
+def collapse(texts: list[str], deduplicator: CommentDeduplicator | None = None) -> tuple[list[str], list[int]]:
+    """把评论折叠为代表评论
+    
+    Args:
+        texts: 评论列表
+        deduplicator: 去重器，默认使用 :class:`CommentDeduplicator` 的默认配置
+    
+    Returns:
+        tuple[list[str], list[int]]: (代表评论列表, 每条评论对应的代表评论在代表列表中的下标)
+    """
+    groups = (deduplicator or CommentDeduplicator()).group(texts)
+    positions: dict[int, int] = {}
+    unique = []
+    mapping = []
+    for index, representative in enumerate(groups):
+        position = positions.get(representative)
+        if position is None:
+            position = positions[representative] = len(unique)
+            unique.append(texts[representative])
+        mapping.append(position)
+    return unique, mapping
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from array import array
+import json
+import os
+from pathlib import Path
+import sys
+import zlib
+
+
+class ColumnStore:
+    """按列存储的评论数据
+    
+    每个视频一个目录（``{bvid}.cols``），每列一个文件，处理阶段只需追加新列
+    （``cleaned_text``、``summary``、``classification``），不再复制整行；
+    读取时也只加载需要的列。列的编码方式根据数据自动选择：
+        - int: 小端 int64 数组（``{name}.i64``）
+        - dict: 低基数字符串列，取值表 + uint16 编码（``{name}.dict.json`` + ``{name}.codes``）
+        - str: zlib 压缩的拼接文本 + 字符偏移（``{name}.str`` + ``{name}.off``）
+    
+    清洗阶段被过滤掉的评论仍占一行，其 ``cleaned_text`` 为空字符串。
+    """
+    
+    SUFFIX = ".cols"
+    META_FILE = "_meta.json"
+    # 不同取值不超过该数量（且少于行数的一半）的字符串列使用字典编码
+    DICT_MAX_VALUES = 1024
+    
+    def __init__(self, path: Path):
+        """打开列存储目录
+        
+        Args:
+            path: 列存储目录
+        """
+        self.path = Path(path)
+        meta_file = self.path / self.META_FILE
+        if meta_file.exists():
+            self.meta = json.loads(meta_file.read_text(encoding='utf-8'))
+        else:
+            self.meta = {"rows": 0, "columns": {}}
+    
+    @classmethod
+    def is_store(cls, path: Path) -> bool:
+        """判断路径是否为列存储目录"""
+        return (Path(path) / cls.META_FILE).exists()
+    
+    @classmethod
+    def from_jsonl(cls, jsonl_file: Path, path: Path | None = None) -> "ColumnStore":
+        """把原始评论JSONL导入为列存储
+        
+        Args:
+            jsonl_file: 原始评论文件（如 ``{bvid}_raw.jsonl``）
+            path: 列存储目录，默认为 ``{bvid}.cols``
+        
+        Returns:
+            ColumnStore: 列存储
+        """
+        if path is None:
+            stem = jsonl_file.stem[:-len("_raw")] if jsonl_file.stem.endswith("_raw") else jsonl_file.stem
+            path = jsonl_file.with_name(f"{stem}{cls.SUFFIX}")
+        
+        columns: dict[str, list] = {}
+        rows = 0
+        with open(jsonl_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except Exception:
+                    continue
+                for name, value in record.items():
+                    # 之前的行缺少该字段时补默认值，保证各列等长
+                    columns.setdefault(name, [None] * rows).append(value)
+                rows += 1
+                for values in columns.values():
+                    if len(values) < rows:
+                        values.append(None)
+        
+        store = cls(path)
+        store.path.mkdir(parents=True, exist_ok=True)
+        store.meta = {"rows": rows, "columns": {}}
+        for name, values in columns.items():
+            store.write_column(name, values)
+        return store
+    
+    @property
+    def rows(self) -> int:
+        return self.meta["rows"]
+    
+    @property
+    def columns(self) -> list[str]:
+        return list(self.meta["columns"])
+    
+    def has_column(self, name: str) -> bool:
+        return name in self.meta["columns"]
+    
+    def _write_file(self, name: str, data: bytes) -> None:
+        tmp = self.path / f"{name}.tmp"
+        tmp.write_bytes(data)
+        os.replace(tmp, self.path / name)
+    
+    def _save_meta(self) -> None:
+        self._write_file(self.META_FILE, json.dumps(self.meta, ensure_ascii=False).encode('utf-8'))
+    
+    def write_column(self, name: str, values: list) -> None:
+        """写入（或覆盖）一列
+        
+        Args:
+            name: 列名
+            values: 列数据，长度必须等于行数
+        """
+        if len(values) != self.rows:
+            raise ValueError(f"列 {name} 的长度 {len(values)} 与行数 {self.rows} 不一致")
+        
+        if all(isinstance(v, int) and not isinstance(v, bool) for v in values if v is not None):
+            data = array('q', (v or 0 for v in values))
+            if sys.byteorder == 'big':
+                data.byteswap()
+            self._write_file(f"{name}.i64", data.tobytes())
+            column = {"type": "int"}
+        else:
+            texts = ['' if v is None else str(v) for v in values]
+            distinct = list(dict.fromkeys(texts))
+            if len(distinct) <= self.DICT_MAX_VALUES and len(distinct) * 2 < max(len(texts), 2):
+                index = {value: code for code, value in enumerate(distinct)}
+                codes = array('H', (index[t] for t in texts))
+                if sys.byteorder == 'big':
+                    codes.byteswap()
+                self._write_file(f"{name}.dict.json", json.dumps(distinct, ensure_ascii=False).encode('utf-8'))
+                self._write_file(f"{name}.codes", codes.tobytes())
+                column = {"type": "dict"}
+            else:
+                offsets = array('Q', [0])
+                for text in texts:
+                    offsets.append(offsets[-1] + len(text))
+                if sys.byteorder == 'big':
+                    offsets.byteswap()
+                self._write_file(f"{name}.str", zlib.compress(''.join(texts).encode('utf-8'), 6))
+                self._write_file(f"{name}.off", offsets.tobytes())
+                column = {"type": "str"}
+        
+        self.meta["columns"][name] = column
+        self._save_meta()
+    
+    def _read_array(self, file_name: str, typecode: str) -> array:
+        data = array(typecode)
+        data.frombytes((self.path / file_name).read_bytes())
+        if sys.byteorder == 'big':
+            data.byteswap()
+        return data
+    
+    def read_column(self, name: str) -> list:
+        """读取一列
+        
+        Args:
+            name: 列名
+        
+        Returns:
+            list: 列数据
+        """
+        column_type = self.meta["columns"][name]["type"]
+        if column_type == "int":
+            return self._read_array(f"{name}.i64", 'q').tolist()
+        if column_type == "dict":
+            values = json.loads((self.path / f"{name}.dict.json").read_text(encoding='utf-8'))
+            return [values[code] for code in self._read_array(f"{name}.codes", 'H')]
+        text = zlib.decompress((self.path / f"{name}.str").read_bytes()).decode('utf-8')
+        offsets = self._read_array(f"{name}.off", 'Q')
+        return [text[offsets[i]:offsets[i + 1]] for i in range(self.rows)]
+    
+    def read_columns(self, names: list[str]) -> dict[str, list]:
+        """读取多列"""
+        return {name: self.read_column(name) for name in names}
+    
+    def value_counts(self, name: str) -> dict:
+        """统计一列中各取值的出现次数（字典编码列只读取编码，不还原字符串）"""
+        counts: dict = {}
+        if self.meta["columns"][name]["type"] == "dict":
+            values = json.loads((self.path / f"{name}.dict.json").read_text(encoding='utf-8'))
+            code_counts = [0] * len(values)
+            for code in self._read_array(f"{name}.codes", 'H'):
+                code_counts[code] += 1
+            return {value: count for value, count in zip(values, code_counts) if count}
+        for value in self.read_column(name):
+            counts[value] = counts.get(value, 0) + 1
+        return counts
+    
+    def iter_records(self, names: list[str] | None = None):
+        """按行遍历记录
+        
+        Args:
+            names: 需要的列，默认全部
+        """
+        data = self.read_columns(names or self.columns)
+        for i in range(self.rows):
+            yield {name: values[i] for name, values in data.items()}
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import base64
+from collections import OrderedDict
+import json
+import os
+from pathlib import Path
+import shutil
+import threading
+from array import array
+
+from backend.storage.column_store import ColumnStore
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class CommentIndex:
+    """分析结果的查询索引
+    
+    结果可以是JSONL文件，也可以是列存储目录（见 :class:`ColumnStore`，清洗时被过滤的空行不建索引）。
+    索引目录（JSONL结果文件旁的 ``{stem}.idx``，列存储目录内的 ``query.idx``）中保存：
+        - ``offsets.npy`` / ``ends.npy``: 每条记录在结果文件中的起止字节偏移，按行号直接定位记录
+          （列存储为记录在列存储中的行号和行号+1）
+        - ``likes.npy`` / ``time.npy`` / ``class.npy``: 点赞数、评论时间、分类编码，用于向量化过滤和排序
+        - ``postings.npy`` + ``terms.json``: ``cleaned_text`` 的单字和相邻二字倒排表
+    
+    关键词查询先取关键词各二字（单字关键词取单字）倒排表的交集，再读取候选行确认确实包含关键词，
+    不扫描整个结果文件。数值数组以内存映射方式打开，查询一页的耗时主要取决于命中的行数。
+    索引记录了结果文件的签名（见 :meth:`signature_of`），结果文件改动后索引视为过期。
+    
+    依赖 numpy（可选依赖）。
+    """
+    
+    CLASSIFICATIONS = ('优', '良', '中', '差', '不明意义')
+    # 每个索引缓存的关键词数（翻页时不必重新求交集和确认）
+    KEYWORD_CACHE_SIZE = 64
+    # 候选行不超过该数量时一次确认全部候选，命中总数是精确值；否则只确认当前页需要的候选
+    VERIFY_ALL_MAX = 5000
+    SORT_FIELDS = ('index', 'likes', 'time')
+    VERSION = 2
+    # 列存储中的索引目录名
+    STORE_INDEX = "query.idx"
+    
+    def __init__(self, result_file: Path):
+        """打开已建立的索引
+        
+        Args:
+            result_file: 结果文件（JSONL）或列存储目录
+        """
+        if np is None:
+            raise ImportError("评论查询索引需要 numpy，请先安装: pip install numpy")
+        self.result_file = Path(result_file)
+        self.path = self.path_for(self.result_file)
+        meta = json.loads((self.path / "meta.json").read_text(encoding='utf-8'))
+        self.signature = meta["source"]
+        self.store = ColumnStore(self.result_file) if ColumnStore.is_store(self.result_file) else None
+        self._store_columns: dict[str, list] | None = None
+        self._store_lock = threading.Lock()
+        self.rows = meta["rows"]
+        self.offsets = np.load(self.path / "offsets.npy", mmap_mode='r')
+        self.ends = np.load(self.path / "ends.npy", mmap_mode='r')
+        self.likes = np.load(self.path / "likes.npy", mmap_mode='r')
+        self.times = np.load(self.path / "time.npy", mmap_mode='r')
+        self.classes = np.load(self.path / "class.npy", mmap_mode='r')
+        self.postings = np.load(self.path / "postings.npy", mmap_mode='r')
+        terms = json.loads((self.path / "terms.json").read_text(encoding='utf-8'))
+        starts = np.load(self.path / "term_starts.npy")
+        self.terms = {term: (int(starts[i]), int(starts[i + 1])) for i, term in enumerate(terms)}
+        self._keyword_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._keyword_lock = threading.Lock()
+    
+    @classmethod
+    def path_for(cls, result_file: Path) -> Path:
+        """结果文件对应的索引目录"""
+        result_file = Path(result_file)
+        if ColumnStore.is_store(result_file):
+            return result_file / cls.STORE_INDEX
+        return result_file.with_name(f"{result_file.stem}.idx")
+    
+    @staticmethod
+    def signature_of(result_file: Path) -> list[int]:
+        """结果文件的签名：JSONL为 [大小, 修改时间]，列存储为元数据的 [大小, 修改时间]
+        
+        只比较大小时，改写后大小不变的文件会继续使用过期的索引。
+        """
+        result_file = Path(result_file)
+        if ColumnStore.is_store(result_file):
+            result_file = result_file / ColumnStore.META_FILE
+        stat = result_file.stat()
+        return [stat.st_size, stat.st_mtime_ns]
+    
+    @staticmethod
+    def _scan_jsonl(result_file: Path):
+        """逐条产出 JSONL 结果文件中的 (起始偏移, 结束偏移, 记录)"""
+        with open(result_file, 'rb') as f:
+            position = 0
+            for line in f:
+                start = position
+                position += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except Exception:
+                    continue
+                yield start, position, record
+    
+    @staticmethod
+    def _scan_store(store: ColumnStore):
+        """逐条产出列存储中的 (行号, 行号+1, 记录)，跳过清洗时被过滤的行"""
+        names = [name for name in ('cleaned_text', 'likes', 'time', 'classification') if store.has_column(name)]
+        for row, record in enumerate(store.iter_records(names)):
+            if 'cleaned_text' in record and not record['cleaned_text']:
+                continue
+            yield row, row + 1, record
+    
+    @staticmethod
+    def grams(text: str) -> set[str]:
+        """文本的单字和相邻二字"""
+        text = text.lower()
+        return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+    
+    @classmethod
+    def build(cls, result_file: Path) -> Path:
+        """扫描结果文件建立索引（先写入临时目录，完成后替换旧索引）
+        
+        Args:
+            result_file: 结果文件（JSONL）
+        
+        Returns:
+            Path: 索引目录
+        """
+        if np is None:
+            raise ImportError("评论查询索引需要 numpy，请先安装: pip install numpy")
+        result_file = Path(result_file)
+        # 先取签名：建立过程中结果文件又有改动时，索引会被判为过期而重建
+        signature = cls.signature_of(result_file)
+        if ColumnStore.is_store(result_file):
+            source = cls._scan_store(ColumnStore(result_file))
+        else:
+            source = cls._scan_jsonl(result_file)
+        class_codes = {name: code for code, name in enumerate(cls.CLASSIFICATIONS)}
+        offsets = array('q')
+        ends = array('q')
+        likes = array('q')
+        times = array('q')
+        classes = array('B')
+        postings: dict[str, array] = {}
+        
+        for start, end, record in source:
+            row = len(offsets)
+            offsets.append(start)
+            ends.append(end)
+            likes.append(int(record.get('likes') or 0))
+            times.append(int(record.get('time') or 0))
+            classes.append(class_codes.get(record.get('classification'), 255))
+            for gram in cls.grams(record.get('cleaned_text') or ''):
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array('I')
+                posting.append(row)
+        
+        terms = sorted(postings)
+        starts = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            starts[i + 1] = starts[i] + len(postings[term])
+        flat = np.empty(int(starts[-1]), dtype=np.uint32)
+        for i, term in enumerate(terms):
+            flat[starts[i]:starts[i + 1]] = np.frombuffer(postings[term], dtype=np.uint32)
+        
+        path = cls.path_for(result_file)
+        tmp = path.with_name(f"{path.name}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        np.save(tmp / "offsets.npy", np.frombuffer(offsets, dtype=np.int64))
+        np.save(tmp / "ends.npy", np.frombuffer(ends, dtype=np.int64))
+        np.save(tmp / "likes.npy", np.frombuffer(likes, dtype=np.int64))
+        np.save(tmp / "time.npy", np.frombuffer(times, dtype=np.int64))
+        np.save(tmp / "class.npy", np.frombuffer(classes, dtype=np.uint8))
+        np.save(tmp / "postings.npy", flat)
+        np.save(tmp / "term_starts.npy", starts)
+        (tmp / "terms.json").write_text(json.dumps(terms, ensure_ascii=False), encoding='utf-8')
+        (tmp / "meta.json").write_text(json.dumps({
+            "version": cls.VERSION, "rows": len(offsets), "source": signature
+        }), encoding='utf-8')
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+        return path
+    
+    @classmethod
+    def is_current(cls, result_file: Path) -> bool:
+        """索引是否存在且与结果文件一致"""
+        try:
+            meta = json.loads((cls.path_for(result_file) / "meta.json").read_text(encoding='utf-8'))
+            return meta.get("version") == cls.VERSION and meta.get("source") == cls.signature_of(result_file)
+        except Exception:
+            return False
+    
+    def _candidates(self, keyword: str) -> tuple:
+        """关键词的候选行号
+        
+        Returns:
+            tuple: (按行号升序的候选行号, 是否已确认都包含关键词)
+        """
+        with self._keyword_lock:
+            candidates = self._keyword_cache.get(keyword)
+            if candidates is not None:
+                self._keyword_cache.move_to_end(keyword)
+                return candidates
+        candidates = self._match(keyword)
+        with self._keyword_lock:
+            self._keyword_cache[keyword] = candidates
+            while len(self._keyword_cache) > self.KEYWORD_CACHE_SIZE:
+                self._keyword_cache.popitem(last=False)
+        return candidates
+    
+    def _match(self, keyword: str) -> tuple:
+        grams = [keyword] if len(keyword) == 1 else [keyword[i:i + 2] for i in range(len(keyword) - 1)]
+        lists = []
+        for gram in dict.fromkeys(grams):
+            span = self.terms.get(gram)
+            if span is None:
+                return np.zeros(0, dtype=np.int64), True
+            lists.append(self.postings[span[0]:span[1]])
+        lists.sort(key=len)
+        rows = np.asarray(lists[0], dtype=np.int64)
+        for posting in lists[1:]:
+            rows = np.intersect1d(rows, posting, assume_unique=True)
+            if not len(rows):
+                return rows, True
+        # 关键词不超过两个字时倒排表就是精确结果；更长时各二字都出现不代表关键词整体出现，需要读取候选行确认
+        if len(grams) <= 1:
+            return rows, True
+        if len(rows) > self.VERIFY_ALL_MAX:
+            return rows, False
+        return np.asarray([row for row, record in zip(rows, self.records(rows))
+                           if self._contains(record, keyword)], dtype=np.int64), True
+    
+    @staticmethod
+    def _contains(record: dict, keyword: str) -> bool:
+        return keyword in (record.get('cleaned_text') or '').lower()
+    
+    def records(self, rows) -> list[dict]:
+        """按行号读取记录（JSONL每条记录一次定位读取；列存储第一次读取时加载全部列）"""
+        if self.store is not None:
+            with self._store_lock:
+                if self._store_columns is None:
+                    self._store_columns = self.store.read_columns(self.store.columns)
+                columns = self._store_columns
+            return [{name: values[int(self.offsets[row])] for name, values in columns.items()} for row in rows]
+        records = []
+        with open(self.result_file, 'rb') as f:
+            for row in rows:
+                f.seek(int(self.offsets[row]))
+                records.append(json.loads(f.read(int(self.ends[row]) - int(self.offsets[row]))))
+        return records
+    
+    def query(self, classification: str | None = None, min_likes: int | None = None,
+              max_likes: int | None = None, since: int | None = None, until: int | None = None,
+              keyword: str | None = None, sort: str = "index", order: str = "asc",
+              limit: int = 20, cursor: str | None = None) -> dict:
+        """查询评论
+        
+        Args:
+            classification: 分类（优/良/中/差/不明意义）
+            min_likes: 最少点赞数（含）
+            max_likes: 最多点赞数（含）
+            since: 评论时间下限（Unix时间戳，含）
+            until: 评论时间上限（Unix时间戳，不含）
+            keyword: ``cleaned_text`` 中包含的关键词（不区分大小写）
+            sort: 排序字段（index/likes/time）
+            order: asc 或 desc（相同排序值按行号升序）
+            limit: 每页条数
+            cursor: 上一页返回的 ``next_cursor``
+        
+        Returns:
+            dict: items（本页记录，附 ``row`` 行号）、total（命中总数）、total_exact（total 是否精确，
+                长关键词的候选行过多时只确认当前页，total 为候选行数，是上限）、next_cursor（没有下一页时为None）
+        """
+        if sort not in self.SORT_FIELDS:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"不支持的排序方向: {order}")
+        limit = max(1, min(int(limit), 500))
+        
+        keyword = keyword.lower() if keyword else None
+        if keyword:
+            rows, verified = self._candidates(keyword)
+        else:
+            rows, verified = np.arange(self.rows, dtype=np.int64), True
+        mask = np.ones(len(rows), dtype=bool)
+        if classification is not None:
+            if classification not in self.CLASSIFICATIONS:
+                raise ValueError(f"不支持的分类: {classification}")
+            mask &= self.classes[rows] == self.CLASSIFICATIONS.index(classification)
+        if min_likes is not None:
+            mask &= self.likes[rows] >= min_likes
+        if max_likes is not None:
+            mask &= self.likes[rows] <= max_likes
+        if since is not None:
+            mask &= self.times[rows] >= since
+        if until is not None:
+            mask &= self.times[rows] < until
+        rows = rows[mask]
+        total = len(rows)
+        
+        # 组合排序键：排序值（降序时取反）* 行数 + 行号，唯一且按页单调，游标只需记录上一页最后一项的键
+        if sort == "index":
+            values = rows.copy()
+        else:
+            values = np.asarray((self.likes if sort == "likes" else self.times)[rows], dtype=np.int64)
+        if order == "desc":
+            values = -values
+        keys = values * (self.rows + 1) + rows
+        if cursor:
+            keys_after = keys > self.decode_cursor(cursor, sort, order)
+            rows, keys = rows[keys_after], keys[keys_after]
+        
+        if verified:
+            if len(keys) > limit:
+                top = np.argpartition(keys, limit)[:limit]
+            else:
+                top = np.arange(len(keys))
+            top = top[np.argsort(keys[top])]
+            page = list(zip(rows[top], keys[top], self.records(rows[top])))
+            has_more = len(keys) > limit
+        else:
+            # 按排序顺序逐批确认候选行，凑够一页（多确认一条用于判断是否还有下一页）即停止
+            ordered = np.argsort(keys)
+            page = []
+            position = 0
+            while len(page) <= limit and position < len(ordered):
+                batch = ordered[position:position + 2 * limit]
+                position += len(batch)
+                page.extend(item for item in zip(rows[batch], keys[batch], self.records(rows[batch]))
+                            if self._contains(item[2], keyword))
+            has_more = len(page) > limit
+            page = page[:limit]
+        
+        items = []
+        for row, _, record in page:
+            record['row'] = int(row)
+            items.append(record)
+        return {
+            "items": items,
+            "total": total,
+            "total_exact": verified,
+            "next_cursor": self.encode_cursor(int(page[-1][1]), sort, order) if has_more else None
+        }
+    
+    def encode_cursor(self, key: int, sort: str, order: str) -> str:
+        """编码游标：组合排序键依赖索引的行数，同时记录行数和结果文件签名"""
+        payload = json.dumps({"k": key, "s": sort, "o": order, "n": self.rows, "f": self.signature}).encode('utf-8')
+        return base64.urlsafe_b64encode(payload).decode('ascii')
+    
+    def decode_cursor(self, cursor: str, sort: str, order: str) -> int:
+        """解码游标
+        
+        Raises:
+            ValueError: 游标无效、与排序方式不一致，或生成游标后索引已按更新的结果文件重建
+        """
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            key = int(payload["k"])
+        except Exception:
+            raise ValueError("无效的游标")
+        if payload.get("s") != sort or payload.get("o") != order:
+            raise ValueError("游标与排序方式不一致")
+        if payload.get("n") != self.rows or payload.get("f") != self.signature:
+            raise ValueError("结果文件已更新，游标已失效，请从第一页重新查询")
+        return key
+
+
+_indexes: "OrderedDict[str, CommentIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+# 每个进程最多保持打开的索引数
+MAX_OPEN_INDEXES = 8
+
+
+def get_index(result_file: Path) -> CommentIndex:
+    """获取结果文件的索引（不存在或已过期时重新建立），已打开的索引在进程内复用
+    
+    Args:
+        result_file: 结果文件（JSONL）或列存储目录
+    
+    Returns:
+        CommentIndex: 索引
+    """
+    result_file = Path(result_file)
+    key = str(result_file.resolve())
+    signature = CommentIndex.signature_of(result_file)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None and index.signature == signature:
+            _indexes.move_to_end(key)
+            return index
+    if not CommentIndex.is_current(result_file):
+        CommentIndex.build(result_file)
+    index = CommentIndex(result_file)
+    with _indexes_lock:
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        while len(_indexes) > MAX_OPEN_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def build_index(result_file: Path) -> Path | None:
+    """分析完成后建立查询索引；没有安装 numpy 或建立失败时只打印提示，不影响分析结果
+    
+    Args:
+        result_file: 结果文件（JSONL）或列存储目录
+    
+    Returns:
+        Path | None: 索引目录
+    """
+    if np is None:
+        print("未安装 numpy，跳过建立评论查询索引")
+        return None
+    try:
+        return CommentIndex.build(result_file)
+    except Exception as e:
+        print(f"建立评论查询索引失败: {str(e)}")
+        return None
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+import time
+from typing import Iterable
+
+from backend.storage.column_store import ColumnStore
+
+
+class ResultSummary:
+    """分析结果的汇总（与结果文件放在一起的 ``.summary.json``）
+    
+    分析过程中每写出一批结果就累加一次并保存，查询结果时直接返回汇总文件，
+    耗时与评论数无关。汇总包含：
+        - classifications / total: 各分类的评论数
+        - sample_summaries: 前若干条非空总结
+        - likes_weighted: 按 ``1 + 点赞数`` 加权的各分类占比
+        - time_buckets: 按评论日期统计的各分类评论数
+    
+    汇总中记录了结果文件的签名（JSONL为文件大小，列存储为元数据的修改时间），
+    结果文件被其他程序改动后签名不一致，:meth:`ensure` 会重新扫描生成。
+    """
+    
+    CLASSIFICATIONS = ('优', '良', '中', '差', '不明意义')
+    SAMPLE_SIZE = 10
+    VERSION = 2
+    
+    def __init__(self):
+        self.classifications = {name: 0 for name in self.CLASSIFICATIONS}
+        self.sample_summaries: list[str] = []
+        self.likes = {name: 0 for name in self.CLASSIFICATIONS}
+        self.time_buckets: dict[str, dict[str, int]] = {}
+    
+    @staticmethod
+    def path_for(result_file: Path) -> Path:
+        """结果文件对应的汇总文件路径"""
+        result_file = Path(result_file)
+        if ColumnStore.is_store(result_file):
+            return result_file / "summary.json"
+        return result_file.with_name(f"{result_file.stem}.summary.json")
+    
+    @staticmethod
+    def signature(result_file: Path) -> int:
+        """结果文件的签名，用于判断汇总是否过期"""
+        result_file = Path(result_file)
+        if ColumnStore.is_store(result_file):
+            return (result_file / ColumnStore.META_FILE).stat().st_mtime_ns
+        return result_file.stat().st_size
+    
+    def add(self, records: Iterable[dict]) -> None:
+        """累加一批分析结果
+        
+        与原先逐行扫描结果文件的统计一致：没有 ``classification`` 的记录计为"不明意义"，
+        分类不合法的记录不计数，但总结仍可作为示例。
+        
+        Args:
+            records: 评论记录（可选字段 ``classification``、``summary``、``likes``、``time``）
+        """
+        for record in records:
+            summary = record.get('summary')
+            if summary and len(self.sample_summaries) < self.SAMPLE_SIZE:
+                self.sample_summaries.append(summary)
+            classification = record.get('classification', '不明意义')
+            if classification not in self.classifications:
+                continue
+            self.classifications[classification] += 1
+            self.likes[classification] += 1 + max(int(record.get('likes') or 0), 0)
+            timestamp = record.get('time')
+            if timestamp:
+                day = time.strftime('%Y-%m-%d', time.localtime(int(timestamp)))
+                bucket = self.time_buckets.setdefault(day, {})
+                bucket[classification] = bucket.get(classification, 0) + 1
+    
+    def to_dict(self) -> dict:
+        """汇总内容（即 ``/api/results`` 的响应）"""
+        total_weight = sum(self.likes.values())
+        return {
+            "classifications": dict(self.classifications),
+            "total": sum(self.classifications.values()),
+            "sample_summaries": list(self.sample_summaries),
+            "likes_weighted": {
+                name: round(weight / total_weight, 4) if total_weight else 0.0
+                for name, weight in self.likes.items()
+            },
+            "time_buckets": dict(sorted(self.time_buckets.items()))
+        }
+    
+    def save(self, result_file: Path) -> Path:
+        """保存汇总（先写临时文件再替换，读取方不会读到写了一半的文件）
+        
+        Args:
+            result_file: 结果文件（写入已刷新到磁盘的内容之后调用）
+        
+        Returns:
+            Path: 汇总文件路径
+        """
+        path = self.path_for(result_file)
+        data = dict(self.to_dict(), likes=self.likes, version=self.VERSION, source=self.signature(result_file))
+        tmp = path.with_name(f"{path.name}.tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, path)
+        return path
+    
+    @classmethod
+    def load(cls, result_file: Path) -> "ResultSummary | None":
+        """读取汇总，不存在、版本不符或已过期时返回None"""
+        path = cls.path_for(result_file)
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+            if data.get('version') != cls.VERSION or data.get('source') != cls.signature(result_file):
+                return None
+            summary = cls()
+            summary.classifications.update(data['classifications'])
+            summary.sample_summaries = list(data['sample_summaries'])
+            summary.likes.update(data['likes'])
+            summary.time_buckets = data['time_buckets']
+            return summary
+        except Exception:
+            return None
+    
+    @classmethod
+    def build(cls, result_file: Path) -> "ResultSummary":
+        """扫描结果文件生成汇总"""
+        summary = cls()
+        result_file = Path(result_file)
+        if ColumnStore.is_store(result_file):
+            store = ColumnStore(result_file)
+            names = [name for name in ('summary', 'classification', 'likes', 'time') if store.has_column(name)]
+            summary.add(store.iter_records(names))
+            return summary
+        with open(result_file, 'r', encoding='utf-8') as f:
+            summary.add(json.loads(line) for line in f if line.strip())
+        return summary
+    
+    @classmethod
+    def ensure(cls, result_file: Path) -> Path:
+        """确保汇总文件存在且未过期（旧的结果文件首次查询时扫描一次）
+        
+        Args:
+            result_file: 结果文件
+        
+        Returns:
+            Path: 汇总文件路径
+        """
+        path = cls.path_for(result_file)
+        if cls.load(result_file) is None:
+            cls.build(result_file).save(result_file)
+        return path
@@ -4,6 +4,27 @@ import { ProgressMonitor } from './components/ProgressMonitor';
 import { ResultDisplay } from './components/ResultDisplay';
 import { HistoryPanel } from './components/HistoryPanel';
 
+// 订阅任务进度（SSE）：每次状态变化调用 onUpdate，任务完成或失败时返回最终状态
+const watchTask = (taskId: string, onUpdate: (event: any) => void): Promise<any> =>
+  new Promise((resolve, reject) => {
+    const source = new EventSource(`http://localhost:8000/api/task/${taskId}/events`);
+    source.addEventListener('progress', (message) => {
+      onUpdate(JSON.parse((message as MessageEvent).data));
+    });
+    source.addEventListener('done', (message) => {
+      const event = JSON.parse((message as MessageEvent).data);
+      source.close();
+      onUpdate(event);
+      resolve(event);
+    });
+    source.onerror = () => {
+      // 连接断开时 EventSource 会自动重连；任务不存在等无法恢复的错误直接结束
+      if (source.readyState === EventSource.CLOSED) {
+        reject(new Error('任务进度连接失败'));
+      }
+    };
+  });
+
 function App() {
   const [currentTask, setCurrentTask] = useState<any>(null);
   const [taskHistory, setTaskHistory] = useState<any[]>([]);
@@ -69,118 +90,100 @@ function App() {
         progress: crawlResult.progress
       });
       
-      // 2. 轮询获取爬取任务的真实进度
-      const crawlProgressInterval = setInterval(async () => {
-        try {
-          const statusResponse = await fetch(`http://localhost:8000/api/task/${crawlTaskId}`);
-          if (statusResponse.ok) {
-            const statusResult = await statusResponse.json();
-            console.log('爬取任务状态:', statusResult);
-            
-            setCurrentTask(prev => ({
-              ...prev,
-              status: statusResult.status,
-              progress: statusResult.progress
-            }));
-            
-            // 如果爬取任务完成，停止轮询并开始分析
-            if (statusResult.status === 'completed') {
-              clearInterval(crawlProgressInterval);
-              
-              // 3. 调用后端API分析评论
-              console.log('开始分析评论...');
-              const analyzeResponse = await fetch('http://localhost:8000/api/analyze', {
-                method: 'POST',
-                headers: {
-                  'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                  file_path: statusResult.result.file_path,
-                  api_key: apiKey,
-                  model: model
-                })
-              });
-              
-              if (!analyzeResponse.ok) {
-                throw new Error('分析评论失败');
-              }
-              
-              const analyzeResult = await analyzeResponse.json();
-              console.log('分析结果:', analyzeResult);
-              
-              const analyzeTaskId = analyzeResult.task_id;
-              
-              // 更新任务状态为分析中
-              setCurrentTask(prev => ({
-                ...prev,
-                id: analyzeTaskId,
-                status: analyzeResult.status,
-                progress: analyzeResult.progress
-              }));
-              
-              // 4. 轮询获取分析任务的真实进度
-              const analyzeProgressInterval = setInterval(async () => {
-                try {
-                  const analyzeStatusResponse = await fetch(`http://localhost:8000/api/task/${analyzeTaskId}`);
-                  if (analyzeStatusResponse.ok) {
-                    const analyzeStatusResult = await analyzeStatusResponse.json();
-                    console.log('分析任务状态:', analyzeStatusResult);
-                    
-                    setCurrentTask(prev => ({
-                      ...prev,
-                      status: analyzeStatusResult.status,
-                      progress: analyzeStatusResult.progress
-                    }));
-                    
-                    // 如果分析任务完成，停止轮询并获取结果
-                    if (analyzeStatusResult.status === 'completed') {
-                      clearInterval(analyzeProgressInterval);
-                      
-                      // 5. 获取分析结果详情
-                      console.log('获取分析结果详情...');
-                      const resultFile = analyzeStatusResult.result.result_file;
-                      // 对文件路径进行编码，确保URL安全
-                      const encodedFilePath = encodeURIComponent(resultFile);
-                      const resultResponse = await fetch(`http://localhost:8000/api/results/${encodedFilePath}`);
-                      
-                      if (!resultResponse.ok) {
-                        throw new Error('获取分析结果失败');
-                      }
-                      
-                      const analysisResult = await resultResponse.json();
-                      console.log('分析结果详情:', analysisResult);
-                      
-                      // 6. 更新任务状态和历史记录
-                      setCurrentTask({
-                        id: analyzeTaskId,
-                        bvid,
-                        status: 'completed',
-                        progress: 100,
-                        result: analysisResult
-                      });
-                      
-                      setTaskHistory(prev => [{
-                        id: analyzeTaskId,
-                        bvid,
-                        title: '测试视频',
-                        status: 'completed',
-                        timestamp: new Date().toISOString(),
-                        result: analysisResult
-                      }, ...prev]);
-                      
-                      setIsLoading(false);
-                    }
-                  }
-                } catch (error) {
-                  console.error('获取分析任务状态失败:', error);
-                }
-              }, 1000); // 每1秒更新一次分析进度
-            }
-          }
-        } catch (error) {
-          console.error('获取爬取任务状态失败:', error);
-        }
-      }, 1000); // 每1秒更新一次爬取进度
+      // 2. 订阅爬取任务的进度推送
+      const crawlStatus = await watchTask(crawlTaskId, event => {
+        setCurrentTask(prev => ({
+          ...prev,
+          status: event.status,
+          progress: event.progress,
+          counts: event.result,
+          eta: event.eta
+        }));
+      });
+      if (crawlStatus.status !== 'completed') {
+        throw new Error('爬取评论失败');
+      }
+      
+      // 3. 调用后端API分析评论
+      console.log('开始分析评论...');
+      const analyzeResponse = await fetch('http://localhost:8000/api/analyze', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+          file_path: crawlStatus.result.file_path,
+          api_key: apiKey,
+          model: model
+        })
+      });
+      
+      if (!analyzeResponse.ok) {
+        throw new Error('分析评论失败');
+      }
+      
+      const analyzeResult = await analyzeResponse.json();
+      console.log('分析结果:', analyzeResult);
+      
+      const analyzeTaskId = analyzeResult.task_id;
+      
+      // 更新任务状态为分析中
+      setCurrentTask(prev => ({
+        ...prev,
+        id: analyzeTaskId,
+        status: analyzeResult.status,
+        progress: analyzeResult.progress,
+        counts: null,
+        eta: null
+      }));
+      
+      // 4. 订阅分析任务的进度推送
+      const analyzeStatus = await watchTask(analyzeTaskId, event => {
+        setCurrentTask(prev => ({
+          ...prev,
+          status: event.status,
+          progress: event.progress,
+          counts: event.result,
+          eta: event.eta
+        }));
+      });
+      if (analyzeStatus.status !== 'completed') {
+        throw new Error('分析评论失败');
+      }
+      
+      // 5. 获取分析结果详情
+      console.log('获取分析结果详情...');
+      const resultFile = analyzeStatus.result.result_file;
+      // 对文件路径进行编码，确保URL安全
+      const encodedFilePath = encodeURIComponent(resultFile);
+      const resultResponse = await fetch(`http://localhost:8000/api/results/${encodedFilePath}`);
+      
+      if (!resultResponse.ok) {
+        throw new Error('获取分析结果失败');
+      }
+      
+      const analysisResult = await resultResponse.json();
+      console.log('分析结果详情:', analysisResult);
+      
+      // 6. 更新任务状态和历史记录
+      setCurrentTask({
+        id: analyzeTaskId,
+        bvid,
+        status: 'completed',
+        progress: 100,
+        result: analysisResult
+      });
+      
+      setTaskHistory(prev => [{
+        id: analyzeTaskId,
+        bvid,
+        title: '测试视频',
+        status: 'completed',
+        timestamp: new Date().toISOString(),
+        result: analysisResult
+      }, ...prev]);
+      
+      setIsLoading(false);
     } catch (err) {
       console.error('任务执行失败:', err);
       setError('任务执行失败: ' + (err instanceof Error ? err.message : String(err)));
@@ -7,6 +7,8 @@ interface ProgressMonitorProps {
     status: string;
     progress: number;
     result?: any;
+    counts?: { crawled?: number; analyzed?: number; total?: number } | null;
+    eta?: number | null;
   };
 }
 
@@ -21,6 +23,8 @@ export const ProgressMonitor: React.FC<ProgressMonitorProps> = ({ task }) => {
         return '处理数据';
       case 'analyzing':
         return '分析评论';
+      case 'streaming':
+        return '流式处理';
       case 'completed':
         return '完成';
       case 'failed':
@@ -41,6 +45,15 @@ export const ProgressMonitor: React.FC<ProgressMonitorProps> = ({ task }) => {
     }
   };
 
+  const formatEta = (seconds: number) => {
+    // 先取整再拆分，避免出现"1分60秒"
+    const total = Math.ceil(seconds);
+    if (total < 60) {
+      return `${total}秒`;
+    }
+    return `${Math.floor(total / 60)}分${total % 60}秒`;
+  };
+
   return (
     <div className="space-y-4">
       <div className="flex justify-between items-center">
@@ -61,6 +74,16 @@ export const ProgressMonitor: React.FC<ProgressMonitorProps> = ({ task }) => {
             style={{ width: `${task.progress}%` }}
           ></div>
         </div>
+        <div className="flex justify-between text-xs text-gray-500">
+          <span>
+            {task.counts?.crawled !== undefined && `已爬取 ${task.counts.crawled} 条`}
+            {task.counts?.analyzed !== undefined &&
+              `已分析 ${task.counts.analyzed}${task.counts.total ? ` / ${task.counts.total}` : ''} 条`}
+          </span>
+          {task.eta != null && task.status !== 'completed' && (
+            <span>预计剩余 {formatEta(task.eta)}</span>
+          )}
+        </div>
       </div>
 
       <div className="pt-2 border-t border-gray-200">